@@ -0,0 +1,60 @@
+#!/usr/bin/python
+"""Measures the memory used per common.Comment.
+
+Compares the slotted Comment, with and without source positions, against a
+replica of the previous, dict-based layout. Every comment gets its own line
+number and, where recorded, start offset, as comments found by parsers do.
+Comments with positions should take no more memory than the dict-based
+layout. Run from the base of the repository:
+
+  python -m benchmarks.comment_memory
+"""
+
+import json
+import sys
+import tracemalloc
+
+from comment_parser.parsers import common
+
+
+class DictComment():
+    """Comment as it was stored before it had __slots__."""
+
+    def __init__(self, text, line_number, multiline=False):
+        self._text = text
+        self._line_number = line_number
+        self._multiline = multiline
+
+
+def bytes_per_comment(factory, count):
+    """Returns the average bytes allocated by count calls to factory."""
+    text = 'shared comment text'
+    numbers = list(range(count))
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    comments = [factory(text, number) for number in numbers]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del comments
+    # Subtract the list's pointer to each comment. Line numbers are allocated
+    # up front, as they are shared by all layouts.
+    return (after - before) / count - 8
+
+
+def main(argv):
+    """Prints bytes per comment for each layout as JSON."""
+    count = int(argv[0]) if argv else 100000
+    results = {
+        'dict': bytes_per_comment(DictComment, count),
+        'slots': bytes_per_comment(common.Comment, count),
+        'slots_with_positions': bytes_per_comment(
+            lambda text, number: common.Comment(text, number, False, 40 *
+                                                number, 40 * number + 20, 4),
+            count),
+    }
+    print(json.dumps({'count': count, 'bytes_per_comment': results},
+                     indent=2))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
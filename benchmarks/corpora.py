@@ -0,0 +1,136 @@
+#!/usr/bin/python
+"""Synthetic source code corpora for benchmarking the comment parsers.
+
+Each corpus shape is generated for every language, from a small description
+of the language's comment and string syntax, up to an approximate size.
+Adversarial corpora are shapes which a backtracking scanner would take more
+than linear time on.
+"""
+
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+
+class Language(NamedTuple):
+    """Syntax used to generate corpora for a language."""
+    line_comment: Optional[str]
+    block_comment: Optional[Tuple[str, str]]
+    string: str  # Format string wrapping a string literal's contents.
+    statement: str
+
+
+# Keyed by parser module name.
+LANGUAGES: Dict[str, Language] = {
+    'c_parser': Language('//', ('/*', '*/'), '"{}"', 'x = y + 1;'),
+    'go_parser': Language('//', ('/*', '*/'), '"{}"', 'x := y + 1'),
+    'html_parser': Language(None, ('<!--', '-->'), '<a href="{}">x</a>',
+                            '<p>text</p>'),
+    'js_parser': Language('//', ('/*', '*/'), '"{}"', 'var x = y + 1;'),
+    'python_parser': Language('#', None, "'{}'", 'x = y + 1'),
+    'ruby_parser': Language('#', None, "'{}'", 'x = y + 1'),
+    'shell_parser': Language('#', None, "'{}'", 'x=$((y + 1))'),
+}
+
+_TEXT = ' the quick brown fox jumps over the lazy dog '
+
+
+def _repeat(unit: str, size: int) -> str:
+    return unit * max(1, size // len(unit))
+
+
+def _comment(language: Language, text: str = _TEXT) -> str:
+    """Returns a comment which fits on one line."""
+    if language.line_comment:
+        return language.line_comment + text
+    start, end = language.block_comment
+    return start + text + end
+
+
+def comment_dense(language: Language, size: int) -> str:
+    """Every other line is a comment."""
+    return _repeat(f'{language.statement}\n{_comment(language)}\n', size)
+
+
+def comment_sparse(language: Language, size: int) -> str:
+    """One comment per thousand lines of code."""
+    return _repeat(f'{language.statement}\n' * 999 + _comment(language) + '\n',
+                   size)
+
+
+def huge_single_line(language: Language, size: int) -> str:
+    """A single line of code, as in minified files.
+
+  Languages with block comments get one every ten statements, the others a
+  single trailing line comment.
+  """
+    if language.block_comment:
+        start, end = language.block_comment
+        unit = f'{language.statement} ' * 10 + f'{start}{_TEXT}{end} '
+        return _repeat(unit, size)
+    return _repeat(f'{language.statement}; ', size) + _comment(language)
+
+
+def many_strings(language: Language, size: int) -> str:
+    """String literals holding comment markers, and few real comments."""
+    markers = [marker for marker in (language.line_comment,) +
+               (language.block_comment or ()) if marker]
+    literals = ' '.join(
+        language.string.format(f'{marker} not a comment') for marker in markers)
+    line = f'{language.statement} {literals}\n'
+    return _repeat(line * 9 + _comment(language) + '\n', size)
+
+
+def deep_multiline(language: Language, size: int) -> str:
+    """Thousand line comments: block comments, or runs of line comments."""
+    if language.block_comment:
+        start, end = language.block_comment
+        comment = start + f'{_TEXT}\n' * 1000 + end
+    else:
+        comment = f'{language.line_comment}{_TEXT}\n' * 1000
+    return _repeat(f'{language.statement}\n{comment}\n', size)
+
+
+CORPORA: Dict[str, Callable[[Language, int], str]] = {
+    'comment_dense': comment_dense,
+    'comment_sparse': comment_sparse,
+    'huge_single_line': huge_single_line,
+    'many_strings': many_strings,
+    'deep_multiline': deep_multiline,
+}
+
+
+def unclosed_openers(language: Language, size: int) -> str:
+    """Comment openers which are never closed.
+
+  Languages without block comments get a single line of line comment
+  openers.
+  """
+    if language.block_comment:
+        return _repeat(f'{language.statement} {language.block_comment[0]}\n',
+                       size)
+    return _repeat(language.line_comment, size)
+
+
+def unclosed_strings(language: Language, size: int) -> str:
+    """Lines opening a string literal holding comment markers, never closed."""
+    markers = ''.join(marker for marker in (language.line_comment,) +
+                      (language.block_comment or ()) if marker)
+    opening = language.string[:language.string.index('{}')]
+    return _repeat(f'{language.statement} {opening}{markers}\n', size)
+
+
+def huge_comment(language: Language, size: int) -> str:
+    """A single comment making up the whole code.
+
+  Block comments are filled with near misses of their closing delimiter.
+  """
+    if language.block_comment:
+        start, end = language.block_comment
+        return start + _repeat(f'{end[:-1]} {end[-1]}\n', size) + end
+    return language.line_comment + _repeat(_TEXT, size)
+
+
+ADVERSARIAL: Dict[str, Callable[[Language, int], str]] = {
+    'unclosed_openers': unclosed_openers,
+    'unclosed_strings': unclosed_strings,
+    'huge_comment': huge_comment,
+}
@@ -0,0 +1,182 @@
+#!/usr/bin/python
+"""Benchmarks extract_comments of every parser in MIME_MAP.
+
+Each parser is timed on each corpus in corpora.CORPORA, reporting throughput
+and peak memory. Results are printed, or written with --output, as JSON so
+runs can be compared across versions with --compare. Run from the base of the
+repository:
+
+  python -m benchmarks.parsers --output before.json
+  ... change things ...
+  python -m benchmarks.parsers --compare before.json
+
+With --adversarial, the corpora in corpora.ADVERSARIAL are run instead, each
+at an eighth of the size too. Their results' scaling is how much slower than
+linear the parse got over the two sizes: about 1 when linear, 8 if quadratic.
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from benchmarks import corpora
+from comment_parser import comment_parser
+from comment_parser.parsers import common
+
+# Size divisor of the smaller run of adversarial corpora.
+_SCALE = 8
+
+
+def _parsers():
+    """Returns the distinct parser modules in MIME_MAP, by module name."""
+    parsers = {}
+    for parser in comment_parser.MIME_MAP.values():
+        parsers[parser.__name__.rsplit('.', 1)[-1]] = parser
+    return dict(sorted(parsers.items()))
+
+
+def measure(parser, code, repeat):
+    """Returns the best time, peak memory and comment count of a parse.
+
+  Bytes code is parsed with extract_comments_from_bytes. The count is None
+  if the code fails to parse.
+  """
+    if isinstance(code, bytes):
+        parse = parser.extract_comments_from_bytes
+    else:
+        parse = parser.extract_comments
+
+    def extract(code):
+        try:
+            return parse(code)
+        except common.Error:
+            return None
+
+    seconds = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        comments = extract(code)
+        seconds = min(seconds, time.perf_counter() - start)
+    del comments
+    gc.collect()
+    tracemalloc.start()
+    comments = extract(code)
+    count = None if comments is None else len(comments)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak, count
+
+
+def run(size,
+        repeat,
+        parser_names,
+        corpus_names,
+        binary=False,
+        adversarial=False):
+    """Runs the benchmarks, returning a list of result dicts."""
+    results = []
+    for name, parser in _parsers().items():
+        if parser_names and name not in parser_names:
+            continue
+        language = corpora.LANGUAGES[name]
+        generators = corpora.ADVERSARIAL if adversarial else corpora.CORPORA
+        for corpus, generate in generators.items():
+            if corpus_names and corpus not in corpus_names:
+                continue
+            code = generate(language, size).encode()
+            size_bytes = len(code)
+            seconds, peak, count = measure(parser, code if binary else
+                                           code.decode(), repeat)
+            result = {
+                'parser': name,
+                'corpus': corpus,
+                'bytes': size_bytes,
+                'comments': count,
+                'seconds': seconds,
+                'mb_per_s': size_bytes / seconds / 1e6,
+                'peak_bytes': peak,
+            }
+            summary = ''
+            if adversarial:
+                small = generate(language, size // _SCALE).encode()
+                small_seconds = measure(parser, small if binary else
+                                        small.decode(), repeat)[0]
+                result['scaling'] = (seconds / small_seconds /
+                                     (size_bytes / len(small)))
+                summary = f' {result["scaling"]:6.2f} scaling'
+            results.append(result)
+            print(f'{name:14} {corpus:17} {result["mb_per_s"]:8.2f} MB/s '
+                  f'{peak / 1e6:8.2f} MB peak{summary}',
+                  file=sys.stderr)
+    return results
+
+
+def compare(results, baseline):
+    """Prints the speed and memory of results relative to a baseline run."""
+    previous = {(r['parser'], r['corpus']): r for r in baseline['results']}
+    print(f'{"parser":14} {"corpus":17} {"speed":>8} {"memory":>8}')
+    for result in results:
+        old = previous.get((result['parser'], result['corpus']))
+        if old is None:
+            continue
+        print(f'{result["parser"]:14} {result["corpus"]:17} '
+              f'{result["mb_per_s"] / old["mb_per_s"]:7.2f}x '
+              f'{result["peak_bytes"] / max(old["peak_bytes"], 1):7.2f}x')
+
+
+def main(argv):
+    """Runs the parser benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--size',
+                        type=int,
+                        default=1 << 20,
+                        help='approximate corpus size in characters')
+    parser.add_argument('--repeat',
+                        type=int,
+                        default=3,
+                        help='timed runs per benchmark, the best is kept')
+    parser.add_argument('--parser',
+                        action='append',
+                        help='parser module to run, e.g. c_parser; repeatable')
+    parser.add_argument('--corpus',
+                        action='append',
+                        choices=sorted(corpora.CORPORA) +
+                        sorted(corpora.ADVERSARIAL),
+                        help='corpus to run; repeatable')
+    parser.add_argument('--adversarial',
+                        action='store_true',
+                        help='run the adversarial corpora and report how '
+                        'parse times scale with their size')
+    parser.add_argument('--bytes',
+                        action='store_true',
+                        help='parse UTF-8 encoded bytes rather than strings')
+    parser.add_argument('--output', help='file to write JSON results to')
+    parser.add_argument('--compare',
+                        help='JSON results of a previous run to compare with')
+    args = parser.parse_args(argv)
+
+    report = {
+        'python': platform.python_version(),
+        'size': args.size,
+        'bytes': args.bytes,
+        'adversarial': args.adversarial,
+        'results': run(args.size, args.repeat, args.parser, args.corpus,
+                       args.bytes, args.adversarial),
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+    elif not args.compare:
+        json.dump(report, sys.stdout, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline:
+            compare(report['results'], json.load(baseline))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,134 @@
+#!/usr/bin/python
+"""Benchmarks the time taken to import comment_parser.
+
+Each statement is run in a fresh interpreter with python -X importtime, and
+the best total import time over the runs is kept, along with the modules
+taking longest to import by themselves in that run. Results are printed, or
+written with --output, as JSON so runs can be compared across versions with
+--compare. Run from the base of the repository:
+
+  python -m benchmarks.startup --output before.json
+  ... change things ...
+  python -m benchmarks.startup --compare before.json
+"""
+
+import argparse
+import json
+import platform
+import re
+import subprocess
+import sys
+
+# Statements timed by default, by name. The parsers in MIME_MAP are only
+# imported once used, so neither statement reports them.
+STATEMENTS = {
+    'import': 'from comment_parser import comment_parser',
+    'cli': ('from comment_parser import comment_parser\n'
+            'comment_parser.main(["--help"])'),
+}
+
+# A line of -X importtime output: self and cumulative microseconds, then the
+# module name indented by its depth in the import tree.
+_IMPORT_TIME = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)')
+
+
+def import_times(statement, startup=frozenset()):
+    """Returns the time taken by the imports of statement.
+
+  Returns:
+    Tuple of the total microseconds (int) spent importing, and a Python dict
+      of the microseconds (int) each module took by itself, not counting the
+      modules it imports, by module name. Modules in startup, imported by the
+      interpreter itself, are left out.
+  """
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=True,
+        text=True)
+    total = 0
+    times = {}
+    for line in process.stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if not match or match.group(4) in startup:
+            continue
+        times[match.group(4)] = int(match.group(1))
+        if not match.group(3):
+            total += int(match.group(2))
+    return total, times
+
+
+def run(statements, repeat, top):
+    """Runs the benchmarks, returning a list of result dicts."""
+    results = []
+    startup = frozenset(import_times('pass')[1])
+    for name, statement in statements.items():
+        total, times = min(
+            (import_times(statement, startup) for _ in range(repeat)),
+            key=lambda result: result[0])
+        slowest = sorted(times.items(), key=lambda item: -item[1])[:top]
+        results.append({
+            'statement': name,
+            'microseconds': total,
+            'modules': len(times),
+            'slowest': dict(slowest),
+        })
+        print(f'{name:14} {total / 1000:8.2f} ms {len(times):4} modules',
+              file=sys.stderr)
+    return results
+
+
+def compare(results, baseline):
+    """Prints the import times of results relative to a baseline run."""
+    previous = {r['statement']: r for r in baseline['results']}
+    print(f'{"statement":14} {"time":>8}')
+    for result in results:
+        old = previous.get(result['statement'])
+        if old is None:
+            continue
+        print(f'{result["statement"]:14} '
+              f'{result["microseconds"] / max(old["microseconds"], 1):7.2f}x')
+
+
+def main(argv):
+    """Runs the startup benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat',
+                        type=int,
+                        default=5,
+                        help='runs per statement, the fastest is kept')
+    parser.add_argument('--top',
+                        type=int,
+                        default=10,
+                        help='number of the slowest modules to report')
+    parser.add_argument('--statement',
+                        action='append',
+                        choices=sorted(STATEMENTS),
+                        help='statement to time; repeatable')
+    parser.add_argument('--output', help='file to write JSON results to')
+    parser.add_argument('--compare',
+                        help='JSON results of a previous run to compare with')
+    args = parser.parse_args(argv)
+
+    statements = {
+        name: statement
+        for name, statement in STATEMENTS.items()
+        if not args.statement or name in args.statement
+    }
+    report = {
+        'python': platform.python_version(),
+        'results': run(statements, args.repeat, args.top),
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+    elif not args.compare:
+        json.dump(report, sys.stdout, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline:
+            compare(report['results'], json.load(baseline))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,207 @@
+#!/usr/bin/python
+"""This module provides a persistent cache of comment extraction results.
+
+Results are stored in an SQLite database inside a cache directory, keyed on a
+hash of the source code, the parser that handled it and the version of the
+results, see results_version. Unchanged files therefore return their comments
+without being parsed again, while upgrades, edits to the parsers and changes
+to MIME detection invalidate stale entries.
+The least recently used entries are evicted once the cache outgrows its size
+bound.
+"""
+
+import functools
+import hashlib
+import importlib
+import json
+import os
+import sqlite3
+import time
+from typing import List, Optional
+
+from comment_parser.parsers import common
+
+# Default bound on the total size of cached results, in bytes.
+DEFAULT_MAX_SIZE = 256 << 20
+
+_DATABASE = 'comments.sqlite3'
+
+
+def library_version() -> str:
+    """Returns the version of this library, which results depend on.
+
+  Returns:
+    String version, or 'unknown' if the library is not installed.
+  """
+    # importlib.metadata is slow to import, and only needed once cached.
+    metadata = importlib.import_module('importlib.metadata')
+    try:
+        return metadata.version('comment_parser')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+@functools.lru_cache(maxsize=None)
+def results_version() -> str:
+    """Returns the version of the results extraction produces.
+
+  A checkout of this library has no version, so the version of the results
+  also holds a digest of the parsers' sources, which are read once.
+
+  Returns:
+    String library version, see library_version, and digest.
+  """
+    directory = os.path.dirname(common.__file__)
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(('.py', '.c', '.h')):
+            digest.update(name.encode())
+            digest.update(b'\0')
+            with open(os.path.join(directory, name), 'rb') as source:
+                digest.update(source.read())
+    return f'{library_version()}+{digest.hexdigest()[:16]}'
+
+
+class ResultCache():
+    """Size-bounded, least recently used cache of extracted comments.
+
+  The cache is safe to share between processes: each process opens its own
+  connection to the database, and a ResultCache sent to another process (for
+  instance to a worker of extract_comments_many) reconnects there. The hit and
+  miss counters only count lookups made in the current process. Threads may
+  share a ResultCache as long as they use it one at a time. Database errors,
+  such as another process holding a lock for too long, count as misses rather
+  than failing the extraction.
+  """
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_MAX_SIZE):
+        """Initializes ResultCache, creating directory if needed.
+
+    Args:
+      directory: String name of the directory to store the cache in.
+      max_size: Bound on the total size (int) of cached results in bytes.
+    """
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._version = results_version()
+        self._connection = None
+        self._size = 0
+
+    def __getstate__(self):
+        return {'directory': self.directory, 'max_size': self.max_size}
+
+    def __setstate__(self, state):
+        self.__init__(state['directory'], state['max_size'])
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(self.directory, exist_ok=True)
+            connection = sqlite3.connect(os.path.join(self.directory,
+                                                      _DATABASE),
+                                         timeout=30,
+                                         isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS entries ('
+                               'key TEXT PRIMARY KEY, '
+                               'value BLOB NOT NULL, '
+                               'size INTEGER NOT NULL, '
+                               'used REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS entries_used '
+                               'ON entries (used)')
+            self._size = connection.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            self._connection = connection
+        return self._connection
+
+    def key(self, code: str, parser: str) -> str:
+        """Returns the cache key for code handled by the named parser.
+
+    Args:
+      code: String containing the source code.
+      parser: String name of the parser module that handles code.
+    Returns:
+      String
+    """
+        digest = hashlib.sha256()
+        for part in (self._version, parser):
+            digest.update(part.encode())
+            digest.update(b'\0')
+        digest.update(code.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[List[common.Comment]]:
+        """Returns the comments cached under key, or None on a miss.
+
+    Args:
+      key: String cache key, see key().
+    Returns:
+      Python list of common.Comment or None.
+    """
+        try:
+            connection = self._connect()
+            row = connection.execute('SELECT value FROM entries WHERE key = ?',
+                                     (key, )).fetchone()
+            if row is not None:
+                connection.execute('UPDATE entries SET used = ? WHERE key = ?',
+                                   (time.time(), key))
+        except sqlite3.Error:
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [common.Comment(*fields) for fields in json.loads(row[0])]
+
+    def put(self, key: str, comments: List[common.Comment]) -> None:
+        """Caches comments under key, evicting old entries if over max_size.
+
+    Args:
+      key: String cache key, see key().
+      comments: Python list of common.Comment to cache.
+    """
+        value = json.dumps([(comment.text(), comment.line_number(),
+                             comment.is_multiline(), comment.start(),
+                             comment.end(), comment.column())
+                            for comment in comments]).encode()
+        try:
+            connection = self._connect()
+            row = connection.execute('SELECT size FROM entries WHERE key = ?',
+                                     (key, )).fetchone()
+            connection.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                (key, value, len(value), time.time()))
+            # A replaced entry no longer counts towards the size.
+            self._size += len(value) - (row[0] if row is not None else 0)
+            if self._size > self.max_size:
+                self._evict(connection)
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        """Deletes least recently used entries until within max_size."""
+        # Other processes may have added or evicted entries meanwhile.
+        self._size = connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        excess = self._size - self.max_size
+        if excess <= 0:
+            return
+        keys = []
+        cursor = connection.execute(
+            'SELECT key, size FROM entries ORDER BY used')
+        for key, size in cursor:
+            keys.append((key, ))
+            excess -= size
+            self._size -= size
+            if excess <= 0:
+                break
+        cursor.close()
+        connection.executemany('DELETE FROM entries WHERE key = ?', keys)
+
+    def close(self) -> None:
+        """Closes the connection to the database, if open."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,213 @@
+#!/usr/bin/python
+"""This module talks to a comment_parser server over its Unix socket.
+
+A server, see comment_parser.server, keeps the parsers imported and libmagic's
+database loaded between requests. Run as a script, this module is a drop in
+replacement for comment_parser's command line which forwards the call to a
+running server, only falling back to parsing in-process when none is running,
+or when it does not accept the connection within TIMEOUT seconds. Once it
+has, the call runs to completion on the server however long it takes:
+
+  python -m comment_parser.server &
+  python -m comment_parser.client --format jsonl src/foo.c
+
+Requests and responses are JSON objects, each sent as the 4 byte big-endian
+length of its compact UTF-8 encoding followed by the encoding. A connection
+carries a single request and its response.
+"""
+
+import json
+import os
+import socket
+import struct
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+from comment_parser import comment_parser
+
+# Environment variable naming the socket, overriding the default path.
+SOCKET_ENV = 'COMMENT_PARSER_SOCKET'
+
+# Seconds to wait for the server to accept a connection, and then for each
+# part of its response unless waiting for it indefinitely.
+TIMEOUT = 30.0
+
+_LENGTH = struct.Struct('>I')
+
+
+class ServerError(Exception):
+    """Raised when the server fails to handle a request.
+
+  Attributes:
+    kind: String name of the exception the server raised, such as
+      'UnsupportedError' or 'ParseError'.
+  """
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(f'{kind}: {message}' if message else kind)
+        self.kind = kind
+
+
+def socket_path() -> str:
+    """Returns the path of the server's socket.
+
+  Returns:
+    String path: $COMMENT_PARSER_SOCKET if set, else comment_parser.sock in
+      $XDG_RUNTIME_DIR if set, else a file of the user's in the temporary
+      directory.
+  """
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime:
+        return os.path.join(runtime, 'comment_parser.sock')
+    return os.path.join(tempfile.gettempdir(),
+                        f'comment_parser-{os.getuid()}.sock')
+
+
+def send(connection: socket.socket, message: Dict[str, Any]) -> None:
+    """Sends a message over connection.
+
+  Args:
+    connection: Connected socket.
+    message: JSON serializable dict.
+  """
+    data = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    connection.sendall(_LENGTH.pack(len(data)) + data)
+
+
+def _receive_exactly(connection: socket.socket, size: int) -> Optional[bytes]:
+    """Returns the next size bytes from connection, or None at its end."""
+    parts = []
+    while size:
+        part = connection.recv(min(size, 1 << 20))
+        if not part:
+            if parts:
+                raise ConnectionError('Connection closed mid-message')
+            return None
+        parts.append(part)
+        size -= len(part)
+    return b''.join(parts)
+
+
+def receive(connection: socket.socket) -> Optional[Dict[str, Any]]:
+    """Receives a message from connection.
+
+  Args:
+    connection: Connected socket.
+  Returns:
+    Python dict, or None if the connection was closed between messages.
+  Raises:
+    ConnectionError: The connection was closed mid-message.
+  """
+    header = _receive_exactly(connection, _LENGTH.size)
+    if header is None:
+        return None
+    data = _receive_exactly(connection, _LENGTH.unpack(header)[0])
+    if data is None:
+        raise ConnectionError('Connection closed mid-message')
+    return json.loads(data)
+
+
+def request(message: Dict[str, Any],
+            path: Optional[str] = None,
+            timeout: Optional[float] = TIMEOUT,
+            wait: bool = False) -> Dict[str, Any]:
+    """Sends a request to the server and returns its response.
+
+  Args:
+    message: JSON serializable dict, see comment_parser.server.
+    path: Optional path of the server's socket, see socket_path. The socket
+      must belong to the current user.
+    timeout: Seconds (float) to wait for the server to accept the connection
+      and then for each part of its response, or None to wait indefinitely.
+    wait: Boolean whether to wait indefinitely for the response once the
+      request is sent, for requests which may run long, such as main.
+  Returns:
+    Python dict response.
+  Raises:
+    OSError: No server is listening, the socket belongs to another user, or
+      the connection failed or timed out.
+  """
+    path = path or socket_path()
+    # Another user could have created the socket, such as in /tmp, to be sent
+    # the paths of our files.
+    if os.stat(path).st_uid != os.getuid():
+        raise PermissionError(f'Socket {path} belongs to another user')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(path)
+        send(connection, message)
+        if wait:
+            connection.settimeout(None)
+        response = receive(connection)
+    if response is None:
+        raise ConnectionError('The server closed the connection')
+    return response
+
+
+def extract_comments(
+        filename: Optional[str] = None,
+        code: Optional[str] = None,
+        mime: Optional[str] = None,
+        path: Optional[str] = None,
+        **filters: Any) -> List[Tuple[int, bool, int, int, int, str]]:
+    """Has the server extract the comments from a file or from code.
+
+  Args:
+    filename: Optional string name of the file to extract comments from.
+    code: Optional string containing code to extract comments from, if no
+      filename is given.
+    mime: Optional MIME type for the code (str), deduced if not given.
+    path: Optional path of the server's socket, see socket_path.
+    **filters: Keyword arguments selecting comments, as taken by
+      comment_parser.extract_comments: kinds, pattern, lines, max_count,
+      max_offset, leading and docstrings.
+  Returns:
+    Python list of a tuple per comment: its line number (int), whether it is
+      a multi-line comment, its start and end offsets (int), its column (int)
+      and its text.
+  Raises:
+    OSError: No server is listening, or the connection failed.
+    ServerError: The server failed to extract the comments.
+  """
+    message = {'op': 'extract', 'mime': mime, 'filter': filters}
+    if filename is not None:
+        message['path'] = os.path.abspath(filename)
+    else:
+        message['code'] = code
+    response = request(message, path)
+    if 'error' in response:
+        raise ServerError(*response['error'])
+    return [
+        (line, bool(multiline), start, end, column, text)
+        for line, multiline, start, end, column, text in response['comments']
+    ]
+
+
+def main(argv: List[str]) -> int:
+    """Runs comment_parser's command line, on a server if one is running.
+
+  Args:
+    argv: List of command line arguments, as taken by comment_parser.main.
+  Returns:
+    Exit status (int).
+  """
+    try:
+        message = {'op': 'main', 'argv': argv, 'cwd': os.getcwd()}
+        response = request(message, wait=True)
+    except OSError:
+        try:
+            comment_parser.main(argv)
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else 1
+        return 0
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['status']
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
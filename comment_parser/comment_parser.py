@@ -16,39 +16,50 @@ Dependencies:
   python-magic: pip install python-magic (optional)
 """
 
-import sys
-from typing import List, Optional
+from __future__ import annotations
 
-try:
-    import magic
-    HAS_MAGIC = True
-except ImportError:
-    HAS_MAGIC = False
+import argparse
+import functools
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import weakref
+from types import ModuleType
+from typing import (TYPE_CHECKING, Callable, Collection, Iterable, Iterator,
+                    List, MutableMapping, NamedTuple, Optional, Pattern,
+                    TextIO, Tuple, Union)
 
-from comment_parser.parsers import c_parser
+from comment_parser import walker
+# Re-exported, as they were first defined here.
+from comment_parser.mime import (  # pylint: disable=unused-import
+    DETECTION_COUNTS, EXTENSION_MAP, HAS_MAGIC, INTERPRETER_MAP,
+    MAGIC_PREFIX_SIZE, MIME_MAP, MIME_RESOLVERS, Detection, Resolver,
+    mime_from_extension, mime_from_magic, mime_from_shebang)
+from comment_parser.stats import Call, Stats
 from comment_parser.parsers import common
-from comment_parser.parsers import go_parser
-from comment_parser.parsers import html_parser
-from comment_parser.parsers import js_parser
-from comment_parser.parsers import python_parser
-from comment_parser.parsers import ruby_parser
-from comment_parser.parsers import shell_parser
-
-MIME_MAP = {
-    'application/javascript': js_parser,  # Javascript
-    'text/html': html_parser,  # HTML
-    'text/x-c': c_parser,  # C
-    'text/x-c++': c_parser,  # C++/C#
-    'text/x-go': go_parser,  # Go
-    'text/x-java': c_parser,  # Java
-    'text/x-java-source': c_parser,  # Java
-    'text/x-javascript': js_parser,  # Javascript
-    'text/x-python': python_parser,  # Python
-    'text/x-ruby': ruby_parser,  # Ruby
-    'text/x-script.python': python_parser,  # Python
-    'text/x-shellscript': shell_parser,  # Unix shell
-    'text/xml': html_parser,  # XML
-}
+from comment_parser.parsers import table
+
+# asyncio, concurrent.futures and cache, which imports sqlite3, take longer to
+# import than the rest of this module, so they are only imported where used.
+if TYPE_CHECKING:
+    import asyncio
+    import concurrent.futures
+    from comment_parser.cache import ResultCache
+
+# Number of characters iter_comments reads from a file at a time.
+CHUNK_SIZE = 1 << 16
+
+# Number of parses the async functions run at once in an event loop, unless
+# given a semaphore of their own. Read when a loop first parses.
+ASYNC_CONCURRENCY = os.cpu_count() or 1
+
+# Keyed by event loop: the semaphore limiting its parses to ASYNC_CONCURRENCY.
+_SEMAPHORES: MutableMapping[asyncio.AbstractEventLoop,
+                            asyncio.Semaphore] = weakref.WeakKeyDictionary()
 
 
 class Error(Exception):
@@ -63,65 +74,925 @@ class ParseError(Error):
     """Raised when a parser issue is encountered."""
 
 
-def extract_comments(filename: str,
-                     mime: Optional[str] = None) -> List[common.Comment]:
+class _Options(NamedTuple):
+    """Options of an extraction, passed along by the functions implementing
+  it. See extract_comments."""
+    mime: Optional[str] = None
+    cache: Optional[ResultCache] = None
+    stats: Optional[Stats] = None
+    comment_filter: Optional[common.Filter] = None
+    limits: Optional[common.Limits] = None
+
+
+def detect_mime(code: str, filename: Optional[str] = None) -> Detection:
+    """Deduces the MIME type of code, trying each of MIME_RESOLVERS in turn.
+
+  Args:
+    code: String containing code, or a leading part of it.
+    filename: Optional string name of the file code comes from.
+  Returns:
+    Detection with the MIME type and the name of the strategy that found it.
+  Raises:
+    UnsupportedError: If no strategy could deduce the MIME type.
+    ImportError: If libmagic is needed but python-magic is not installed.
+  """
+    for strategy, resolver in MIME_RESOLVERS:
+        mime = resolver(code, filename)
+        if mime:
+            DETECTION_COUNTS[strategy] += 1
+            return Detection(mime, strategy)
+    raise UnsupportedError('Could not deduce MIME type')
+
+
+def extract_comments(  # pylint: disable=too-many-arguments
+        filename: str,
+        mime: Optional[str] = None,
+        *,
+        cache: Optional[ResultCache] = None,
+        stats: Optional[Stats] = None,
+        kinds: Union[str, Collection[str], None] = None,
+        pattern: Union[str, Pattern[str], None] = None,
+        lines: Optional[Tuple[Optional[int], Optional[int]]] = None,
+        max_count: Optional[int] = None,
+        max_offset: Optional[int] = None,
+        leading: bool = False,
+        docstrings: bool = False,
+        limits: Optional[common.Limits] = None) -> List[common.Comment]:
     """Extracts and returns the comments from the given source file.
 
+  Comments not selected by kinds, pattern, lines, max_count, max_offset and
+  leading are dropped by the parser before they are built, see
+  parsers.common.Filter. Unless given a cache, the file is then only read as
+  far as it is scanned, so extracting a license header from a huge file costs
+  no more than from a small one.
+
   Args:
     filename: String name of the file to extract comments from.
     mime: Optional MIME type for file (str). Note some MIME types accepted
       don't comply with RFC2045. If not given, an attempt to deduce the
-      MIME type will occur.
+      MIME type will occur, see detect_mime.
+    cache: Optional cache.ResultCache to look results up in and store them in.
+    stats: Optional stats.Stats to record the extraction's timings in.
+    kinds, pattern, lines, max_count, max_offset, leading, docstrings: Select
+      the comments to extract, see extract_comments_from_str.
+    limits: Optional parsers.common.Limits bounding the extraction, such as
+      of untrusted code. Unless given a cache, the file is then read no
+      further than max_size.
   Returns:
     Python list of parsers.common.Comment in the order that they appear in
       the source file.
   Raises:
     UnsupportedError: If filename is of an unsupported MIME type.
+    ValueError: If kinds holds an unknown kind.
+    parsers.common.LimitExceededError: If a bound of limits was exceeded.
   """
-    with open(filename, 'r', encoding='utf-8') as code:
-        return extract_comments_from_str(code.read(), mime)
+    comment_filter = make_filter(kinds=kinds,
+                                 pattern=pattern,
+                                 lines=lines,
+                                 max_count=max_count,
+                                 max_offset=max_offset,
+                                 leading=leading,
+                                 docstrings=docstrings)
+    return _extract_file_comments(
+        filename, _Options(mime, cache, stats, comment_filter, limits))
+
+
+def _extract_file_comments(filename: str,
+                           options: _Options) -> List[common.Comment]:
+    """Implements extract_comments."""
+    comment_filter = options.comment_filter
+    if options.cache is None and (options.limits is not None or
+                                  (comment_filter is not None
+                                   and comment_filter.bounded)):
+        return _extract_comments_streamed(filename, options)
+    if options.stats is None:
+        code = _read(filename, options.limits)
+        return _extract_comments(code, get_parser(code, options.mime,
+                                                  filename), options)[0]
+    start = time.perf_counter()
+    try:
+        code = _read(filename, options.limits)
+    except (OSError, UnicodeDecodeError, common.LimitExceededError) as e:
+        options.stats.record(
+            Call(filename, None, None, 0, 0,
+                 time.perf_counter() - start, 0.0, 0.0, False,
+                 type(e).__name__))
+        raise
+    return _extract_comments_measured(code, filename, options,
+                                      time.perf_counter() - start)
+
+
+def _read(filename: str, limits: Optional[common.Limits]) -> str:
+    """Reads a file, failing rather than reading past limits' max_size."""
+    with open(filename, 'r', encoding='utf-8') as source:
+        if limits is None or limits.max_size is None:
+            return source.read()
+        code = source.read(limits.max_size + 1)
+    if len(code) > limits.max_size:
+        raise common.LimitExceededError('max_size')
+    return code
 
 
-def extract_comments_from_str(code: str,
-                              mime: Optional[str] = None
-                              ) -> List[common.Comment]:
+def _read_chunks(source: TextIO, stats: Optional[Stats],
+                 timings: List[float]) -> Iterator[str]:
+    """Yields the chunks of source, growing from MAGIC_PREFIX_SIZE to
+  CHUNK_SIZE characters.
+
+  With stats, the time spent reading and the characters read are added to
+  timings[0] and timings[1].
+  """
+    chunk_size = MAGIC_PREFIX_SIZE
+    while True:
+        if stats is None:
+            chunk = source.read(chunk_size)
+        else:
+            start = time.perf_counter()
+            chunk = source.read(chunk_size)
+            timings[0] += time.perf_counter() - start
+            timings[1] += len(chunk)
+        if not chunk:
+            return
+        yield chunk
+        chunk_size = min(2 * chunk_size, CHUNK_SIZE)
+
+
+def _extract_comments_streamed(filename: str,
+                               options: _Options) -> List[common.Comment]:
+    """extract_comments, reading the file only as far as it is scanned."""
+    parser = detection = error = None
+    comments = []
+    # Time spent reading, characters read and time spent detecting.
+    timings = [0.0, 0, 0.0]
+    start = time.perf_counter()
+    try:
+        with open(filename, 'r', encoding='utf-8') as source:
+            chunks = _read_chunks(source, options.stats, timings)
+            first_chunk = next(chunks, '')
+            parser, detection = _detect(first_chunk, options.mime, filename,
+                                        timings)
+            comments = _parse_chunks(parser,
+                                     itertools.chain((first_chunk, ), chunks),
+                                     options.comment_filter, options.limits)
+        return comments
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        if options.stats is not None:
+            parse = time.perf_counter() - start - timings[0] - timings[2]
+            options.stats.record(
+                Call(filename, parser and parser.__name__.rsplit('.', 1)[-1],
+                     detection, timings[1], len(comments), timings[0],
+                     timings[2], max(parse, 0.0), False, error))
+
+
+def _detect(code: str, mime: Optional[str], filename: Optional[str],
+            timings: List[float]) -> Tuple[ModuleType, Optional[str]]:
+    """Returns the parser for code and the strategy which deduced its MIME
+  type, if not given.
+
+  The time spent is set in timings[2], even if detection fails.
+  """
+    detection = None
+    start = time.perf_counter()
+    try:
+        if not mime:
+            mime, detection = detect_mime(code, filename)
+        return get_parser(code, mime, filename), detection
+    finally:
+        timings[2] = time.perf_counter() - start
+
+
+def _parse_chunks(parser: ModuleType, chunks: Iterable[str],
+                  comment_filter: Optional[common.Filter],
+                  limits: Optional[common.Limits]) -> List[common.Comment]:
+    """Parses code arriving in chunks with parser, within limits if given."""
+    try:
+        if limits is None:
+            return list(parser.iter_comments(chunks, comment_filter))
+        return limits.extract(
+            functools.partial(parser.iter_comments,
+                              comment_filter=comment_filter), chunks)
+    except common.LimitExceededError:
+        raise
+    except common.Error as e:
+        raise ParseError() from e
+
+
+def make_filter(  # pylint: disable=too-many-arguments
+        *,
+        kinds: Union[str, Collection[str], None] = None,
+        pattern: Union[str, Pattern[str], None] = None,
+        lines: Optional[Tuple[Optional[int], Optional[int]]] = None,
+        max_count: Optional[int] = None,
+        max_offset: Optional[int] = None,
+        leading: bool = False,
+        docstrings: bool = False) -> Optional[common.Filter]:
+    """Returns the parsers.common.Filter selecting comments as described.
+
+  Args:
+    kinds: Optional kind, or collection of the kinds, of comments to select,
+      of parsers.common.KINDS: 'line' and 'multiline'.
+    pattern: Optional regular expression (str or compiled) which comment
+      texts must contain a match of.
+    lines: Optional tuple of the first and last line numbers (int, inclusive)
+      of the comments to select, either of which may be None. Scanning stops
+      past the last line.
+    max_count: Optional number (int) of comments to select at most, after
+      which scanning stops.
+    max_offset: Optional number (int) of leading characters comments must
+      start in, past which scanning stops.
+    leading: Boolean whether to select only the comments before any code,
+      such as license headers, scanning stopping at the first code.
+    docstrings: Boolean whether to also select docstrings, of languages which
+      have them, as multi-line comments.
+  Returns:
+    parsers.common.Filter, or None if all comments are selected.
+  Raises:
+    ValueError: If kinds holds an unknown kind.
+  """
+    if not (leading or docstrings) and all(
+            value is None
+            for value in (kinds, pattern, lines, max_count, max_offset)):
+        return None
+    if kinds is None:
+        kinds = common.KINDS
+    elif isinstance(kinds, str):
+        kinds = (kinds, )
+    kinds = frozenset(kinds)
+    unknown = kinds.difference(common.KINDS)
+    if unknown:
+        raise ValueError(f'Unknown kinds of comments {sorted(unknown)}')
+    if isinstance(pattern, str):
+        pattern = re.compile(pattern)
+    first_line, last_line = lines or (None, None)
+    return common.Filter(kinds, pattern, first_line or 1, last_line, max_count,
+                         max_offset, leading, docstrings)
+
+
+def get_parser(code: str,
+               mime: Optional[str] = None,
+               filename: Optional[str] = None) -> ModuleType:
+    """Returns the parser module for code.
+
+  Args:
+    code: String containing the code to parse.
+    mime: Optional MIME type for code (str). If not given, an attempt to
+      deduce the MIME type will occur, see detect_mime.
+    filename: Optional string name of the file code comes from, used only to
+      deduce the MIME type.
+  Returns:
+    Module of comment_parser.parsers handling code's MIME type.
+  Raises:
+    UnsupportedError: If code is of an unsupported MIME type.
+  """
+    if not mime:
+        mime = detect_mime(code, filename).mime
+    if mime not in MIME_MAP:
+        raise UnsupportedError(f'Unsupported MIME type {mime}')
+    return MIME_MAP[mime]
+
+
+def _get_bytes_parser(code: common.Buffer, mime: Optional[str],
+                      filename: Optional[str]):
+    """Returns the parser module for encoded code, see get_parser."""
+    if not mime:
+        with memoryview(code) as view:
+            prefix = str(view[:MAGIC_PREFIX_SIZE], 'utf-8', 'ignore')
+        mime = detect_mime(prefix, filename).mime
+    return get_parser('', mime, filename)
+
+
+def extract_comments_from_str(  # pylint: disable=too-many-arguments
+        code: str,
+        mime: Optional[str] = None,
+        *,
+        filename: Optional[str] = None,
+        cache: Optional[ResultCache] = None,
+        stats: Optional[Stats] = None,
+        kinds: Union[str, Collection[str], None] = None,
+        pattern: Union[str, Pattern[str], None] = None,
+        lines: Optional[Tuple[Optional[int], Optional[int]]] = None,
+        max_count: Optional[int] = None,
+        max_offset: Optional[int] = None,
+        leading: bool = False,
+        docstrings: bool = False,
+        limits: Optional[common.Limits] = None) -> List[common.Comment]:
     """Extracts and returns comments from the given source string.
 
+  Comments not selected by kinds, pattern, lines, max_count, max_offset and
+  leading are dropped by the parser before they are built, see
+  parsers.common.Filter.
+
   Args:
     code: String containing code to extract comments from.
     mime: Optional MIME type for code (str). Note some MIME types accepted
       don't comply with RFC2045. If not given, an attempt to deduce the
-      MIME type will occur.
+      MIME type will occur, see detect_mime.
+    filename: Optional string name of the file code comes from, used only to
+      deduce the MIME type.
+    cache: Optional cache.ResultCache to look results up in and store them in.
+    stats: Optional stats.Stats to record the extraction's timings in.
+    kinds: Optional kind, or collection of the kinds, of comments to extract,
+      of parsers.common.KINDS: 'line' and 'multiline'.
+    pattern: Optional regular expression (str or compiled) which comment
+      texts must contain a match of.
+    lines: Optional tuple of the first and last line numbers (int, inclusive)
+      of the comments to extract, either of which may be None. Scanning stops
+      past the last line.
+    max_count: Optional number (int) of comments to extract at most, after
+      which scanning stops.
+    max_offset: Optional number (int) of leading characters comments must
+      start in, past which scanning stops.
+    leading: Boolean whether to extract only the comments before any code,
+      such as license headers, scanning stopping at the first code.
+    docstrings: Boolean whether to also extract docstrings, of languages
+      which have them, as multi-line comments.
+    limits: Optional parsers.common.Limits bounding the extraction, such as
+      of untrusted code.
   Returns:
     Python list of parsers.common.Comment in the order that they appear in
       the source code.
   Raises:
     UnsupportedError: If code is of an unsupported MIME type.
+    ValueError: If kinds holds an unknown kind.
+    parsers.common.LimitExceededError: If a bound of limits was exceeded.
   """
-    if not mime:
-        if not HAS_MAGIC:
-            raise ImportError('python-magic was not imported')
-        mime = magic.from_buffer(code, mime=True)
-        if isinstance(mime, bytes):
-            mime = mime.decode('utf-8')
-    if mime not in MIME_MAP:
-        raise UnsupportedError(f'Unsupported MIME type {mime}')
+    comment_filter = make_filter(kinds=kinds,
+                                 pattern=pattern,
+                                 lines=lines,
+                                 max_count=max_count,
+                                 max_offset=max_offset,
+                                 leading=leading,
+                                 docstrings=docstrings)
+    options = _Options(mime, cache, stats, comment_filter, limits)
+    if stats is not None:
+        return _extract_comments_measured(code, filename, options, 0.0)
+    return _extract_comments(code, get_parser(code, mime, filename),
+                             options)[0]
+
+
+def _extract_comments(code: str, parser,
+                      options: _Options) -> Tuple[List[common.Comment], bool]:
+    """Parses code with parser, or looks its comments up in cache.
+
+  The cache holds all of the comments, and docstrings if comment_filter
+  selects them, which comment_filter is then applied to. Returns the comments
+  and whether they came from the cache. Comments from the cache are checked
+  against limits, and only complete parses are cached.
+  """
+    cache, comment_filter, limits = (options.cache, options.comment_filter,
+                                     options.limits)
+    if cache is None:
+        try:
+            if limits is not None:
+                return limits.extract(
+                    functools.partial(parser.iter_comments,
+                                      comment_filter=comment_filter),
+                    common.split(code, comment_filter)), False
+            return parser.extract_comments(code, comment_filter), False
+        except common.LimitExceededError:
+            raise
+        except common.Error as e:
+            raise ParseError() from e
+    everything = None
+    name = parser.__name__
+    if comment_filter is not None and comment_filter.docstrings:
+        everything = common.Filter(docstrings=True)
+        name += ':docstrings'
+    key = cache.key(code, name)
+    comments = cache.get(key)
+    cached = comments is not None
+    if not cached:
+        try:
+            if limits is not None:
+                comments = limits.extract(
+                    functools.partial(parser.iter_comments,
+                                      comment_filter=everything), (code, ))
+            else:
+                comments = parser.extract_comments(code, everything)
+        except common.LimitExceededError:
+            raise
+        except common.Error as e:
+            raise ParseError() from e
+        cache.put(key, comments)
+    elif limits is not None:
+        limits.check(comments, len(code))
+    if comment_filter is not None:
+        comments = comment_filter.apply(comments, code)
+    return comments, cached
+
+
+def _extract_comments_measured(code: str, filename: Optional[str],
+                               options: _Options,
+                               read: float) -> List[common.Comment]:
+    """extract_comments_from_str, recording a stats.Call of each phase in
+  options.stats. read is the time spent reading code."""
+    parser = detection = error = None
+    comments = []
+    cached = False
+    # Time spent reading, characters read and time spent detecting.
+    timings = [read, len(code), 0.0]
+    start = time.perf_counter()
+    try:
+        parser, detection = _detect(code, options.mime, filename, timings)
+        comments, cached = _extract_comments(code, parser, options)
+        return comments
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        if options.stats is not None:
+            parse = time.perf_counter() - start - timings[2]
+            options.stats.record(
+                Call(filename, parser and parser.__name__.rsplit('.', 1)[-1],
+                     detection, len(code), len(comments), read, timings[2],
+                     max(parse, 0.0), cached, error))
+
+
+def extract_comments_from_bytes(
+        code: common.Buffer,
+        mime: Optional[str] = None,
+        filename: Optional[str] = None) -> List[common.Comment]:
+    """Extracts and returns comments from the given encoded source.
+
+  Unlike with extract_comments_from_str, the code is never decoded as a
+  whole: comments are located in the raw bytes and only their text is
+  decoded. A memory mapped file is thus parsed without reading it into memory:
+
+    with open(filename, 'rb') as source, mmap.mmap(
+        source.fileno(), 0, access=mmap.ACCESS_READ) as code:
+      comments = extract_comments_from_bytes(code, filename=filename)
+
+  Offsets and columns of the comments count bytes rather than characters.
+
+  Args:
+    code: Bytes-like object, such as bytes, an mmap.mmap or a memoryview,
+      holding UTF-8 encoded code. Python scripts may declare another encoding.
+    mime: Optional MIME type for code (str). Note some MIME types accepted
+      don't comply with RFC2045. If not given, an attempt to deduce the
+      MIME type will occur, see detect_mime.
+    filename: Optional string name of the file code comes from, used only to
+      deduce the MIME type.
+  Returns:
+    Python list of parsers.common.Comment in the order that they appear in
+      the source code.
+  Raises:
+    UnsupportedError: If code is of an unsupported MIME type.
+    ParseError: If code could not be parsed.
+  """
+    parser = _get_bytes_parser(code, mime, filename)
+    try:
+        return parser.extract_comments_from_bytes(code)
+    except common.Error as e:
+        raise ParseError() from e
+
+
+def extract_comment_table(  # pylint: disable=too-many-arguments
+        code: Union[str, common.Buffer],
+        mime: Optional[str] = None,
+        *,
+        filename: Optional[str] = None,
+        kinds: Union[str, Collection[str], None] = None,
+        pattern: Union[str, Pattern[str], None] = None,
+        lines: Optional[Tuple[Optional[int], Optional[int]]] = None,
+        max_count: Optional[int] = None,
+        max_offset: Optional[int] = None,
+        leading: bool = False,
+        docstrings: bool = False) -> table.CommentTable:
+    """Extracts the comments from the given source into a compact table.
+
+  A parsers.table.CommentTable holds the offsets of the comments into code
+  rather than copies of their texts, which are only sliced out as comments
+  are accessed. Comment dense code, such as generated code, is thus parsed
+  in a fraction of the memory extract_comments_from_str takes:
+
+    table = extract_comment_table(code, 'text/x-c')
+    for start, end in zip(table.starts, table.ends):
+      ...
+    comments = table[100:200]  # Another table, sharing code.
+    text = table[100].text()   # Comments are built when accessed.
+
+  Bytes-like code is handled as by extract_comments_from_bytes, and must not
+  be closed while the table is used.
+
+  Args:
+    code: String, or bytes-like object such as an mmap.mmap holding UTF-8
+      encoded code, containing code to extract comments from.
+    mime: Optional MIME type for code (str). Note some MIME types accepted
+      don't comply with RFC2045. If not given, an attempt to deduce the
+      MIME type will occur, see detect_mime.
+    filename: Optional string name of the file code comes from, used only to
+      deduce the MIME type.
+    kinds, pattern, lines, max_count, max_offset, leading, docstrings: Select
+      the comments to extract, see extract_comments_from_str.
+  Returns:
+    parsers.table.CommentTable of the comments in the order that they
+      appear in the source code.
+  Raises:
+    UnsupportedError: If code is of an unsupported MIME type.
+    ParseError: If code could not be parsed.
+    ValueError: If kinds holds an unknown kind.
+  """
+    comment_filter = make_filter(kinds=kinds,
+                                 pattern=pattern,
+                                 lines=lines,
+                                 max_count=max_count,
+                                 max_offset=max_offset,
+                                 leading=leading,
+                                 docstrings=docstrings)
+    if isinstance(code, str):
+        parser = get_parser(code, mime, filename)
+    else:
+        parser = _get_bytes_parser(code, mime, filename)
+    try:
+        return parser.extract_comment_table(code, comment_filter)
+    except common.Error as e:
+        raise ParseError() from e
+
+
+def iter_comments(file_or_path: Union[str, os.PathLike, TextIO],
+                  mime: Optional[str] = None,
+                  chunk_size: int = CHUNK_SIZE) -> Iterator[common.Comment]:
+    """Yields the comments from the given source file as they are found.
+
+  The file is read and parsed in chunks, so memory use is bounded by the
+  longest comment or string literal rather than by the size of the file.
+
+  Args:
+    file_or_path: String name of, or text file object open on, the file to
+      extract comments from.
+    mime: Optional MIME type for file (str). Note some MIME types accepted
+      don't comply with RFC2045. If not given, an attempt to deduce the
+      MIME type from the first chunk will occur.
+    chunk_size: Number of characters (int) read from the file at a time.
+  Yields:
+    parsers.common.Comment in the order that they appear in the source file.
+  Raises:
+    UnsupportedError: If the file is of an unsupported MIME type.
+    ParseError: If the file could not be parsed.
+  """
+    if isinstance(file_or_path, (str, os.PathLike)):
+        with open(file_or_path, 'r', encoding='utf-8') as code:
+            yield from iter_comments(code, mime, chunk_size)
+        return
+    chunks = iter(lambda: file_or_path.read(chunk_size), '')
+    first_chunk = next(chunks, '')
+    filename = getattr(file_or_path, 'name', None)
+    parser = get_parser(first_chunk, mime,
+                        filename if isinstance(filename, str) else None)
     try:
-        parser = MIME_MAP[mime]
-        return parser.extract_comments(code)
+        yield from parser.iter_comments(
+            itertools.chain((first_chunk, ), chunks))
     except common.Error as e:
         raise ParseError() from e
 
 
+def _extract_comments_chunk(
+    filenames: List[str], options: _Options
+) -> Tuple[List[Tuple[str, Union[List[common.Comment], Exception]]],
+           Optional[Stats]]:
+    """Extracts comments from each file, capturing per-file errors.
+
+  Returns the results along with options.stats, which worker processes
+  record in a copy of.
+  """
+    results = []
+    for filename in filenames:
+        try:
+            results.append(
+                (filename, _extract_file_comments(filename, options)))
+        except (Error, ImportError, OSError, UnicodeDecodeError,
+                common.LimitExceededError) as exception:
+            results.append((filename, exception))
+    return results, options.stats
+
+
+def extract_comments_many(  # pylint: disable=too-many-arguments
+    filenames: Iterable[str],
+    *,
+    workers: Optional[int] = None,
+    mime: Optional[str] = None,
+    chunksize: int = 64,
+    cache: Optional[ResultCache] = None,
+    stats: Optional[Stats] = None,
+    comment_filter: Optional[common.Filter] = None,
+    limits: Optional[common.Limits] = None
+) -> Iterator[Tuple[str, Union[List[common.Comment], Exception]]]:
+    """Extracts comments from many source files using a pool of processes.
+
+  Files are handed to the worker processes in chunks, and filenames are
+  consumed lazily so they may come from a generator. A file that fails to
+  parse or read does not abort the batch; its exception is returned in place
+  of its comments.
+
+  Args:
+    filenames: Iterable of string names of files to extract comments from.
+    workers: Optional number of worker processes (int). Defaults to the
+      number of CPUs. With a single worker files are processed in order, in
+      the calling process.
+    mime: Optional MIME type for all files (str). If not given, the MIME type
+      of each file is deduced.
+    chunksize: Number of files (int) sent to a worker at a time.
+    cache: Optional cache.ResultCache to look results up in and store them in.
+      Worker processes open their own connection to it, and their lookups are
+      not reflected in its hit and miss counters.
+    stats: Optional stats.Stats to record the timings of each file in. Calls
+      made in worker processes are recorded as their chunk finishes.
+    comment_filter: Optional parsers.common.Filter selecting the comments to
+      extract, see make_filter.
+    limits: Optional parsers.common.Limits bounding the extraction of each
+      file.
+  Yields:
+    Tuples of filename and either a Python list of parsers.common.Comment or
+      the UnsupportedError, ParseError, OSError, UnicodeDecodeError or
+      parsers.common.LimitExceededError raised for that file, or ImportError
+      if its MIME type could only be deduced with python-magic, as files
+      finish.
+  """
+    options = _Options(mime, cache, stats, comment_filter, limits)
+    if workers == 1:
+        for filename in filenames:
+            yield from _extract_comments_chunk([filename], options)[0]
+        return
+    workers = workers or os.cpu_count() or 1
+    yield from _extract_comments_pooled(iter(filenames), workers, chunksize,
+                                        options)
+
+
+def _extract_comments_pooled(
+    filenames: Iterator[str], workers: int, chunksize: int, options: _Options
+) -> Iterator[Tuple[str, Union[List[common.Comment], Exception]]]:
+    """extract_comments_many, with a pool of worker processes."""
+    chunks = iter(lambda: list(itertools.islice(filenames, chunksize)), [])
+    stats = options.stats
+    # Workers record their calls in copies of stats, merged in as chunks
+    # finish.
+    worker_options = options._replace(stats=None if stats is None else Stats())
+
+    def results(future):
+        chunk_results, chunk_stats = future.result()
+        if stats is not None and chunk_stats is not None:
+            stats.merge(chunk_stats)
+        return chunk_results
+
+    from concurrent import futures  # pylint: disable=import-outside-toplevel
+    with futures.ProcessPoolExecutor(workers) as executor:
+        # Bound the chunks in flight so huge inputs are not queued all at once.
+        max_pending = 2 * workers
+        pending = set()
+        for chunk in chunks:
+            pending.add(
+                executor.submit(_extract_comments_chunk, chunk,
+                                worker_options))
+            if len(pending) < max_pending:
+                continue
+            done, pending = futures.wait(pending,
+                                         return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                yield from results(future)
+        for future in futures.as_completed(pending):
+            yield from results(future)
+
+
+def _extract_comments_until_cancelled(
+        code: str, mime: Optional[str], filename: Optional[str],
+        cancelled: Optional[threading.Event]) -> List[common.Comment]:
+    """Extracts comments from code, in chunks so as to stop once cancelled."""
+    parser = get_parser(code, mime, filename)
+    if cancelled is None:
+        chunks = (code, )
+    else:
+        chunks = _chunks_until_cancelled(code, cancelled)
+    try:
+        return list(parser.iter_comments(chunks))
+    except common.Error as e:
+        raise ParseError() from e
+
+
+def _chunks_until_cancelled(code: str,
+                            cancelled: threading.Event) -> Iterator[str]:
+    for start in range(0, len(code), CHUNK_SIZE):
+        if cancelled.is_set():
+            # pylint: disable-next=import-outside-toplevel
+            from concurrent import futures
+            raise futures.CancelledError()
+        yield code[start:start + CHUNK_SIZE]
+
+
+def _read_and_extract_comments(
+        filename: str, mime: Optional[str],
+        cancelled: Optional[threading.Event]) -> List[common.Comment]:
+    with open(filename, 'r', encoding='utf-8') as code:
+        return _extract_comments_until_cancelled(code.read(), mime, filename,
+                                                 cancelled)
+
+
+async def _run_parse(
+        function: Callable[..., List[common.Comment]], args: Tuple,
+        executor: Optional[concurrent.futures.Executor],
+        semaphore: Optional[asyncio.Semaphore]) -> List[common.Comment]:
+    """Runs function(*args, cancelled) in executor once semaphore allows.
+
+  cancelled is a threading.Event set if the awaiting task is cancelled, or
+  None for process pools, which it cannot be sent to.
+  """
+    import asyncio  # pylint: disable=import-outside-toplevel
+    from concurrent import futures  # pylint: disable=import-outside-toplevel
+    loop = asyncio.get_running_loop()
+    if semaphore is None:
+        semaphore = _SEMAPHORES.get(loop)
+        if semaphore is None:
+            semaphore = _SEMAPHORES[loop] = asyncio.Semaphore(
+                ASYNC_CONCURRENCY)
+    cancelled = None
+    if not isinstance(executor, futures.ProcessPoolExecutor):
+        cancelled = threading.Event()
+    await semaphore.acquire()
+    try:
+        future = loop.run_in_executor(executor, function, *args, cancelled)
+    except BaseException:
+        semaphore.release()
+        raise
+    # A cancelled parse keeps its slot for as long as it goes on.
+    future.add_done_callback(lambda _: semaphore.release())
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        if cancelled is not None:
+            cancelled.set()
+        raise
+
+
+async def aextract_comments(
+        filename: str,
+        mime: Optional[str] = None,
+        executor: Optional[concurrent.futures.Executor] = None,
+        semaphore: Optional[asyncio.Semaphore] = None) -> List[common.Comment]:
+    """Extracts the comments from the given source file without blocking.
+
+  The file is read and parsed in executor, see aextract_comments_from_str.
+
+  Args:
+    filename: String name of the file to extract comments from.
+    mime, executor, semaphore: See aextract_comments_from_str.
+  Returns:
+    Python list of parsers.common.Comment in the order that they appear in
+      the source file.
+  Raises:
+    UnsupportedError: If filename is of an unsupported MIME type.
+    ParseError: If the file could not be parsed.
+  """
+    return await _run_parse(_read_and_extract_comments, (filename, mime),
+                            executor, semaphore)
+
+
+async def aextract_comments_from_str(
+        code: str,
+        mime: Optional[str] = None,
+        filename: Optional[str] = None,
+        executor: Optional[concurrent.futures.Executor] = None,
+        semaphore: Optional[asyncio.Semaphore] = None) -> List[common.Comment]:
+    """Extracts comments from the given source string without blocking.
+
+  The code is parsed in executor, after acquiring semaphore, which bounds the
+  parses running at once so a huge input cannot hold up the others for
+  long. Cancelling the awaiting task stops the parse: in thread pools, code
+  is parsed CHUNK_SIZE characters at a time, stopping at the next chunk once
+  cancelled; in process pools, parses run to their end. Until it stops, a
+  cancelled parse keeps holding semaphore.
+
+  Args:
+    code: String containing code to extract comments from.
+    mime: Optional MIME type for code (str). Note some MIME types accepted
+      don't comply with RFC2045. If not given, an attempt to deduce the
+      MIME type will occur, see detect_mime.
+    filename: Optional string name of the file code comes from, used only to
+      deduce the MIME type.
+    executor: Optional concurrent.futures.Executor to parse in. Defaults to
+      the event loop's default executor.
+    semaphore: Optional asyncio.Semaphore to acquire while parsing. Defaults
+      to one per event loop, allowing ASYNC_CONCURRENCY parses at once.
+  Returns:
+    Python list of parsers.common.Comment in the order that they appear in
+      the source code.
+  Raises:
+    UnsupportedError: If code is of an unsupported MIME type.
+    ParseError: If code could not be parsed.
+  """
+    return await _run_parse(_extract_comments_until_cancelled,
+                            (code, mime, filename), executor, semaphore)
+
+
 def main(argv):
     """Extracts comments from files and prints them to stdout."""
-    for filename in argv:
-        try:
-            comments = extract_comments(filename)
-            for comment in comments:
+    parser = argparse.ArgumentParser(
+        description='Extracts comments from source files.')
+    parser.add_argument('paths',
+                        nargs='*',
+                        help='files to parse, and directories to search for '
+                        'files to parse')
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=1,
+        help='number of worker processes; output order is not preserved '
+        'when greater than 1')
+    parser.add_argument('--mime',
+                        help='MIME type of all files, deduced if not given')
+    parser.add_argument('--cache-dir',
+                        help='directory to cache results in across runs')
+    parser.add_argument('--include',
+                        action='append',
+                        default=[],
+                        metavar='GLOB',
+                        help='of the files found in directories, only parse '
+                        'those which match this gitignore-style glob; '
+                        'repeatable')
+    parser.add_argument('--exclude',
+                        action='append',
+                        default=[],
+                        metavar='GLOB',
+                        help='skip files and directories which match this '
+                        'gitignore-style glob; repeatable')
+    parser.add_argument('--no-gitignore',
+                        dest='gitignore',
+                        action='store_false',
+                        help='do not skip files ignored by .gitignore files')
+    parser.add_argument('--stats',
+                        action='store_true',
+                        help='print a summary of the time spent reading, '
+                        'detecting and parsing files to stderr')
+    parser.add_argument('--leading',
+                        action='store_true',
+                        help='only extract the comments before any code, '
+                        'such as license headers, reading files no further')
+    parser.add_argument('--max-count',
+                        type=int,
+                        metavar='N',
+                        help='stop reading each file after N comments')
+    parser.add_argument('--max-lines',
+                        type=int,
+                        metavar='N',
+                        help='stop reading each file after N lines')
+    parser.add_argument('--max-chars',
+                        type=int,
+                        metavar='N',
+                        help='stop reading each file after N characters')
+    parser.add_argument('--docstrings',
+                        action='store_true',
+                        help='also extract docstrings, as multi-line comments')
+    parser.add_argument('--format',
+                        choices=('text', 'jsonl'),
+                        default='text',
+                        help='print the text of comments, or JSON Lines with '
+                        'the path, line, multiline and text of each comment')
+    args = parser.parse_args(argv)
+    cache = None
+    if args.cache_dir:
+        from comment_parser.cache import ResultCache  # pylint: disable=import-outside-toplevel
+        cache = ResultCache(args.cache_dir)
+    stats = Stats() if args.stats else None
+    comment_filter = make_filter(
+        lines=(None, args.max_lines) if args.max_lines is not None else None,
+        max_count=args.max_count,
+        max_offset=args.max_chars,
+        leading=args.leading,
+        docstrings=args.docstrings)
+    # Files found in directories which turn out not to be supported source
+    # code, or not to be text, are skipped quietly.
+    named = {path for path in args.paths if not os.path.isdir(path)}
+    filenames = walker.walk(args.paths, args.include, args.exclude,
+                            args.gitignore)
+    for filename, result in extract_comments_many(
+            filenames,
+            workers=args.jobs,
+            mime=args.mime,
+            cache=cache,
+            stats=stats,
+            comment_filter=comment_filter):
+        if isinstance(result, Exception):
+            if filename in named or not isinstance(
+                    result,
+                (UnsupportedError, ImportError, UnicodeDecodeError)):
+                sys.stderr.write(str(result))
+            continue
+        if args.format == 'jsonl':
+            for comment in result:
+                sys.stdout.write(
+                    json.dumps({
+                        'path': filename,
+                        'line': comment.line_number(),
+                        'multiline': comment.is_multiline(),
+                        'text': comment.text(),
+                    }) + '\n')
+            sys.stdout.flush()
+        else:
+            for comment in result:
                 print(comment.text())
-        except Error as exception:
-            sys.stderr.write(str(exception))
+    if stats is not None:
+        sys.stderr.write(stats.summary())
 
 
 if __name__ == '__main__':
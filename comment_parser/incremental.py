@@ -0,0 +1,341 @@
+#!/usr/bin/python
+"""This module provides incremental comment extraction for edited code.
+
+A Document holds source code along with the comments found in it and
+checkpoints, offsets outside of any comment or literal where scanning can
+resume. When the code is edited, scanning restarts from the last checkpoint
+or comment before the edit and stops as soon as it falls back in step with
+the previous scan, at a comment or checkpoint that merely moved by the edit.
+The comments past that point are reused, shifted by the edit, so typing in a
+large file only rescans the code around the cursor.
+
+Parsers without a common.Language, such as python_parser, parse the whole
+code again on every edit.
+"""
+
+import bisect
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from comment_parser import comment_parser
+from comment_parser.parsers import common
+
+# Distance in characters between the checkpoints recorded while scanning.
+CHECKPOINT_INTERVAL = 4096
+
+
+class Change(NamedTuple):
+    """The effect of an edit on a Document's comments.
+
+  The comments removed by the edit were at index in the previous comments,
+  and the comments added in their place are at index in comments. The
+  comments past them are the previous ones, moved by the edit.
+  """
+    comments: List[common.Comment]
+    index: int
+    removed: List[common.Comment]
+    added: List[common.Comment]
+
+
+def _scan_windows(
+        scan: common.Scanner, code: str, position: int,
+        boundaries: Iterable[int]) -> Iterator[Tuple[List[common.Token], int]]:
+    """Scans code from position in windows ending at the given boundaries.
+
+  Yields the tokens found in each window, with offsets into code, and the
+  checkpoint its scan stopped at. The code past the last boundary is scanned
+  as running to EOF, its checkpoint being len(code). Windows in which no
+  progress is made are doubled, as in common.iter_comments.
+  """
+    min_size = 0
+    for boundary in boundaries:
+        if boundary - position < max(min_size, 1):
+            continue
+        tokens, stop = _scan_window(scan, code, position, boundary, False)
+        if stop == position:
+            min_size = 2 * (boundary - position)
+            continue
+        min_size = 0
+        position = stop
+        yield tokens, stop
+    yield _scan_window(scan, code, position, len(code), True)
+
+
+def _scan_window(scan: common.Scanner, code: str, start: int, end: int,
+                 final: bool) -> Tuple[List[common.Token], int]:
+    tokens = []
+    scanner = scan(code[start:end], 0, final)
+    while True:
+        try:
+            token_start, token_end, text_start, text_end, multiline = next(
+                scanner)
+        except StopIteration as stop:
+            return tokens, start + stop.value
+        tokens.append((start + token_start, start + token_end,
+                       start + text_start, start + text_end, multiline))
+
+
+def _line_start(code: str, comments: List[common.Comment], offset: int) -> int:
+    """Returns the start of the line offset is on, or of the first line before
+  it which does not start inside one of comments."""
+    while offset:
+        offset = code.rfind('\n', 0, offset) + 1
+        index = bisect.bisect_left(comments, offset,
+                                   key=common.Comment.start) - 1
+        if index < 0 or comments[index].end() <= offset:
+            break
+        offset = comments[index].start()
+    return offset
+
+
+class _Edit(NamedTuple):
+    """Where an edit replaced code, and by how much it moved the code after.
+
+  The edit replaced the previous code from start to end, and moved the code
+  after it by delta characters and line_delta lines.
+  """
+    start: int
+    end: int
+    delta: int
+    line_delta: int
+
+
+def _diff(old: List[common.Comment], new: List[common.Comment],
+          edit: _Edit) -> Change:
+    """Returns the Change between comments parsed before and after an edit."""
+    index = 0
+    while (index < min(len(old), len(new)) and old[index].end() <= edit.start
+           and _key(old[index]) == _key(new[index])):
+        index += 1
+    removed_end = len(old)
+    added_end = len(new)
+    while (removed_end > index and added_end > index
+           and old[removed_end - 1].start() >= edit.end
+           and _key(old[removed_end - 1], edit.delta, edit.line_delta) == _key(
+               new[added_end - 1])):
+        removed_end -= 1
+        added_end -= 1
+    return Change(new, index, old[index:removed_end], new[index:added_end])
+
+
+def _key(comment: common.Comment, delta: int = 0, line_delta: int = 0):
+    return (comment.start() + delta, comment.end() + delta, comment.text(),
+            comment.line_number() + line_delta, comment.is_multiline())
+
+
+def _moved(checkpoints: List[int], start: int, delta: int) -> List[int]:
+    """Returns the checkpoints from start on, moved by delta characters."""
+    return [
+        checkpoint + delta
+        for checkpoint in checkpoints[bisect.bisect_left(checkpoints, start):]
+    ]
+
+
+def _holds(values: List, value: int, key=None) -> bool:
+    """Returns whether the sorted values hold value, as their key if given."""
+    index = bisect.bisect_left(values, value, key=key)
+    return index < len(values) and (values[index] if key is None else key(
+        values[index])) == value
+
+
+class Document():
+    """Source code kept along with its comments as it is edited."""
+
+    def __init__(self,
+                 code: str,
+                 mime: Optional[str] = None,
+                 filename: Optional[str] = None):
+        """Initializes Document, extracting the comments from code.
+
+    Args:
+      code: String containing the document's code.
+      mime: Optional MIME type for code (str). If not given, an attempt to
+        deduce the MIME type will occur, see comment_parser.detect_mime.
+      filename: Optional string name of the file code comes from, used only to
+        deduce the MIME type.
+    Raises:
+      comment_parser.UnsupportedError: If code is of an unsupported MIME type.
+      comment_parser.ParseError: If code could not be parsed.
+    """
+        self._parser = comment_parser.get_parser(code, mime, filename)
+        self._language = getattr(self._parser, 'LANGUAGE', None)
+        self._scan = self._language and self._parser.scan
+        self.code = code
+        self.comments: List[common.Comment] = []
+        self._checkpoints: List[int] = []
+        # Until a parse succeeds, edits parse the whole code again.
+        self._parsed = False
+        self._parse()
+
+    def _parse(self) -> None:
+        """Extracts the comments from the whole code."""
+        self.comments = []
+        self._checkpoints = []
+        self._parsed = False
+        try:
+            if self._scan is None:
+                self.comments = self._parser.extract_comments(self.code)
+            else:
+                line_counter = common.LineCounter(self.code)
+                for tokens, stop in _scan_windows(
+                        self._scan, self.code, 0,
+                        range(CHECKPOINT_INTERVAL, len(self.code),
+                              CHECKPOINT_INTERVAL)):
+                    self.comments.extend(
+                        self._comment(token, line_counter) for token in tokens)
+                    self._checkpoints.append(stop)
+                self._checkpoints.pop()
+        except common.Error as e:
+            self.comments = []
+            self._checkpoints = []
+            raise comment_parser.ParseError() from e
+        self._parsed = True
+
+    def _comment(self, token: common.Token,
+                 line_counter: common.LineCounter) -> common.Comment:
+        start, end, text_start, text_end, multiline = token
+        line_number, column = line_counter.locate(start)
+        return common.Comment(self.code[text_start:text_end], line_number,
+                              multiline, start, end, column)
+
+    def comment_at(self, offset: int) -> Optional[common.Comment]:
+        """Returns the comment spanning offset into the code, or None."""
+        index = bisect.bisect_right(
+            self.comments, offset, key=common.Comment.start) - 1
+        if index >= 0 and offset < self.comments[index].end():
+            return self.comments[index]
+        return None
+
+    def edit(self, start: int, end: int, text: str) -> Change:
+        """Replaces the code from start to end with text.
+
+    Args:
+      start: Offset (int) of the first character replaced.
+      end: Offset (int) just past the last character replaced.
+      text: String to replace the code with.
+    Returns:
+      Change holding the updated comments and the comments the edit removed
+        and added.
+    Raises:
+      ValueError: If start and end are not a range of offsets into the code.
+      comment_parser.ParseError: If the edited code could not be parsed. The
+        edit is applied nonetheless, leaving no comments until an edit
+        succeeds in parsing the code again.
+    """
+        if not 0 <= start <= end <= len(self.code):
+            raise ValueError(f'Invalid edit range {start}:{end}')
+        old_code = self.code
+        old_comments = self.comments
+        edit = _Edit(start, end,
+                     len(text) - (end - start),
+                     text.count('\n') - old_code.count('\n', start, end))
+        self.code = old_code[:start] + text + old_code[end:]
+        if self._scan is None or not self._parsed:
+            self._parse()
+            return _diff(old_comments, self.comments, edit)
+
+        restart, kept_checkpoints = self._restart(old_code, start)
+        index = bisect.bisect_left(old_comments,
+                                   restart,
+                                   key=common.Comment.start)
+        try:
+            added, checkpoints, synced = self._rescan(restart, edit)
+        except common.Error as e:
+            self.comments = []
+            self._checkpoints = []
+            self._parsed = False
+            raise comment_parser.ParseError() from e
+
+        reused = bisect.bisect_left(old_comments,
+                                    synced,
+                                    key=common.Comment.start)
+        self.comments = (old_comments[:index] + added +
+                         self._move(old_code, old_comments[reused:], edit))
+        self._checkpoints = (self._checkpoints[:kept_checkpoints] +
+                             checkpoints +
+                             _moved(self._checkpoints, synced, edit.delta))
+        return Change(self.comments, index, old_comments[index:reused], added)
+
+    def _restart(self, old_code: str, start: int) -> Tuple[int, int]:
+        """Returns where to restart scanning for an edit at start.
+
+    Returns:
+      Tuple of the offset into the code to restart scanning from, and the
+        number of the previous checkpoints before it, which are kept.
+    """
+        # A comment ending right at start may grow with the edit, and whether a
+        # character starts a comment depends on the lookahead characters after
+        # it. So scanning restarts after the last comment ending, or from the
+        # last checkpoint, far enough before start.
+        limit = start - self._language.lookahead
+        index = bisect.bisect_left(self.comments,
+                                   min(start, limit + 1),
+                                   key=common.Comment.end)
+        restart = self.comments[index - 1].end() if index else 0
+        kept_checkpoints = bisect.bisect_right(self._checkpoints, limit)
+        if kept_checkpoints:
+            restart = max(restart, self._checkpoints[kept_checkpoints - 1])
+        if not self._language.multiline_strings:
+            # Whether a quote starts a literal depends on the rest of its line,
+            # so scanning restarts from the start of a line, which may be the
+            # one after restart.
+            restart = _line_start(old_code, self.comments,
+                                  min(restart + 1, start))
+            kept_checkpoints = bisect.bisect_right(self._checkpoints, restart)
+        return restart, kept_checkpoints
+
+    def _rescan(self, restart: int,
+                edit: _Edit) -> Tuple[List[common.Comment], List[int], int]:
+        """Scans the edited code from restart until back in step.
+
+    Past the edit, windows end at the previous checkpoints, moved by the edit.
+    Scanning is back in step once it stops at one of them, or finds a comment
+    where there was one before.
+
+    Returns:
+      Tuple of the comments found, the checkpoints scanning stopped at, and
+        the offset into the previous code where it fell back in step, past
+        its end if it never did.
+    """
+        edit_end = edit.end + edit.delta
+        line_counter = common.LineCounter(self.code)
+        added = []
+        checkpoints = []
+        for tokens, stop in _scan_windows(
+                self._scan, self.code, restart,
+                _moved(self._checkpoints, edit.end, edit.delta)):
+            for token in tokens:
+                if token[0] >= edit_end and _holds(self.comments,
+                                                   token[0] - edit.delta,
+                                                   common.Comment.start):
+                    return added, checkpoints, token[0] - edit.delta
+                added.append(self._comment(token, line_counter))
+            if stop == len(self.code):
+                break
+            if stop >= edit_end and _holds(self._checkpoints,
+                                           stop - edit.delta):
+                return added, checkpoints, stop - edit.delta
+            checkpoints.append(stop)
+        return added, checkpoints, len(self.code) - edit.delta + 1
+
+    def _move(self, old_code: str, comments: List[common.Comment],
+              edit: _Edit) -> List[common.Comment]:
+        """Returns comments from past an edit, moved to their new offsets."""
+        # Comments on the line the edit ends on also change columns.
+        line_end = old_code.find('\n', edit.end)
+        if line_end == -1:
+            line_end = len(old_code)
+        line_start = self.code.rfind('\n', 0, edit.end + edit.delta) + 1
+        moved = []
+        for comment in comments:
+            if comment.start() >= line_end:
+                break
+            moved.append(
+                comment.moved(edit.delta, edit.line_delta,
+                              comment.start() + edit.delta - line_start))
+        if edit.delta or edit.line_delta:
+            moved.extend(
+                comment.moved(edit.delta, edit.line_delta)
+                for comment in comments[len(moved):])
+        else:
+            moved.extend(comments[len(moved):])
+        return moved
@@ -0,0 +1,441 @@
+#!/usr/bin/python
+"""This module provides a persistent, searchable index of extracted comments.
+
+Comments are stored in an SQLite database along with their path and
+position, and their texts in a full-text (FTS5) index, so queries such as
+"all TODOs mentioning a bug" or "comments in a file near a line" are answered
+without reading or parsing any source file:
+
+  python -m comment_parser.index --index comments.db update -j 8 src
+  python -m comment_parser.index --index comments.db search 'TODO AND bug'
+  python -m comment_parser.index --index comments.db search --path src/foo.c \\
+      --lines 90:110
+
+Updates are incremental: files are keyed on their size and modification
+time, or on their blob id when synced with a repository manifest, and only
+those whose key changed are parsed again. Queries use the FTS5 syntax: words,
+"phrases", prefix*, AND, OR, NOT and NEAR(...).
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from typing import (Dict, Iterable, List, NamedTuple, Optional, Sequence,
+                    Tuple)
+
+from comment_parser import comment_parser
+from comment_parser import repository
+from comment_parser import walker
+from comment_parser.cache import ResultCache
+from comment_parser.parsers import common
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS files ('
+    'path TEXT PRIMARY KEY, '
+    'key TEXT NOT NULL, '
+    'error TEXT)',
+    'CREATE TABLE IF NOT EXISTS comments ('
+    'id INTEGER PRIMARY KEY, '
+    'path TEXT NOT NULL, '
+    'line INTEGER NOT NULL, '
+    'multiline INTEGER NOT NULL, '
+    'start_offset INTEGER, '
+    'end_offset INTEGER, '
+    'column_number INTEGER, '
+    'text TEXT NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS comments_path_line ON comments (path, line)',
+    'CREATE VIRTUAL TABLE IF NOT EXISTS comments_text USING fts5('
+    "text, content='comments', content_rowid='id')",
+    'CREATE TRIGGER IF NOT EXISTS comments_insert AFTER INSERT ON comments '
+    'BEGIN INSERT INTO comments_text (rowid, text) '
+    'VALUES (new.id, new.text); END',
+    'CREATE TRIGGER IF NOT EXISTS comments_delete AFTER DELETE ON comments '
+    "BEGIN INSERT INTO comments_text (comments_text, rowid, text) "
+    "VALUES ('delete', old.id, old.text); END",
+)
+
+
+class Hit(NamedTuple):
+    """A comment found by CommentIndex.search.
+
+  Attributes:
+    path: String path of the file the comment is in.
+    comment: parsers.common.Comment
+  """
+    path: str
+    comment: common.Comment
+
+
+class CommentIndex():
+    """Full-text index of the comments of many files, stored in SQLite."""
+
+    def __init__(self, filename: str):
+        """Initializes CommentIndex.
+
+    Args:
+      filename: String name of the database file, created if needed.
+    """
+        self.filename = filename
+        self._connection = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.filename, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            with connection:
+                for statement in _SCHEMA:
+                    connection.execute(statement)
+            self._connection = connection
+        return self._connection
+
+    def keys(self) -> Dict[str, str]:
+        """Returns the keys of the indexed files.
+
+    Returns:
+      Python dict of key (str) by path (str).
+    """
+        return dict(self._connect().execute('SELECT path, key FROM files'))
+
+    def put(self,
+            path: str,
+            key: str,
+            comments: Optional[Sequence[common.Comment]],
+            error: Optional[str] = None) -> None:
+        """Indexes the comments of a file, replacing any indexed before.
+
+    Args:
+      path: String path of the file.
+      key: String identifying the file's content, such as its blob id.
+      comments: Sequence of parsers.common.Comment, or None if the file could
+        not be parsed.
+      error: Optional string name of the exception raised parsing the file.
+    """
+        with self._connect() as connection:
+            self._put(connection, path, key, comments, error)
+
+    def remove(self, paths: Iterable[str]) -> None:
+        """Removes files from the index.
+
+    Args:
+      paths: Iterable of string paths of the files.
+    """
+        with self._connect() as connection:
+            for path in paths:
+                self._remove(connection, path)
+
+    @staticmethod
+    def _put(connection: sqlite3.Connection, path: str, key: str,
+             comments: Optional[Sequence[common.Comment]],
+             error: Optional[str]) -> None:
+        CommentIndex._remove(connection, path)
+        connection.execute('INSERT INTO files VALUES (?, ?, ?)',
+                           (path, key, error))
+        connection.executemany(
+            'INSERT INTO comments (path, line, multiline, start_offset, '
+            'end_offset, column_number, text) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            ((path, comment.line_number(), comment.is_multiline(),
+              comment.start(), comment.end(), comment.column(), comment.text())
+             for comment in comments or ()))
+
+    @staticmethod
+    def _remove(connection: sqlite3.Connection, path: str) -> None:
+        connection.execute('DELETE FROM comments WHERE path = ?', (path, ))
+        connection.execute('DELETE FROM files WHERE path = ?', (path, ))
+
+    def update(self,
+               paths: Iterable[str],
+               *,
+               workers: Optional[int] = 1,
+               mime: Optional[str] = None,
+               cache: Optional[ResultCache] = None,
+               **walk_options) -> repository.Changes:
+        """Indexes the files named by, or found under, the given paths.
+
+    Files are found as by walker.walk, and keyed on their size and
+    modification time: only those added or changed since they were last
+    indexed are parsed. Indexed files under the paths which are no longer
+    found there are removed.
+
+    Args:
+      paths: Iterable of string names of files and directories.
+      workers: Optional number of processes (int) to parse files in, see
+        comment_parser.extract_comments_many. Defaults to parsing in the
+        calling process.
+      mime: Optional MIME type for all files (str). If not given, the MIME
+        type of each file is deduced.
+      cache: Optional cache.ResultCache to look results up in and store them
+        in.
+      **walk_options: Keyword arguments of walker.walk: include, exclude and
+        gitignore.
+    Returns:
+      repository.Changes of the indexed files.
+    """
+        roots = [os.path.normpath(path) for path in paths]
+        found = {}
+        for filename in walker.walk(roots, **walk_options):
+            try:
+                status = os.stat(filename)
+            except OSError:
+                continue
+            found[os.path.normpath(filename)] = (
+                f'{status.st_size}:{status.st_mtime_ns}')
+        indexed = {
+            path: key
+            for path, key in self.keys().items() if any(
+                _within(path, root) for root in roots)
+        }
+        return self._update(found,
+                            indexed,
+                            workers=workers,
+                            mime=mime,
+                            cache=cache)
+
+    def sync(self, tree: str,
+             entries: Dict[str, repository.Entry]) -> repository.Changes:
+        """Indexes the files of a repository manifest, keyed on blob ids.
+
+    No file is read: comments are taken from the manifest.
+
+    Args:
+      tree: String path of the manifest's working tree, which the paths of
+        its files are joined to.
+      entries: Python dict of repository.Entry by path, as returned by
+        repository.scan or repository.load_manifest.
+    Returns:
+      repository.Changes of the indexed files.
+    """
+        tree = os.path.normpath(tree)
+        found = {
+            os.path.normpath(os.path.join(tree, path)): entry
+            for path, entry in entries.items()
+        }
+        indexed = {
+            path: key
+            for path, key in self.keys().items() if _within(path, tree)
+        }
+        changed = [
+            path for path, entry in found.items()
+            if indexed.get(path) != _entry_key(entry)
+        ]
+        with self._connect() as connection:
+            for path in changed:
+                entry = found[path]
+                self._put(connection, path, _entry_key(entry), entry.comments,
+                          entry.error)
+            for path in indexed.keys() - found.keys():
+                self._remove(connection, path)
+        return _changes(found, indexed, changed)
+
+    def _update(self, found: Dict[str, str], indexed: Dict[str, str],
+                **options) -> repository.Changes:
+        """Indexes the files found whose keys changed, parsing them with the
+  keyword options of comment_parser.extract_comments_many."""
+        changed = [
+            path for path, key in found.items() if indexed.get(path) != key
+        ]
+        results = comment_parser.extract_comments_many(changed, **options)
+        with self._connect() as connection:
+            for path, result in results:
+                if isinstance(result, Exception):
+                    self._put(connection, path, found[path], None,
+                              type(result).__name__)
+                else:
+                    self._put(connection, path, found[path], result, None)
+            for path in indexed.keys() - found.keys():
+                self._remove(connection, path)
+        return _changes(found, indexed, changed)
+
+    def search(self,
+               query: Optional[str] = None,
+               path: Optional[str] = None,
+               lines: Optional[Tuple[Optional[int], Optional[int]]] = None,
+               limit: Optional[int] = None) -> List[Hit]:
+        """Searches the indexed comments.
+
+    Args:
+      query: Optional FTS5 query the comment texts must match, such as
+        'TODO AND "memory leak"' or 'fix*'.
+      path: Optional glob, in SQLite's GLOB syntax, which the paths of the
+        files must match, such as 'src/*.c'.
+      lines: Optional tuple of the first and last line numbers (int,
+        inclusive) the comments must start in, either of which may be None.
+      limit: Optional number (int) of comments to return at most.
+    Returns:
+      Python list of Hit, ordered by path and position.
+    Raises:
+      ValueError: If query is not valid FTS5 syntax.
+    """
+        sql = ('SELECT comments.path, comments.text, line, multiline, '
+               'start_offset, end_offset, column_number FROM comments')
+        conditions = []
+        parameters = []
+        if query is not None:
+            sql += ' JOIN comments_text ON comments_text.rowid = comments.id'
+            conditions.append('comments_text MATCH ?')
+            parameters.append(query)
+        if path is not None:
+            conditions.append('comments.path GLOB ?')
+            parameters.append(path)
+        first_line, last_line = lines or (None, None)
+        if first_line is not None:
+            conditions.append('line >= ?')
+            parameters.append(first_line)
+        if last_line is not None:
+            conditions.append('line <= ?')
+            parameters.append(last_line)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY comments.path, start_offset, line'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            parameters.append(limit)
+        try:
+            rows = self._connect().execute(sql, parameters).fetchall()
+        except sqlite3.OperationalError as e:
+            if query is None:
+                raise
+            raise ValueError(f'Invalid query {query!r}: {e}') from e
+        return [
+            Hit(row[0], common.Comment(row[1], row[2], bool(row[3]), *row[4:]))
+            for row in rows
+        ]
+
+    def close(self) -> None:
+        """Closes the connection to the database, if open."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def _within(path: str, root: str) -> bool:
+    """Returns whether path is root or under it, both normalized."""
+    if root == os.curdir:
+        return not os.path.isabs(path) and not path.startswith(os.pardir)
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def _entry_key(entry: repository.Entry) -> str:
+    """Returns the key of a manifest entry, which has no blob id if parsing it
+  failed with an error which may not recur."""
+    return entry.blob if entry.blob is not None else f'error:{entry.error}'
+
+
+def _changes(found: Dict[str, object], indexed: Dict[str, str],
+             changed: List[str]) -> repository.Changes:
+    return repository.Changes(added=sorted(path for path in changed
+                                           if path not in indexed),
+                              modified=sorted(path for path in changed
+                                              if path in indexed),
+                              deleted=sorted(indexed.keys() - found.keys()),
+                              unchanged=len(found) - len(changed))
+
+
+def _lines(value: str) -> Tuple[Optional[int], Optional[int]]:
+    """Parses a FIRST:LAST line range, either of which may be empty."""
+    first, _, last = value.partition(':')
+    return (int(first) if first else None, int(last) if last else None)
+
+
+def main(argv: List[str]) -> None:
+    """Updates or searches a comment index."""
+    parser = argparse.ArgumentParser(
+        description='Builds and searches a full-text index of comments.')
+    parser.add_argument('--index',
+                        required=True,
+                        help='SQLite database file of the index')
+    commands = parser.add_subparsers(dest='command', required=True)
+    update = commands.add_parser('update', help='index files and directories')
+    update.add_argument('paths', nargs='+', help='files and directories')
+    update.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=1,
+                        help='number of processes to parse files in')
+    update.add_argument('--mime', help='MIME type of all files')
+    update.add_argument('--include',
+                        action='append',
+                        default=[],
+                        help='only index files matching this glob; '
+                        'repeatable')
+    update.add_argument('--exclude',
+                        action='append',
+                        default=[],
+                        help='skip files and directories matching this glob; '
+                        'repeatable')
+    update.add_argument('--no-gitignore',
+                        dest='gitignore',
+                        action='store_false',
+                        help='do not skip files ignored by .gitignore files')
+    update.add_argument('--cache-dir', help='directory to cache results in')
+    sync = commands.add_parser('sync',
+                               help='index the files of a repository manifest')
+    sync.add_argument('tree', help='working tree of the manifest')
+    sync.add_argument('--manifest',
+                      required=True,
+                      help='JSON manifest, see comment_parser.repository')
+    search = commands.add_parser('search', help='search indexed comments')
+    search.add_argument('query',
+                        nargs='?',
+                        help='FTS5 query comment texts must match')
+    search.add_argument('--path', help='glob the paths of files must match')
+    search.add_argument('--lines',
+                        type=_lines,
+                        help='FIRST:LAST range of lines comments start in')
+    search.add_argument('--limit',
+                        type=int,
+                        help='number of comments to print at most')
+    search.add_argument('--format',
+                        choices=('text', 'jsonl'),
+                        default='text',
+                        help='output format: path:line: text lines, or a '
+                        'JSON object per comment')
+    args = parser.parse_args(argv)
+
+    index = CommentIndex(args.index)
+    try:
+        if args.command == 'search':
+            try:
+                hits = index.search(args.query, args.path, args.lines,
+                                    args.limit)
+            except ValueError as e:
+                sys.exit(str(e))
+            for path, comment in hits:
+                if args.format == 'jsonl':
+                    sys.stdout.write(
+                        json.dumps({
+                            'path': path,
+                            'line': comment.line_number(),
+                            'multiline': comment.is_multiline(),
+                            'text': comment.text(),
+                        }) + '\n')
+                else:
+                    sys.stdout.write(f'{path}:{comment.line_number()}: '
+                                     f'{comment.text().strip()}\n')
+            return
+        if args.command == 'sync':
+            changes = index.sync(args.tree,
+                                 repository.load_manifest(args.manifest))
+        else:
+            cache = ResultCache(args.cache_dir) if args.cache_dir else None
+            try:
+                changes = index.update(args.paths,
+                                       workers=args.jobs,
+                                       mime=args.mime,
+                                       cache=cache,
+                                       include=args.include,
+                                       exclude=args.exclude,
+                                       gitignore=args.gitignore)
+            finally:
+                if cache is not None:
+                    cache.close()
+    finally:
+        index.close()
+    sys.stderr.write(f'{len(changes.added)} added, {len(changes.modified)} '
+                     f'modified, {len(changes.deleted)} deleted, '
+                     f'{changes.unchanged} unchanged\n')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
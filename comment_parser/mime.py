@@ -0,0 +1,175 @@
+#!/usr/bin/python
+"""This module maps source files to MIME types and those to parsers.
+
+comment_parser.detect_mime tries the strategies in MIME_RESOLVERS to deduce
+the MIME type of code, and MIME_MAP holds the parser of each MIME type. Both
+are also available from comment_parser.
+"""
+
+import collections
+import importlib
+import importlib.util
+import os
+from types import ModuleType
+from typing import (Callable, Iterator, List, MutableMapping, NamedTuple,
+                    Optional, Tuple, Union)
+
+# python-magic, which loads libmagic, is only imported once a MIME type must
+# be deduced with it.
+HAS_MAGIC = importlib.util.find_spec('magic') is not None
+
+
+class _ParserMap(MutableMapping[str, ModuleType]):
+    """Parser modules by MIME type, imported when first looked up.
+
+  Values may be set to parser modules or to the string names of modules to
+  import, which are then replaced by the modules.
+  """
+
+    def __init__(self, parsers: MutableMapping[str, Union[str, ModuleType]]):
+        self._parsers = dict(parsers)
+
+    def __getitem__(self, mime: str) -> ModuleType:
+        parser = self._parsers[mime]
+        if isinstance(parser, str):
+            parser = self._parsers[mime] = importlib.import_module(parser)
+        return parser
+
+    def __setitem__(self, mime: str, parser: Union[str, ModuleType]) -> None:
+        self._parsers[mime] = parser
+
+    def __delitem__(self, mime: str) -> None:
+        del self._parsers[mime]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._parsers)
+
+    def __len__(self) -> int:
+        return len(self._parsers)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self._parsers!r})'
+
+
+MIME_MAP = _ParserMap({
+    'application/javascript': 'comment_parser.parsers.js_parser',  # Javascript
+    'text/html': 'comment_parser.parsers.html_parser',  # HTML
+    'text/x-c': 'comment_parser.parsers.c_parser',  # C
+    'text/x-c++': 'comment_parser.parsers.c_parser',  # C++/C#
+    'text/x-go': 'comment_parser.parsers.go_parser',  # Go
+    'text/x-java': 'comment_parser.parsers.c_parser',  # Java
+    'text/x-java-source': 'comment_parser.parsers.c_parser',  # Java
+    'text/x-javascript': 'comment_parser.parsers.js_parser',  # Javascript
+    'text/x-python': 'comment_parser.parsers.python_parser',  # Python
+    'text/x-ruby': 'comment_parser.parsers.ruby_parser',  # Ruby
+    'text/x-script.python': 'comment_parser.parsers.python_parser',  # Python
+    'text/x-shellscript': 'comment_parser.parsers.shell_parser',  # Unix shell
+    'text/xml': 'comment_parser.parsers.html_parser',  # XML
+})
+
+# Filename extensions of the languages in MIME_MAP.
+EXTENSION_MAP = {
+    '.bash': 'text/x-shellscript',
+    '.c': 'text/x-c',
+    '.cc': 'text/x-c++',
+    '.cjs': 'application/javascript',
+    '.cpp': 'text/x-c++',
+    '.cs': 'text/x-c++',
+    '.cxx': 'text/x-c++',
+    '.go': 'text/x-go',
+    '.h': 'text/x-c',
+    '.hh': 'text/x-c++',
+    '.hpp': 'text/x-c++',
+    '.htm': 'text/html',
+    '.html': 'text/html',
+    '.java': 'text/x-java-source',
+    '.js': 'application/javascript',
+    '.jsx': 'application/javascript',
+    '.mjs': 'application/javascript',
+    '.py': 'text/x-python',
+    '.pyw': 'text/x-python',
+    '.rb': 'text/x-ruby',
+    '.sh': 'text/x-shellscript',
+    '.xml': 'text/xml',
+    '.xsd': 'text/xml',
+    '.xsl': 'text/xml',
+}
+
+# Interpreters named on shebang lines, without any version suffix.
+INTERPRETER_MAP = {
+    'ash': 'text/x-shellscript',
+    'bash': 'text/x-shellscript',
+    'dash': 'text/x-shellscript',
+    'ksh': 'text/x-shellscript',
+    'node': 'application/javascript',
+    'nodejs': 'application/javascript',
+    'python': 'text/x-python',
+    'ruby': 'text/x-ruby',
+    'sh': 'text/x-shellscript',
+    'zsh': 'text/x-shellscript',
+}
+
+# Number of leading characters of code handed to libmagic.
+MAGIC_PREFIX_SIZE = 8192
+
+
+class Detection(NamedTuple):
+    """Result of detect_mime: the MIME type and the strategy that found it."""
+    mime: str
+    strategy: str
+
+
+def mime_from_extension(code: str, filename: Optional[str]) -> Optional[str]:
+    """Deduces the MIME type from the filename extension, see EXTENSION_MAP."""
+    del code  # Unused.
+    if not filename:
+        return None
+    return EXTENSION_MAP.get(os.path.splitext(filename)[1].lower())
+
+
+def mime_from_shebang(code: str, filename: Optional[str]) -> Optional[str]:
+    """Deduces the MIME type from a '#!' line, see INTERPRETER_MAP."""
+    del filename  # Unused.
+    if not code.startswith('#!'):
+        return None
+    end = code.find('\n')
+    words = code[2:end if end != -1 else len(code)].split()
+    if words and os.path.basename(words[0]) == 'env':
+        words = [
+            word for word in words[1:]
+            if '=' not in word and not word.startswith('-')
+        ]
+    if not words:
+        return None
+    interpreter = os.path.basename(words[0]).rstrip('0123456789.')
+    return INTERPRETER_MAP.get(interpreter)
+
+
+def mime_from_magic(code: str, filename: Optional[str]) -> Optional[str]:
+    """Deduces the MIME type with libmagic, see MAGIC_PREFIX_SIZE."""
+    del filename  # Unused.
+    if not HAS_MAGIC:
+        raise ImportError('python-magic is not installed')
+    # python-magic is optional, see HAS_MAGIC.
+    # pylint: disable-next=import-outside-toplevel
+    import magic  # pytype: disable=import-error
+    mime = magic.from_buffer(code[:MAGIC_PREFIX_SIZE], mime=True)
+    if isinstance(mime, bytes):
+        mime = mime.decode('utf-8')
+    return mime
+
+
+# Deduces the MIME type from code and its optional filename, returning None if
+# undecided.
+Resolver = Callable[[str, Optional[str]], Optional[str]]
+
+# Named strategies detect_mime tries in order, cheapest first. Entries may be
+# added, removed or reordered.
+MIME_RESOLVERS: List[Tuple[str, Resolver]] = [
+    ('extension', mime_from_extension),
+    ('shebang', mime_from_shebang),
+    ('magic', mime_from_magic),
+]
+
+# Number of times each strategy in MIME_RESOLVERS decided a MIME type.
+DETECTION_COUNTS: collections.Counter = collections.Counter()
@@ -0,0 +1,423 @@
+/* Compiled scanning core for comment_parser.parsers.common.Lexer.
+ *
+ * Scans code written in a common.Language for comments, following the same
+ * rules as the regular expression Lexer compiles, in one pass over the code
+ * and without holding the GIL. common.Lexer uses it when it can be imported.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+typedef struct {
+    char *text;
+    Py_ssize_t length;
+} Delimiter;
+
+enum { LINE_COMMENT, BLOCK_COMMENT, NESTED_COMMENT };
+
+typedef struct {
+    int kind;
+    Delimiter start;
+    Delimiter end;
+} CommentSyntax;
+
+typedef struct {
+    PyObject_HEAD
+    /* Sorted by decreasing length of their start delimiter. */
+    CommentSyntax *comments;
+    Py_ssize_t comment_count;
+    /* Indexed by ASCII character: whether it may start something other than
+     * plain code, whether it is a quote, and whether it starts delimiters
+     * none of which is that character alone. */
+    char special[128];
+    char quote[128];
+    char lone[128];
+    Py_UCS4 escape;
+    int has_escape;
+    int multiline_strings;
+    int code_escapes;
+    int single_line_blocks;
+    int swallow_quotes;
+} Lexer;
+
+typedef struct {
+    Py_ssize_t start;
+    Py_ssize_t end;
+    Py_ssize_t text_start;
+    Py_ssize_t text_end;
+    int multiline;
+} Token;
+
+/* Tokens found by a scan, grown without holding the GIL. */
+typedef struct {
+    Token *items;
+    Py_ssize_t count;
+    Py_ssize_t capacity;
+} Tokens;
+
+static int
+tokens_add(Tokens *tokens, Py_ssize_t start, Py_ssize_t end,
+           Py_ssize_t text_start, Py_ssize_t text_end, int multiline)
+{
+    if (tokens->count == tokens->capacity) {
+        Py_ssize_t capacity = tokens->capacity ? 2 * tokens->capacity : 64;
+        Token *items = PyMem_RawRealloc(tokens->items,
+                                        capacity * sizeof(Token));
+
+        if (items == NULL) {
+            return -2;
+        }
+        tokens->items = items;
+        tokens->capacity = capacity;
+    }
+    tokens->items[tokens->count].start = start;
+    tokens->items[tokens->count].end = end;
+    tokens->items[tokens->count].text_start = text_start;
+    tokens->items[tokens->count].text_end = text_end;
+    tokens->items[tokens->count].multiline = multiline;
+    tokens->count++;
+    return 1;
+}
+
+#define CHAR Py_UCS1
+#define SUFFIX ucs1
+#include "_lexer_scan.h"
+#undef CHAR
+#undef SUFFIX
+
+#define CHAR Py_UCS2
+#define SUFFIX ucs2
+#include "_lexer_scan.h"
+#undef CHAR
+#undef SUFFIX
+
+#define CHAR Py_UCS4
+#define SUFFIX ucs4
+#include "_lexer_scan.h"
+#undef CHAR
+#undef SUFFIX
+
+/* Sets delimiter to a copy of text, which must be a non-empty ASCII str. */
+static int
+delimiter_init(Delimiter *delimiter, PyObject *text)
+{
+    const char *data;
+
+    if (!PyUnicode_Check(text) || !PyUnicode_IS_ASCII(text) ||
+        PyUnicode_GET_LENGTH(text) == 0) {
+        PyErr_SetString(PyExc_ValueError,
+                        "delimiters must be non-empty ASCII strings");
+        return -1;
+    }
+    data = PyUnicode_AsUTF8AndSize(text, &delimiter->length);
+    if (data == NULL) {
+        return -1;
+    }
+    delimiter->text = PyMem_Malloc(delimiter->length);
+    if (delimiter->text == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    memcpy(delimiter->text, data, delimiter->length);
+    return 0;
+}
+
+/* Returns the ASCII character text holds, or -1 with an error set. */
+static int
+ascii_character(PyObject *text)
+{
+    if (!PyUnicode_Check(text) || PyUnicode_GET_LENGTH(text) != 1 ||
+        PyUnicode_READ_CHAR(text, 0) >= 128) {
+        PyErr_SetString(PyExc_ValueError,
+                        "quotes and escapes must be ASCII characters");
+        return -1;
+    }
+    return (int)PyUnicode_READ_CHAR(text, 0);
+}
+
+static void
+Lexer_clear_comments(Lexer *self)
+{
+    Py_ssize_t k;
+
+    for (k = 0; k < self->comment_count; k++) {
+        PyMem_Free(self->comments[k].start.text);
+        PyMem_Free(self->comments[k].end.text);
+    }
+    PyMem_Free(self->comments);
+    self->comments = NULL;
+    self->comment_count = 0;
+}
+
+static int
+Lexer_init(Lexer *self, PyObject *args, PyObject *kwds)
+{
+    static char *kwlist[] = {"language", NULL};
+    PyObject *language, *line_comments, *block_comments, *quotes, *escape;
+    PyObject *sequence;
+    Py_ssize_t line_count, block_count, k, n;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!:Lexer", kwlist,
+                                     &PyTuple_Type, &language)) {
+        return -1;
+    }
+    if (!PyArg_ParseTuple(language, "OOUOpppp:Language", &line_comments,
+                          &block_comments, &quotes, &escape,
+                          &self->multiline_strings, &self->code_escapes,
+                          &self->single_line_blocks,
+                          &self->swallow_quotes)) {
+        return -1;
+    }
+    Lexer_clear_comments(self);
+    memset(self->special, 0, sizeof(self->special));
+    memset(self->quote, 0, sizeof(self->quote));
+    memset(self->lone, 0, sizeof(self->lone));
+
+    line_count = PyObject_Length(line_comments);
+    block_count = PyObject_Length(block_comments);
+    if (line_count < 0 || block_count < 0) {
+        return -1;
+    }
+    self->comments = PyMem_Calloc(line_count + block_count + 1,
+                                  sizeof(CommentSyntax));
+    if (self->comments == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    for (k = 0; k < line_count; k++) {
+        CommentSyntax *syntax = &self->comments[self->comment_count];
+        PyObject *start = PySequence_GetItem(line_comments, k);
+        int result;
+
+        if (start == NULL) {
+            return -1;
+        }
+        result = delimiter_init(&syntax->start, start);
+        Py_DECREF(start);
+        if (result < 0) {
+            return -1;
+        }
+        syntax->kind = LINE_COMMENT;
+        self->comment_count++;
+    }
+    for (k = 0; k < block_count; k++) {
+        CommentSyntax *syntax = &self->comments[self->comment_count];
+        PyObject *block = PySequence_GetItem(block_comments, k);
+        PyObject *start, *end;
+        int nested;
+
+        if (block == NULL) {
+            return -1;
+        }
+        if (!PyArg_ParseTuple(block, "UUp:BlockComment", &start, &end,
+                              &nested) ||
+            delimiter_init(&syntax->start, start) < 0 ||
+            delimiter_init(&syntax->end, end) < 0) {
+            Py_DECREF(block);
+            self->comment_count++;
+            return -1;
+        }
+        Py_DECREF(block);
+        syntax->kind = nested ? NESTED_COMMENT : BLOCK_COMMENT;
+        self->comment_count++;
+    }
+    /* Longer delimiters are tried first, as by common.Lexer. The sort is
+     * stable, so line comments come first among delimiters of a length. */
+    for (k = 1; k < self->comment_count; k++) {
+        CommentSyntax syntax = self->comments[k];
+
+        for (n = k; n > 0 && self->comments[n - 1].start.length <
+                                 syntax.start.length;
+             n--) {
+            self->comments[n] = self->comments[n - 1];
+        }
+        self->comments[n] = syntax;
+    }
+    for (k = 0; k < self->comment_count; k++) {
+        unsigned char first = self->comments[k].start.text[0];
+
+        self->special[first] = 1;
+        self->lone[first] = 1;
+    }
+    for (k = 0; k < self->comment_count; k++) {
+        if (self->comments[k].start.length == 1) {
+            self->lone[(unsigned char)self->comments[k].start.text[0]] = 0;
+        }
+    }
+
+    sequence = PySequence_Fast(quotes, "quotes must be a string");
+    if (sequence == NULL) {
+        return -1;
+    }
+    for (k = 0; k < PySequence_Fast_GET_SIZE(sequence); k++) {
+        int quote = ascii_character(PySequence_Fast_GET_ITEM(sequence, k));
+
+        if (quote < 0) {
+            Py_DECREF(sequence);
+            return -1;
+        }
+        self->special[quote] = 1;
+        self->quote[quote] = 1;
+    }
+    Py_DECREF(sequence);
+
+    self->has_escape = escape != Py_None;
+    self->escape = 0;
+    if (self->has_escape) {
+        int character = ascii_character(escape);
+
+        if (character < 0) {
+            return -1;
+        }
+        self->escape = character;
+        if (self->code_escapes) {
+            self->special[character] = 1;
+        }
+    }
+    return 0;
+}
+
+static void
+Lexer_dealloc(Lexer *self)
+{
+    Lexer_clear_comments(self);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+PyDoc_STRVAR(Lexer_scan_doc,
+"scan(code, position, final)\n\
+--\n\
+\n\
+Scans code from position for comments, see common.Scanner.\n\
+\n\
+code is a str, or a bytes-like object holding UTF-8 encoded code. Returns\n\
+a list of the tokens found and the offset scanning stopped at, which is -1\n\
+if an unterminated block comment was found at EOF.");
+
+static PyObject *
+Lexer_scan(Lexer *self, PyObject *args)
+{
+    PyObject *code, *list, *result;
+    Py_ssize_t position, stop, k;
+    int final;
+    Tokens tokens = {NULL, 0, 0};
+    Py_buffer view;
+
+    if (!PyArg_ParseTuple(args, "Onp:scan", &code, &position, &final)) {
+        return NULL;
+    }
+    if (PyUnicode_Check(code)) {
+        int kind = PyUnicode_KIND(code);
+        const void *data = PyUnicode_DATA(code);
+        Py_ssize_t length = PyUnicode_GET_LENGTH(code);
+
+        if (position < 0 || position > length) {
+            PyErr_SetString(PyExc_ValueError, "position out of range");
+            return NULL;
+        }
+        Py_BEGIN_ALLOW_THREADS
+        switch (kind) {
+        case PyUnicode_1BYTE_KIND:
+            stop = scan_ucs1(self, data, length, position, final, &tokens);
+            break;
+        case PyUnicode_2BYTE_KIND:
+            stop = scan_ucs2(self, data, length, position, final, &tokens);
+            break;
+        default:
+            stop = scan_ucs4(self, data, length, position, final, &tokens);
+            break;
+        }
+        Py_END_ALLOW_THREADS
+    }
+    else {
+        if (PyObject_GetBuffer(code, &view, PyBUF_SIMPLE) < 0) {
+            return NULL;
+        }
+        if (position < 0 || position > view.len) {
+            PyBuffer_Release(&view);
+            PyErr_SetString(PyExc_ValueError, "position out of range");
+            return NULL;
+        }
+        Py_BEGIN_ALLOW_THREADS
+        stop = scan_ucs1(self, view.buf, view.len, position, final, &tokens);
+        Py_END_ALLOW_THREADS
+        PyBuffer_Release(&view);
+    }
+    if (stop == -2) {
+        PyMem_RawFree(tokens.items);
+        return PyErr_NoMemory();
+    }
+
+    list = PyList_New(tokens.count);
+    if (list == NULL) {
+        PyMem_RawFree(tokens.items);
+        return NULL;
+    }
+    for (k = 0; k < tokens.count; k++) {
+        Token *token = &tokens.items[k];
+        PyObject *item = Py_BuildValue(
+            "(nnnnO)", token->start, token->end, token->text_start,
+            token->text_end, token->multiline ? Py_True : Py_False);
+
+        if (item == NULL) {
+            Py_DECREF(list);
+            PyMem_RawFree(tokens.items);
+            return NULL;
+        }
+        PyList_SET_ITEM(list, k, item);
+    }
+    PyMem_RawFree(tokens.items);
+    result = Py_BuildValue("(Nn)", list, stop);
+    return result;
+}
+
+static PyMethodDef Lexer_methods[] = {
+    {"scan", (PyCFunction)Lexer_scan, METH_VARARGS, Lexer_scan_doc},
+    {NULL, NULL, 0, NULL},
+};
+
+PyDoc_STRVAR(Lexer_doc,
+"Lexer(language)\n\
+--\n\
+\n\
+Scans code written in a common.Language for comments.");
+
+static PyTypeObject LexerType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "comment_parser.parsers._lexer.Lexer",
+    .tp_doc = Lexer_doc,
+    .tp_basicsize = sizeof(Lexer),
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_new = PyType_GenericNew,
+    .tp_init = (initproc)Lexer_init,
+    .tp_dealloc = (destructor)Lexer_dealloc,
+    .tp_methods = Lexer_methods,
+};
+
+static struct PyModuleDef lexer_module = {
+    PyModuleDef_HEAD_INIT,
+    .m_name = "_lexer",
+    .m_doc = "Compiled scanning core for comment_parser.parsers.common.Lexer.",
+    .m_size = -1,
+};
+
+PyMODINIT_FUNC
+PyInit__lexer(void)
+{
+    PyObject *module;
+
+    if (PyType_Ready(&LexerType) < 0) {
+        return NULL;
+    }
+    module = PyModule_Create(&lexer_module);
+    if (module == NULL) {
+        return NULL;
+    }
+    Py_INCREF(&LexerType);
+    if (PyModule_AddObject(module, "Lexer", (PyObject *)&LexerType) < 0) {
+        Py_DECREF(&LexerType);
+        Py_DECREF(module);
+        return NULL;
+    }
+    return module;
+}
@@ -0,0 +1,278 @@
+/* Scanning core of comment_parser.parsers._lexer for one character width.
+ *
+ * Included once per width, with CHAR defined as the character type and
+ * SUFFIX as the suffix of the functions defined. The rules mirror the
+ * regular expression compiled by comment_parser.parsers.common.Lexer; scans
+ * are bounded by end, as if the code stopped there.
+ */
+
+#define JOIN(name, suffix) name##_##suffix
+#define EXPAND(name, suffix) JOIN(name, suffix)
+#define FUNC(name) EXPAND(name, SUFFIX)
+
+/* Returns whether text[0:length] starts at s[i], ending by end. */
+static int
+FUNC(matches)(const CHAR *s, Py_ssize_t i, Py_ssize_t end, const char *text,
+              Py_ssize_t length)
+{
+    Py_ssize_t k;
+
+    if (end - i < length) {
+        return 0;
+    }
+    for (k = 0; k < length; k++) {
+        if (s[i + k] != (unsigned char)text[k]) {
+            return 0;
+        }
+    }
+    return 1;
+}
+
+/* Returns the offset of the first delimiter in s[i:end], or -1. */
+static Py_ssize_t
+FUNC(find)(const CHAR *s, Py_ssize_t i, Py_ssize_t end,
+           const Delimiter *delimiter)
+{
+    Py_UCS4 first = (unsigned char)delimiter->text[0];
+
+    for (; i + delimiter->length <= end; i++) {
+        if (s[i] == first &&
+            FUNC(matches)(s, i, end, delimiter->text, delimiter->length)) {
+            return i;
+        }
+    }
+    return -1;
+}
+
+/* Returns the offset past the string literal quoted at s[i], or -1 if it
+ * could continue past end. */
+static Py_ssize_t
+FUNC(string)(const Lexer *self, const CHAR *s, Py_ssize_t i, Py_ssize_t end,
+             int final)
+{
+    Py_UCS4 quote = s[i];
+    Py_UCS4 escape = self->escape;
+    Py_ssize_t j = i + 1;
+    Py_ssize_t escaped = -1;
+
+    if (self->multiline_strings) {
+        while (j < end) {
+            if (s[j] == quote) {
+                return j + 1;
+            }
+            if (self->has_escape && s[j] == escape) {
+                if (j + 1 == end) {
+                    break;
+                }
+                j += 2;
+            }
+            else {
+                j++;
+            }
+        }
+        return final ? end : -1;
+    }
+
+    /* Literals end on their line, at the first quote not escaped, or else at
+     * the last escaped one. */
+    while (j < end && s[j] != '\n') {
+        if (s[j] == quote) {
+            return j + 1;
+        }
+        if (self->has_escape && s[j] == escape && j + 1 < end &&
+            s[j + 1] == quote) {
+            escaped = j + 1;
+            j += 2;
+        }
+        else {
+            j++;
+        }
+    }
+    if (escaped >= 0) {
+        return escaped + 1;
+    }
+    /* A quote with no match on its line is code. */
+    return final || j < end ? i + 1 : -1;
+}
+
+/* Returns the offset past the run of code starting with the special
+ * character at s[i], or -1 if none does. */
+static Py_ssize_t
+FUNC(run)(const Lexer *self, const CHAR *s, Py_ssize_t i, Py_ssize_t end,
+          int final)
+{
+    Py_UCS4 c = s[i];
+    Py_ssize_t k;
+
+    if (self->lone[c]) {
+        int lone = 1;
+        Py_ssize_t remaining = end - i - 1;
+
+        for (k = 0; k < self->comment_count && lone; k++) {
+            const Delimiter *start = &self->comments[k].start;
+
+            if ((unsigned char)start->text[0] != c) {
+                continue;
+            }
+            if (FUNC(matches)(s, i + 1, end, start->text + 1,
+                              start->length - 1)) {
+                lone = 0;
+            }
+            /* Unless final, the delimiter could continue past end. */
+            else if (!final && remaining < start->length - 1 &&
+                     FUNC(matches)(s, i + 1, end, start->text + 1,
+                                   remaining)) {
+                lone = 0;
+            }
+        }
+        if (lone) {
+            i++;
+            if (self->swallow_quotes && i < end && s[i] < 128 &&
+                self->quote[s[i]]) {
+                i++;
+            }
+            return i;
+        }
+    }
+    if (self->code_escapes && c == self->escape) {
+        if (i + 1 < end) {
+            return i + 2;
+        }
+        if (final) {
+            return i + 1;
+        }
+    }
+    if (self->quote[c]) {
+        return FUNC(string)(self, s, i, end, final);
+    }
+    return -1;
+}
+
+/* Matches a comment at s[i], storing its token. Returns 1 if one matched,
+ * 0 if none did, -1 for an unterminated block comment and -2 on error. */
+static int
+FUNC(comment)(const Lexer *self, const CHAR *s, Py_ssize_t i, Py_ssize_t end,
+              int final, Tokens *tokens)
+{
+    Py_ssize_t k;
+
+    for (k = 0; k < self->comment_count; k++) {
+        const CommentSyntax *syntax = &self->comments[k];
+        Py_ssize_t text_start = i + syntax->start.length;
+        Py_ssize_t j;
+        int depth;
+
+        if (!FUNC(matches)(s, i, end, syntax->start.text,
+                           syntax->start.length)) {
+            continue;
+        }
+        switch (syntax->kind) {
+        case LINE_COMMENT:
+            for (j = text_start; j < end && s[j] != '\n'; j++) {
+            }
+            if (j == end && !final) {
+                continue;
+            }
+            return tokens_add(tokens, i, j, text_start, j, 0);
+        case BLOCK_COMMENT:
+            j = FUNC(find)(s, text_start, end, &syntax->end);
+            if (j < 0) {
+                return -1;
+            }
+            {
+                int multiline = 1;
+                Py_ssize_t n;
+
+                if (self->single_line_blocks) {
+                    multiline = 0;
+                    for (n = text_start; n < j && !multiline; n++) {
+                        multiline = s[n] == '\n';
+                    }
+                }
+                return tokens_add(tokens, i, j + syntax->end.length,
+                                  text_start, j, multiline);
+            }
+        case NESTED_COMMENT:
+            depth = 1;
+            j = text_start;
+            while (j < end) {
+                if (FUNC(matches)(s, j, end, syntax->start.text,
+                                  syntax->start.length)) {
+                    depth++;
+                    j += syntax->start.length;
+                }
+                else if (FUNC(matches)(s, j, end, syntax->end.text,
+                                       syntax->end.length)) {
+                    if (!--depth) {
+                        return tokens_add(tokens, i, j + syntax->end.length,
+                                          text_start, j, 1);
+                    }
+                    j += syntax->end.length;
+                }
+                else {
+                    j++;
+                }
+            }
+            return -1;
+        }
+    }
+    return 0;
+}
+
+/* Scans s[position:length], see Lexer_scan. Returns the stop offset, or
+ * -1 for an unterminated block comment and -2 on error. */
+static Py_ssize_t
+FUNC(scan)(const Lexer *self, const CHAR *s, Py_ssize_t length,
+           Py_ssize_t position, int final, Tokens *tokens)
+{
+    Py_ssize_t end = length;
+    Py_ssize_t i = position;
+
+    if (!final && !self->multiline_strings) {
+        /* How far a literal runs depends on the rest of its line, so only
+         * whole lines are scanned. */
+        while (end > 0 && s[end - 1] != '\n') {
+            end--;
+        }
+        if (end < position) {
+            end = position;
+        }
+    }
+    while (i < end) {
+        Py_ssize_t next;
+        int result;
+
+        if (s[i] >= 128 || !self->special[s[i]]) {
+            do {
+                i++;
+            } while (i < end && (s[i] >= 128 || !self->special[s[i]]));
+            continue;
+        }
+        next = FUNC(run)(self, s, i, end, final);
+        if (next >= 0) {
+            i = next;
+            continue;
+        }
+        result = FUNC(comment)(self, s, i, end, final, tokens);
+        if (result == 1) {
+            i = tokens->items[tokens->count - 1].end;
+        }
+        else if (result == -2) {
+            return -2;
+        }
+        else if (!final) {
+            return i;
+        }
+        else if (result == -1) {
+            return -1;
+        }
+        else {
+            i++;
+        }
+    }
+    return end;
+}
+
+#undef FUNC
+#undef EXPAND
+#undef JOIN
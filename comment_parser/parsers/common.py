@@ -1,5 +1,62 @@
 #!/usr/bin/python
 """This module provides constructs common to all comment parsers."""
+# pylint: disable=too-many-lines
+
+import codecs
+import contextvars
+import itertools
+import mmap
+import re
+import time
+from typing import (Callable, Dict, FrozenSet, Generator, Iterable, Iterator,
+                    List, NamedTuple, Optional, Pattern, Tuple, Union)
+
+# A comment located by a scanner: (start, end, text_start, text_end,
+# multiline). start and end delimit the whole comment in the scanned code,
+# text_start and text_end its text.
+Token = Tuple[int, int, int, int, bool]
+
+# Scanners take code, the offset to scan from and whether the code runs to
+# EOF, yield a Token per comment and return the offset scanning stopped at.
+# Unless at EOF, a scanner stops before any comment or literal that could
+# continue past the end of the code, so scanning may resume from there once
+# more code is available. Code may also be a bytes-like object running to EOF,
+# which is scanned in bytes, offsets counting bytes.
+Scanner = Callable[[str, int, bool], Generator[Token, None, int]]
+
+try:
+    # The compiled scanning core, built from _lexer.c when a C compiler is
+    # available. It is not built yet when type checking a fresh checkout.
+    from comment_parser.parsers import _lexer  # pytype: disable=import-error
+except ImportError:
+    _lexer = None
+
+# Size of the pieces bytes are counted in by LineCounter, and of those code is
+# split in when scanning may stop early.
+_PIECE_SIZE = 1 << 16
+
+# Size of the first piece code is split in when scanning may stop early.
+_FIRST_PIECE_SIZE = 1 << 12
+
+# Characters the delimiters of a comment span at most, see _check_open_comment.
+_DELIMITERS_SIZE = 16
+
+# While Limits.extract runs, its max_comment_length, which iter_comments checks
+# the comment it is buffering against.
+_MAX_COMMENT_LENGTH: contextvars.ContextVar[Optional[int]] = (
+    contextvars.ContextVar('max_comment_length', default=None))
+
+# Bytes-like objects holding UTF-8 encoded code: bytes, mmap.mmap, memoryview.
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+# Matches a character of code, rather than whitespace, see Filter.leading.
+_CODE = re.compile(r'\S')
+_CODE_BYTES = re.compile(rb'\S')
+
+# Kinds of comments, see Filter.
+LINE = 'line'
+MULTILINE = 'multiline'
+KINDS = (LINE, MULTILINE)
 
 
 class Error(Exception):
@@ -14,20 +71,135 @@ class UnterminatedCommentError(Error):
     """Raised if an Unterminated multi-line comment is encountered."""
 
 
+class LimitExceededError(Error):
+    """Raised if extracting comments exceeds one of the bounds of Limits.
+
+  Attributes:
+    limit: String name of the exceeded attribute of Limits, such as
+      'max_comments' or 'timeout'.
+    comments: Python list of the Comment extracted before the limit was hit,
+      in the order that they appear in the code.
+  """
+
+    def __init__(self, limit: str, comments: Optional[List['Comment']] = None):
+        super().__init__(f'Exceeded {limit}')
+        self.limit = limit
+        self.comments = comments or []
+
+    def __reduce__(self):
+        return LimitExceededError, (self.limit, self.comments)
+
+
+class LineCounter():
+    """Maps character offsets in source code to line numbers.
+
+  Newlines are counted lazily, only up to the offsets that are looked up, so
+  code with few comments is not indexed past the last one. Lookups are
+  cheapest when made in increasing offset order, as parsers scan the code.
+  """
+
+    def __init__(self, code: Union[str, memoryview]):
+        """Initializes LineCounter.
+
+    Args:
+      code: String containing the code offsets refer to, or memoryview of its
+        bytes, lines then ending at b'\\n' and offsets counting bytes.
+    """
+        self._code = code
+        self._offset = 0
+        self._line_number = 1
+        self._line_start = 0
+
+    def locate(self, offset: int) -> Tuple[int, int]:
+        """Returns the line number and column of the character at offset.
+
+    Args:
+      offset: Character offset (int) into the code.
+    Returns:
+      Tuple of line number (int) and zero-based column (int).
+    """
+        if offset < self._offset:
+            self._offset = 0
+            self._line_number = 1
+            self._line_start = 0
+        if isinstance(self._code, str):
+            newlines = self._code.count('\n', self._offset, offset)
+            if newlines:
+                self._line_start = self._code.rfind('\n', self._offset,
+                                                    offset) + 1
+        else:
+            # Bytes are copied out of the buffer a bounded piece at a time.
+            newlines = 0
+            for start in range(self._offset, offset, _PIECE_SIZE):
+                piece = self._code[start:min(start +
+                                             _PIECE_SIZE, offset)].tobytes()
+                count = piece.count(b'\n')
+                if count:
+                    newlines += count
+                    self._line_start = start + piece.rfind(b'\n') + 1
+        self._line_number += newlines
+        self._offset = offset
+        return self._line_number, offset - self._line_start
+
+    def line_number(self, offset: int) -> int:
+        """Returns the line number the character at offset is on.
+
+    Args:
+      offset: Character offset (int) into the code.
+    Returns:
+      Int
+    """
+        return self.locate(offset)[0]
+
+
+# Flags and fields of Comment._packed: lengths and columns of up to a terabyte
+# fit in their 40 bits, below the start offset.
+_MULTILINE, _HAS_START, _HAS_LENGTH, _HAS_COLUMN = 1, 2, 4, 8
+_COLUMN_SHIFT = 4
+_LENGTH_SHIFT = 44
+_START_SHIFT = 84
+_FIELD_MASK = (1 << 40) - 1
+
+
 class Comment():
     """Represents comments found in source files."""
 
-    def __init__(self, text: str, line_number: int, multiline: bool = False):
+    # Whether the comment is multiline and its optional positions are packed
+    # into one int, which takes less memory than an attribute each. Comments
+    # without positions hold a small, shared int.
+    __slots__ = ('_text', '_line_number', '_packed')
+
+    # Positional, as caches and indexes store comments as tuples of these.
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def __init__(self,
+                 text: str,
+                 line_number: int,
+                 multiline: bool = False,
+                 start: Optional[int] = None,
+                 end: Optional[int] = None,
+                 column: Optional[int] = None):
         """Initializes Comment.
 
     Args:
       text: String text of comment.
       line_number: Line number (int) comment was found on.
       multiline: Boolean whether this comment was a multiline comment.
+      start: Optional offset (int) of the comment's first character, including
+        its delimiters, in the source.
+      end: Optional offset (int) just past the comment's last character,
+        including its delimiters, in the source.
+      column: Optional zero-based column (int) the comment starts at.
     """
         self._text = text
         self._line_number = line_number
-        self._multiline = multiline
+        packed = _MULTILINE if multiline else 0
+        if start is not None:
+            packed |= _HAS_START | start << _START_SHIFT
+            if end is not None:
+                packed |= _HAS_LENGTH | (end - start) << _LENGTH_SHIFT
+        if column is not None:
+            packed |= _HAS_COLUMN | column << _COLUMN_SHIFT
+        self._packed = packed
 
     def text(self) -> str:
         """Returns the comment's text.
@@ -51,16 +223,825 @@ class Comment():
     Returns:
       True if comment was a multiline comment, False if not.
     """
-        return self._multiline
+        return bool(self._packed & _MULTILINE)
+
+    def start(self) -> Optional[int]:
+        """Returns the offset of the comment's first character in the source.
+
+    The offset includes the comment's delimiters and is counted in characters
+    from the start of the source, or None if unknown.
+
+    Returns:
+      Int or None
+    """
+        if not self._packed & _HAS_START:
+            return None
+        return self._packed >> _START_SHIFT
+
+    def end(self) -> Optional[int]:
+        """Returns the offset just past the comment's last character.
+
+    The offset includes the comment's delimiters and is counted in characters
+    from the start of the source, or None if unknown.
+
+    Returns:
+      Int or None
+    """
+        if not self._packed & _HAS_LENGTH:
+            return None
+        return self.start() + (self._packed >> _LENGTH_SHIFT & _FIELD_MASK)
+
+    def column(self) -> Optional[int]:
+        """Returns the zero-based column the comment starts at.
+
+    Returns:
+      Int or None if unknown.
+    """
+        if not self._packed & _HAS_COLUMN:
+            return None
+        return self._packed >> _COLUMN_SHIFT & _FIELD_MASK
+
+    def moved(self,
+              delta: int,
+              line_delta: int,
+              column: Optional[int] = None) -> 'Comment':
+        """Returns a copy of the comment moved through the source.
+
+    Args:
+      delta: Number of characters (int) the comment moved forward by.
+      line_delta: Number of lines (int) the comment moved down by.
+      column: Optional new column (int), if the comment changed columns.
+    Returns:
+      Comment
+    """
+        end = self.end()
+        return Comment(self._text, self._line_number + line_delta,
+                       self.is_multiline(),
+                       self.start() + delta,
+                       None if end is None else end + delta,
+                       self.column() if column is None else column)
 
     def __str__(self) -> str:
         return self._text
 
     def __repr__(self) -> str:
-        return f'Comment({self._text}, {self._line_number}, {self._multiline})'
+        return (f'Comment({self._text}, {self._line_number}, '
+                f'{self.is_multiline()})')
 
     def __eq__(self, other: object) -> bool:
+        # Positions are left out, so that comments built by hand compare equal
+        # to the ones parsers find.
         if isinstance(other, self.__class__):
-            if self.__dict__ == other.__dict__:
-                return True
+            return (self._text == other._text
+                    and self._line_number == other._line_number
+                    and self.is_multiline() == other.is_multiline())
         return False
+
+
+def code_start(code: Union[str, memoryview]) -> int:
+    """Returns the offset of code past any byte order mark.
+
+  Args:
+    code: String containing code, or memoryview of its UTF-8 encoded bytes.
+  Returns:
+    Int
+  """
+    if isinstance(code, str):
+        return 1 if code.startswith('\ufeff') else 0
+    return 3 if code[:3] == codecs.BOM_UTF8 else 0
+
+
+def has_code(code: Union[str, memoryview], start: int, end: int) -> bool:
+    """Returns whether code holds more than whitespace between two offsets.
+
+  Args:
+    code: String containing code, or memoryview of its UTF-8 encoded bytes.
+    start: Offset (int) into code to look from.
+    end: Offset (int) into code to look up to.
+  Returns:
+    Boolean
+  """
+    pattern = _CODE if isinstance(code, str) else _CODE_BYTES
+    return pattern.search(code, start, end) is not None
+
+
+class Filter(NamedTuple):
+    """Selects which comments parsers extract.
+
+  Parsers check tokens against the filter before building Comments, so
+  rejected comments are never materialized, and stop scanning once past
+  last_line or max_offset, once max_count comments are found or, if leading,
+  at the first code. Code past that point may then not be scanned, and an
+  unterminated multi-line comment there not be raised.
+
+  Attributes:
+    kinds: Frozenset of the kinds of comments to keep, of KINDS, all of them
+      by default.
+    pattern: Optional compiled regular expression to search comment texts for.
+    first_line: Line number (int) before which comments are dropped.
+    last_line: Optional line number (int) after which scanning stops.
+    max_count: Optional number (int) of comments after which scanning stops.
+    max_offset: Optional offset (int) at which scanning stops, comments
+      starting there or after being dropped.
+    leading: Boolean whether only the comments before any code are kept,
+      scanning stopping at the first code, such as for license headers.
+    docstrings: Boolean whether parsers of languages with docstrings also
+      extract those, as multi-line comments.
+  """
+    kinds: FrozenSet[str] = frozenset(KINDS)
+    pattern: Optional[Pattern[str]] = None
+    first_line: int = 1
+    last_line: Optional[int] = None
+    max_count: Optional[int] = None
+    max_offset: Optional[int] = None
+    leading: bool = False
+    docstrings: bool = False
+
+    @property
+    def bounded(self) -> bool:
+        """Returns whether scanning may stop before the end of the code.
+
+    Returns:
+      Boolean
+    """
+        return (self.last_line is not None or self.max_count is not None
+                or self.max_offset is not None or self.leading)
+
+    def selects(self, line_number: int, multiline: bool) -> bool:
+        """Returns whether a comment of the kind and line is kept, text aside.
+
+    Args:
+      line_number: Line number (int) the comment starts on.
+      multiline: Boolean whether the comment is a multi-line comment.
+    Returns:
+      Boolean
+    """
+        return line_number >= self.first_line and (MULTILINE if multiline else
+                                                   LINE) in self.kinds
+
+    def matches(self, text: str) -> bool:
+        """Returns whether a comment's text is kept.
+
+    Args:
+      text: String text of the comment.
+    Returns:
+      Boolean
+    """
+        return self.pattern is None or self.pattern.search(text) is not None
+
+    def passed(self, line_number: int) -> bool:
+        """Returns whether comments starting on line_number and on are dropped.
+
+    Args:
+      line_number: Line number (int).
+    Returns:
+      Boolean
+    """
+        return self.last_line is not None and line_number > self.last_line
+
+    def exceeds(self, offset: int) -> bool:
+        """Returns whether comments starting at offset and on are dropped.
+
+    Args:
+      offset: Offset (int) into the code.
+    Returns:
+      Boolean
+    """
+        return self.max_offset is not None and offset >= self.max_offset
+
+    def limit(self, comments: Iterable[Comment]) -> Iterator[Comment]:
+        """Returns comments, stopping after max_count of them.
+
+    Args:
+      comments: Iterable of selected Comment.
+    Returns:
+      Iterator of Comment, which stops iterating comments once done.
+    """
+        return itertools.islice(comments, self.max_count)
+
+    def apply(self, comments: Iterable[Comment], code: str) -> List[Comment]:
+        """Filters comments already extracted, in the order they appear.
+
+    Args:
+      comments: Iterable of Comment, with their positions.
+      code: String containing the code comments were extracted from.
+    Returns:
+      Python list of the Comment kept.
+    """
+        kept = []
+        end = code_start(code)
+        for comment in comments:
+            if (len(kept) == self.max_count
+                    or self.passed(comment.line_number())
+                    or self.exceeds(comment.start()) or
+                (self.leading and _CODE.search(code, end, comment.start()))):
+                break
+            end = comment.end()
+            if self.selects(comment.line_number(),
+                            comment.is_multiline()) and self.matches(
+                                comment.text()):
+                kept.append(comment)
+        return kept
+
+
+class Limits(NamedTuple):
+    """Bounds the resources extracting comments from untrusted code takes.
+
+  Code is scanned in pieces of at most _PIECE_SIZE characters, each checked
+  against the bounds before it is scanned, and comments are checked as they
+  are found, so that a pathological input, such as a huge unterminated
+  comment or millions of tiny ones, stops with a LimitExceededError instead of
+  running unbounded. A comment still open is checked against
+  max_comment_length as it is buffered, rather than once it ends.
+
+  Attributes:
+    max_size: Optional number (int) of characters of code to scan at most.
+    max_comments: Optional number (int) of comments to extract at most.
+    max_comment_length: Optional number (int) of characters the text of a
+      comment may hold at most.
+    timeout: Optional number of seconds (float) extracting may take at most.
+  """
+    max_size: Optional[int] = None
+    max_comments: Optional[int] = None
+    max_comment_length: Optional[int] = None
+    timeout: Optional[float] = None
+
+    def extract(self, parse: Callable[[Iterable[str]], Iterable[Comment]],
+                chunks: Iterable[str]) -> List[Comment]:
+        """Extracts the comments from code arriving in chunks, within bounds.
+
+    Args:
+      parse: Callable taking an iterable of chunks of code and returning an
+        iterable of its Comment, such as a parser's iter_comments.
+      chunks: Iterable of strings which concatenated form the code.
+    Returns:
+      Python list of Comment in the order that they appear in the code.
+    Raises:
+      LimitExceededError: A bound was exceeded. It holds the comments
+        extracted until then.
+    """
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.monotonic() + self.timeout
+        comments = []
+        max_comment_length = _MAX_COMMENT_LENGTH.set(self.max_comment_length)
+        try:
+            for comment in parse(self._chunks(chunks, deadline)):
+                if len(comments) == self.max_comments:
+                    raise LimitExceededError('max_comments')
+                if (self.max_comment_length is not None
+                        and len(comment.text()) > self.max_comment_length):
+                    raise LimitExceededError('max_comment_length')
+                comments.append(comment)
+        except LimitExceededError as e:
+            e.comments = comments
+            raise
+        finally:
+            _MAX_COMMENT_LENGTH.reset(max_comment_length)
+        return comments
+
+    def check(self, comments: List[Comment], size: int) -> None:
+        """Checks comments already extracted from code of a given size.
+
+    Args:
+      comments: Python list of Comment.
+      size: Number (int) of characters of the code.
+    Raises:
+      LimitExceededError: A bound other than timeout was exceeded. It holds
+        the comments within bounds.
+    """
+        if self.max_size is not None and size > self.max_size:
+            raise LimitExceededError('max_size')
+        self.extract(lambda chunks: comments, ())
+
+    def _chunks(self, chunks: Iterable[str],
+                deadline: Optional[float]) -> Iterator[str]:
+        """Yields chunks in pieces of at most _PIECE_SIZE characters, checking
+    the deadline before each and stopping at max_size characters."""
+        size = 0
+        for chunk in chunks:
+            for start in range(0, len(chunk), _PIECE_SIZE):
+                piece = chunk
+                if len(chunk) > _PIECE_SIZE:
+                    piece = chunk[start:start + _PIECE_SIZE]
+                if deadline is not None and time.monotonic() > deadline:
+                    raise LimitExceededError('timeout')
+                size += len(piece)
+                if self.max_size is not None and size > self.max_size:
+                    # The code within bounds is scanned, for the comments in
+                    # it to be returned with the error. iter_comments holds
+                    # the last chunk back until it sees another.
+                    yield piece[:len(piece) - size + self.max_size]
+                    yield ''
+                    raise LimitExceededError('max_size')
+                yield piece
+
+
+class BlockComment(NamedTuple):
+    """Delimiters of a multi-line comment, see Language."""
+    start: str
+    end: str
+    # Whether the comment may contain comments of its own, each needing its
+    # own end delimiter.
+    nested: bool = False
+
+
+class Language(NamedTuple):
+    """Comment and literal syntax of a language, which Lexer scans for.
+
+  Delimiters, quotes and the escape character must be ASCII, so that UTF-8
+  encoded code can be scanned in bytes.
+
+  Attributes:
+    line_comments: Tuple of strings starting comments that run to the end of
+      the line.
+    block_comments: Tuple of BlockComment. A block comment not terminated by
+      EOF raises UnterminatedCommentError.
+    quotes: String of the characters quoting string literals, which a
+      literal must end with the same character it starts with.
+    escape: Optional character escaping the next one in string literals.
+    multiline_strings: Boolean whether string literals may span lines, an
+      unterminated one swallowing the rest of the code. Otherwise a literal
+      must end on the line it starts on, a quote with no match on its line
+      being code, and the escape character only escapes quotes.
+    code_escapes: Boolean whether the escape character also escapes the next
+      character outside of string literals.
+    single_line_blocks: Boolean whether block comments ending on the line they
+      start on are single-line comments.
+    swallow_quotes: Boolean whether a character starting a comment delimiter,
+      but no comment, swallows a quote right behind it.
+  """
+    line_comments: Tuple[str, ...] = ()
+    block_comments: Tuple[BlockComment, ...] = ()
+    quotes: str = ''
+    escape: Optional[str] = '\\'
+    multiline_strings: bool = True
+    code_escapes: bool = False
+    single_line_blocks: bool = False
+    swallow_quotes: bool = False
+
+    @property
+    def lookahead(self) -> int:
+        """Returns how many characters past one are read to decide whether it
+    starts a comment.
+
+    Returns:
+      Int
+    """
+        delimiters = self.line_comments + tuple(
+            block.start for block in self.block_comments)
+        return max((len(delimiter) - 1 for delimiter in delimiters), default=0)
+
+
+def _char_class(characters: Iterable[str], negated: bool = False) -> str:
+    """Returns a regular expression character class of characters."""
+    members = ''.join(re.escape(character) for character in sorted(characters))
+    return f'[{"^" if negated else ""}{members}]'
+
+
+def _closing(delimiters: re.Pattern, code: str, start: int,
+             end: int) -> Optional[re.Match]:
+    """Returns the match of the delimiter closing a nested block comment.
+
+  The comment's text starts at start, and its delimiters are matched by the
+  'start' and 'end' groups of delimiters. Returns None if it is not closed
+  before end.
+  """
+    depth = 1
+    for delimiter in delimiters.finditer(code, start, end):
+        depth += 1 if delimiter.lastgroup == 'start' else -1
+        if not depth:
+            return delimiter
+    return None
+
+
+class Lexer():
+    """Scans code written in a Language for comments.
+
+  A Language compiles into a single regular expression, each match of which
+  consumes a run of code, including any literals in it, up to and including
+  the next comment. Runs are matched possessively, so scanning never
+  backtracks into code already consumed. When the _lexer extension module is
+  available, its compiled scanner follows the same rules in a single pass.
+  """
+
+    def __init__(self, language: Language, compiled: bool = True):
+        """Initializes Lexer.
+
+    Args:
+      language: Language of the code to scan.
+      compiled: Boolean whether to scan with the _lexer extension module, if
+        it is available.
+    """
+        self.language = language
+        self._compiled = None
+        if compiled and _lexer is not None:
+            try:
+                self._compiled = _lexer.Lexer(language)
+            except ValueError:
+                # Delimiters that are not ASCII are left to the pattern.
+                pass
+        # Keyed by the name of the group matching a comment's text: the length
+        # of its start delimiter, whether it is multi-line and, for nested
+        # block comments, the patterns matching their delimiters in str and in
+        # bytes code.
+        self._comments: Dict[str, Tuple[int, bool,
+                                        Optional[Dict[bool,
+                                                      re.Pattern]]]] = {}
+        self._patterns = {}
+        for final in (False, True):
+            pattern = self._compile(final)
+            self._patterns[True, final] = re.compile(pattern, re.DOTALL)
+            self._patterns[False, final] = re.compile(pattern.encode(),
+                                                      re.DOTALL)
+
+    def _compile(self, final: bool) -> str:
+        """Returns the pattern for code that does or does not run to EOF.
+
+    Unless final, literals, line comments and escapes must be terminated, and
+    enough characters must follow a delimiter's first character to tell
+    whether it starts a comment. Where those could continue past the end of
+    the code, the run stops and the empty 'partial' group matches.
+    """
+        run = self._run(final)
+        alternatives = self._comments_pattern(final)
+        return '(?>' + '|'.join(run) + ')*+(?:' + '|'.join(alternatives) + ')'
+
+    def _run(self, final: bool) -> List[str]:
+        """Returns the alternatives matching code other than comments."""
+        language = self.language
+        starts = language.line_comments + tuple(
+            block.start for block in language.block_comments)
+        special = {start[0] for start in starts} | set(language.quotes)
+        if language.code_escapes:
+            special.add(language.escape)
+        run = [_char_class(special, negated=True) + '++']
+        for first in sorted({start[0] for start in starts}):
+            rests = sorted(
+                {start[1:]
+                 for start in starts if start[0] == first})
+            if '' in rests:
+                continue
+            alternative = (re.escape(first) + '(?!' +
+                           '|'.join(map(re.escape, rests)) + ')')
+            if not final:
+                prefixes = sorted({
+                    rest[:length]
+                    for rest in rests
+                    for length in range(len(rest))
+                })
+                alternative += ('(?!(?:' + '|'.join(map(re.escape, prefixes)) +
+                                r')\Z)')
+            if language.swallow_quotes and language.quotes:
+                alternative += _char_class(list(language.quotes)) + '?'
+            run.append(alternative)
+        if language.code_escapes:
+            run.append(re.escape(language.escape) + ('.?' if final else '.'))
+        run.extend(self._string(quote, final) for quote in language.quotes)
+        return run
+
+    def _comments_pattern(self, final: bool) -> List[str]:
+        """Returns the alternatives matching a comment, or the end of a run.
+
+    Longer delimiters are tried first, so that one starting with another wins.
+    """
+        language = self.language
+        comments = []
+        for start in language.line_comments:
+            comments.append((start, [
+                re.escape(start) + self._group(start, False) + '[^\n]*)' +
+                ('' if final else r'(?=\n)')
+            ]))
+        for index, block in enumerate(language.block_comments):
+            start, end = re.escape(block.start), re.escape(block.end)
+            if block.nested:
+                delimiters = f'(?P<start>{start})|(?P<end>{end})'
+                group = self._group(
+                    block.start, True, {
+                        True: re.compile(delimiters),
+                        False: re.compile(delimiters.encode())
+                    })
+                comments.append((block.start, [start + group + ')']))
+                continue
+            alternatives = []
+            if language.single_line_blocks:
+                alternatives.append(start + self._group(block.start, False) +
+                                    '[^\n]*?)' + end)
+            alternatives.append(start + self._group(block.start, True) +
+                                '.*?)' + end)
+            alternatives.append(f'(?P<error{index}>{start})')
+            comments.append((block.start, alternatives))
+        comments.sort(key=lambda comment: -len(comment[0]))
+        alternatives = [
+            alternative for _, group in comments for alternative in group
+        ]
+        alternatives.append(r'\Z' if final else '(?P<partial>)')
+        return alternatives
+
+    def _string(self, quote: str, final: bool) -> str:
+        """Returns the pattern matching a string literal quoted by quote."""
+        escape = self.language.escape
+        escape = escape and re.escape(escape)
+        quote = re.escape(quote)
+        if not self.language.multiline_strings:
+            if escape:
+                literal = f'{quote}(?:{escape}{quote}|[^{quote}\n])*{quote}'
+            else:
+                literal = f'{quote}[^{quote}\n]*{quote}'
+            if final:
+                return f'{literal}|{quote}'
+            return f'{literal}|{quote}(?=[^{quote}\n]*+\n)'
+        if escape:
+            body = f'[^{quote}{escape}]*+(?:{escape}.[^{quote}{escape}]*+)*+'
+            end = escape + r'?\Z'
+        else:
+            body = f'[^{quote}]*+'
+            end = r'\Z'
+        if final:
+            return f'{quote}{body}(?:{quote}|{end})'
+        return f'{quote}{body}{quote}'
+
+    def _group(self,
+               start: str,
+               multiline: bool,
+               delimiters: Optional[Dict[bool, re.Pattern]] = None) -> str:
+        """Opens a new group matching the text of a comment."""
+        name = f'comment{len(self._comments)}'
+        self._comments[name] = (len(start), multiline, delimiters)
+        return f'(?P<{name}>'
+
+    @property
+    def compiled(self) -> bool:
+        """Returns whether code is scanned with the _lexer extension module.
+
+    Returns:
+      Boolean
+    """
+        return self._compiled is not None
+
+    def scan(self, code: str, position: int,
+             final: bool) -> Generator[Token, None, int]:
+        """Scans code for comments, see Scanner."""
+        if self._compiled is None:
+            return self._scan_pattern(code, position, final)
+        return self._scan_compiled(code, position, final)
+
+    def _scan_compiled(self, code: str, position: int,
+                       final: bool) -> Generator[Token, None, int]:
+        tokens, stop = self._compiled.scan(code, position, final)
+        yield from tokens
+        if stop < 0:
+            raise UnterminatedCommentError()
+        return stop
+
+    def _scan_pattern(self, code: str, position: int,
+                      final: bool) -> Generator[Token, None, int]:
+        text = isinstance(code, str)
+        pattern = self._patterns[text, final]
+        end = len(code)
+        if not final and not self.language.multiline_strings:
+            # How far a literal runs depends on the rest of its line, so only
+            # whole lines are scanned.
+            end = max(position, code.rfind('\n') + 1)
+        while True:
+            for match in pattern.finditer(code, position, end):
+                kind = match.lastgroup
+                if kind is None:
+                    continue
+                comment = self._comments.get(kind)
+                if comment is None:
+                    if final:
+                        raise UnterminatedCommentError()
+                    return match.start(kind)
+                length, multiline, delimiters = comment
+                text_start = match.start(kind)
+                if delimiters is None:
+                    yield (text_start - length, match.end(), text_start,
+                           match.end(kind), multiline)
+                    continue
+                closing = _closing(delimiters[text], code, text_start, end)
+                if closing is None:
+                    if final:
+                        raise UnterminatedCommentError()
+                    return text_start - length
+                yield (text_start - length, closing.end(), text_start,
+                       closing.start(), True)
+                position = closing.end()
+                break
+            else:
+                return end
+
+
+def _filter_tokens(
+    code: str,
+    tokens: Generator[Token, None, int],
+    offset: int,
+    first_line: int,
+    comment_filter: Filter,
+) -> Generator[Token, None, Optional[int]]:
+    """Yields the tokens of the comments comment_filter keeps, returning the
+  tokens' stop offset, or None once comment_filter stops scanning.
+
+  offset and first_line locate code[0] in the whole source.
+  """
+    # Tokens are only located up front if the filter bounds lines, the
+    # LineCounter of _tokens_to_comments catching up in bulk with those kept
+    # otherwise.
+    line_counter = None
+    if comment_filter.first_line > 1 or comment_filter.last_line is not None:
+        line_counter = LineCounter(code)
+    # Where the code following the last comment starts.
+    last_end = code_start(code) if offset == 0 else 0
+    while True:
+        try:
+            token = next(tokens)
+        except StopIteration as stop:
+            if comment_filter.leading and _CODE.search(code, last_end,
+                                                       stop.value):
+                return None
+            return stop.value
+        start, end, text_start, text_end, multiline = token
+        if comment_filter.exceeds(offset + start) or (
+                comment_filter.leading
+                and _CODE.search(code, last_end, start)):
+            tokens.close()
+            return None
+        last_end = end
+        line_number = 1
+        if line_counter is not None:
+            line_number = line_counter.line_number(start) + first_line - 1
+            if comment_filter.passed(line_number):
+                tokens.close()
+                return None
+        if comment_filter.selects(line_number,
+                                  multiline) and (comment_filter.matches(
+                                      code[text_start:text_end])):
+            yield token
+
+
+def _tokens_to_comments(
+    code: str,
+    tokens: Generator[Token, None, Optional[int]],
+    offset: int,
+    first_line: int,
+    first_column: int,
+) -> Generator[Comment, None, Optional[int]]:
+    """Yields a Comment per token, returning the tokens' stop offset.
+
+  offset, first_line and first_column locate code[0] in the whole source.
+  """
+    line_counter = LineCounter(code)
+    while True:
+        try:
+            start, end, text_start, text_end, multiline = next(tokens)
+        except StopIteration as stop:
+            return stop.value
+        line_number, column = line_counter.locate(start)
+        if line_number == 1:
+            column += first_column
+        yield Comment(code[text_start:text_end], first_line + line_number - 1,
+                      multiline, offset + start, offset + end, column)
+
+
+def split(code: str, comment_filter: Optional[Filter] = None) -> Iterable[str]:
+    """Returns code as chunks for iter_comments.
+
+  When comment_filter may stop scanning early, the code is split in pieces
+  growing from _FIRST_PIECE_SIZE to _PIECE_SIZE characters, so that code past
+  where it stops is hardly scanned.
+
+  Args:
+    code: String containing code.
+    comment_filter: Optional Filter comments are extracted with.
+  Returns:
+    Iterable of strings which concatenated form code.
+  """
+    if comment_filter is None or not comment_filter.bounded:
+        return (code, )
+    return _pieces(code)
+
+
+def _pieces(code: str) -> Iterator[str]:
+    """Yields code in pieces, see split."""
+    start = 0
+    size = _FIRST_PIECE_SIZE
+    while True:
+        yield code[start:start + size]
+        start += size
+        if start >= len(code):
+            return
+        size = min(2 * size, _PIECE_SIZE)
+
+
+def iter_comments(
+        chunks: Iterable[str],
+        scan: Scanner,
+        comment_filter: Optional[Filter] = None) -> Iterator[Comment]:
+    """Scans code arriving in chunks and yields comments as they are found.
+
+  Only code that scan has not consumed yet is buffered, so memory stays
+  proportional to the longest comment or literal rather than to the code.
+  While a scan makes no progress, chunks are gathered until the buffer doubles
+  before scanning again, which keeps rescanning linear.
+
+  Args:
+    chunks: Iterable of strings which concatenated form the code.
+    scan: Scanner for the code's language.
+    comment_filter: Optional Filter selecting the comments to yield. Chunks
+      are no longer read once it is done.
+  Returns:
+    Iterator of Comment in the order that they appear in the code.
+  Raises:
+    UnterminatedCommentError: Encountered an unterminated multi-line comment.
+  """
+    comments = _iter_comments(chunks, scan, comment_filter)
+    if comment_filter is None or comment_filter.max_count is None:
+        return comments
+    return comment_filter.limit(comments)
+
+
+def _iter_comments(chunks: Iterable[str], scan: Scanner,
+                   comment_filter: Optional[Filter]) -> Iterator[Comment]:
+    """Implements iter_comments, but for comment_filter's max_count.
+
+  Yields:
+    Comment in the order that they appear in the code.
+  """
+    buffer = ''
+    offset = 0
+    first_line = 1
+    first_column = 0
+    pending = []
+    pending_size = 0
+    chunks = iter(chunks)
+    chunk = next(chunks, '')
+    # The last chunk is held back so that it is scanned as running to EOF.
+    for next_chunk in chunks:
+        pending.append(chunk)
+        pending_size += len(chunk)
+        chunk = next_chunk
+        if pending_size < len(buffer):
+            continue
+        buffer = ''.join([buffer] + pending)
+        pending = []
+        pending_size = 0
+        tokens = scan(buffer, 0, False)
+        if comment_filter is not None:
+            tokens = _filter_tokens(buffer, tokens, offset, first_line,
+                                    comment_filter)
+        stop = yield from _tokens_to_comments(buffer, tokens, offset,
+                                              first_line, first_column)
+        if stop is None:
+            return
+        newlines = buffer.count('\n', 0, stop)
+        if newlines:
+            first_line += newlines
+            first_column = stop - buffer.rfind('\n', 0, stop) - 1
+        else:
+            first_column += stop
+        offset += stop
+        buffer = buffer[stop:]
+        _check_open_comment(buffer, scan)
+        if comment_filter is not None and (comment_filter.passed(first_line)
+                                           or comment_filter.exceeds(offset)):
+            return
+    parts = [part for part in [buffer] + pending + [chunk] if part]
+    buffer = parts[0] if len(parts) == 1 else ''.join(parts)
+    tokens = scan(buffer, 0, True)
+    if comment_filter is not None:
+        tokens = _filter_tokens(buffer, tokens, offset, first_line,
+                                comment_filter)
+    yield from _tokens_to_comments(buffer, tokens, offset, first_line,
+                                   first_column)
+
+
+def _check_open_comment(code: str, scan: Scanner) -> None:
+    """Checks the comment that code, left over by a scan, may end in.
+
+  Raises:
+    LimitExceededError: The comment's text is already longer than the
+      max_comment_length of the running Limits.extract, or, for an
+      unterminated multi-line comment, bound to be.
+  """
+    max_length = _MAX_COMMENT_LENGTH.get()
+    if max_length is None or len(code) <= max_length:
+        return
+    last = None
+    try:
+        for last in scan(code, 0, True):
+            pass
+    except UnterminatedCommentError:
+        # Scanning the code as a complete line stops at the comment's start.
+        tokens = scan(code + '\n', 0, False)
+        while True:
+            try:
+                next(tokens)
+            except StopIteration as stop:
+                length = len(code) - stop.value - _DELIMITERS_SIZE
+                break
+    else:
+        if last is None or last[1] != len(code):
+            return
+        length = last[3] - last[2]
+    if length > max_length:
+        raise LimitExceededError('max_comment_length')
@@ -1,11 +1,45 @@
 #!/usr/bin/python
 """This module provides methods for parsing comments from Javascript code."""
 
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Union
 from comment_parser.parsers import common
+from comment_parser.parsers import table
 
+# A '/' that does not start a comment swallows a quote right behind it.
+LANGUAGE = common.Language(line_comments=('//', ),
+                           block_comments=(common.BlockComment('/*', '*/'), ),
+                           quotes='"\'',
+                           swallow_quotes=True)
 
-def extract_comments(code: str) -> List[common.Comment]:
+# Scans Javascript code for comments, see common.Scanner.
+scan = common.Lexer(LANGUAGE).scan
+
+
+def iter_comments(
+    chunks: Iterable[str],
+    comment_filter: Optional[common.Filter] = None
+) -> Iterator[common.Comment]:
+    """Yields comments from Javascript source code arriving in chunks.
+
+  See extract_comments for how comments are found. Chunks are scanned as they
+  arrive, buffering only what may belong to an unfinished comment or string.
+
+  Args:
+    chunks: Iterable of strings which concatenated form the code.
+    comment_filter: Optional common.Filter selecting the comments to yield.
+  Yields:
+    common.Comment in the order that they appear in the code.
+  Raises:
+    common.UnterminatedCommentError: Encountered an unterminated multi-line
+      comment.
+  """
+    return common.iter_comments(chunks, scan, comment_filter)
+
+
+def extract_comments(
+        code: str,
+        comment_filter: Optional[common.Filter] = None
+) -> List[common.Comment]:
     """Extracts a list of comments from the given Javascript source code.
 
   Comments are represented with the Comment class found in the common module.
@@ -19,86 +53,57 @@ def extract_comments(code: str) -> List[common.Comment]:
 
   Args:
     code: String containing code to extract comments from.
+    comment_filter: Optional common.Filter selecting the comments to extract.
+  Returns:
+    Python list of common.Comment in the order that they appear in the code.
+  Raises:
+    common.UnterminatedCommentError: Encountered an unterminated multi-line
+      comment.
+  """
+    return list(
+        iter_comments(common.split(code, comment_filter), comment_filter))
+
+
+def extract_comments_from_bytes(
+        code: common.Buffer,
+        comment_filter: Optional[common.Filter] = None
+) -> List[common.Comment]:
+    """Extracts a list of comments from UTF-8 encoded Javascript source code.
+
+  See extract_comments for how comments are found, and
+  table.extract_comments_from_bytes for how bytes are handled.
+
+  Args:
+    code: Bytes-like object, such as an mmap.mmap, holding the code.
+    comment_filter: Optional common.Filter selecting the comments to extract.
   Returns:
     Python list of common.Comment in the order that they appear in the code.
   Raises:
     common.UnterminatedCommentError: Encountered an unterminated multi-line
       comment.
+    UnicodeDecodeError: The text of a comment is not valid UTF-8.
+  """
+    return table.extract_comments_from_bytes(code, scan, comment_filter)
+
+
+def extract_comment_table(
+        code: Union[str, common.Buffer],
+        comment_filter: Optional[common.Filter] = None) -> table.CommentTable:
+    """Extracts a table.CommentTable of the comments in Javascript source code.
+
+  See extract_comments for how comments are found, and
+  table.extract_comment_table for how they are held.
+
+  Args:
+    code: String, or bytes-like object holding UTF-8 encoded code.
+    comment_filter: Optional common.Filter selecting the comments to extract.
+  Returns:
+    table.CommentTable of the comments in the order that they appear in the
+      code.
+  Raises:
+    common.UnterminatedCommentError: Encountered an unterminated multi-line
+      comment.
+    UnicodeDecodeError: The text of a comment selected by a pattern is not
+      valid UTF-8.
   """
-    state = 0
-    current_comment = ''
-    comments = []
-    line_counter = 1
-    comment_start = 1
-    string_char = ''
-    for char in code:
-        if state == 0:
-            # Waiting for comment start character or beginning of
-            # string.
-            if char == '/':
-                state = 1
-            elif char in ('"', "'"):
-                string_char = char
-                state = 5
-        elif state == 1:
-            # Found comment start character, classify next character and
-            # determine if single or multi-line comment.
-            if char == '/':
-                state = 2
-            elif char == '*':
-                comment_start = line_counter
-                state = 3
-            else:
-                state = 0
-        elif state == 2:
-            # In single-line comment, read characters until EOL.
-            if char == '\n':
-                comment = common.Comment(current_comment, line_counter)
-                comments.append(comment)
-                current_comment = ''
-                state = 0
-            else:
-                current_comment += char
-        elif state == 3:
-            # In multi-line comment, add characters until '*' is
-            # encountered.
-            if char == '*':
-                state = 4
-            else:
-                current_comment += char
-        elif state == 4:
-            # In multi-line comment with asterisk found. Determine if
-            # comment is ending.
-            if char == '/':
-                comment = common.Comment(current_comment,
-                                         comment_start,
-                                         multiline=True)
-                comments.append(comment)
-                current_comment = ''
-                state = 0
-            else:
-                current_comment += '*'
-                # Care for multiple '*' in a row
-                if char != '*':
-                    current_comment += char
-                    state = 3
-        elif state == 5:
-            # In string literal, expect literal end or escape character.
-            if char == string_char:
-                state = 0
-            elif char == '\\':
-                state = 6
-        elif state == 6:
-            # In string literal, escaping current char.
-            state = 5
-        if char == '\n':
-            line_counter += 1
-
-    # EOF.
-    if state in (3, 4):
-        raise common.UnterminatedCommentError()
-    if state == 2:
-        # Was in single-line comment. Create comment.
-        comment = common.Comment(current_comment, line_counter)
-        comments.append(comment)
-    return comments
+    return table.extract_comment_table(code, scan, comment_filter)
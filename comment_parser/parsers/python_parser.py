@@ -1,30 +1,544 @@
 #!/usr/bin/python
-"""This module provides methods for parsing comments from Python scripts."""
+"""This module provides methods for parsing comments from Python scripts.
 
-import io
+Scripts are scanned by a lexer which only tells comments apart from code: it
+knows of string prefixes, triple-quoted strings, line continuations and
+f-strings, whose replacement fields may hold nested strings and comments as
+of PEP 701. Docstrings may be extracted as multi-line comments. Malformed
+scripts are scanned as far as they go, an unterminated string running to the
+end of its line or, if triple-quoted, of the script.
+"""
+
+import codecs
+import re
 import tokenize
-from typing import List
+from typing import (Dict, Generator, Iterable, Iterator, List, Optional,
+                    Pattern, Union)
 from comment_parser.parsers import common
+from comment_parser.parsers import table
+
+# Prefixes of string literals other than f-strings, of f-strings and of
+# docstrings.
+_PREFIX = '(?:[rR][bBuU]?|[bBuU][rR]?)'
+_FSTRING_PREFIX = '(?:[fF][rR]?|[rR][fF])'
+_DOCSTRING_PREFIX = '[rRuU]?'
+
+_QUOTES = ("'''", '"""', "'", '"')
+_QUOTE = '(?:\'\'\'|"""|\'|")'
+
+# Characters of words in str and in UTF-8 encoded bytes. Characters other than
+# ASCII are all taken for word characters, as bytes cannot tell them apart.
+_WORD = {True: r'\w\x80-\U0010ffff', False: r'\w\x80-\xff'}
+
+# A character in str and in UTF-8 encoded bytes, with its continuation bytes.
+_CHAR = {True: '.', False: r'.[\x80-\xbf]*+'}
+
+# How many characters past a position may be looked at to tell what is there.
+# Unless the code runs to EOF, what ends closer to its end is left for later.
+_LOOKAHEAD = 3
+
+
+def _body(quote: str) -> str:
+    """Returns the pattern matching the text of a string literal."""
+    char = re.escape(quote[0])
+    escape = r'\\(?:\r\n|.)'
+    if len(quote) == 3:
+        return (f'[^{char}\\\\]*+(?:(?:{escape}|{char}(?!{char}{char}))'
+                f'[^{char}\\\\]*+)*+')
+    return f'[^{char}\\\\\r\n]*+(?:{escape}[^{char}\\\\\r\n]*+)*+'
+
+
+def _string(quote: str, final: bool) -> str:
+    """Returns the pattern matching a terminated string literal.
+
+  A single-quoted literal does not start with a triple quote and, unless
+  final, must not end the code, as '' could start a triple quote.
+  """
+    literal = f'{quote}{_body(quote)}{quote}'
+    if len(quote) == 3:
+        return literal
+    literal = f'(?!{quote * 3}){literal}'
+    return literal if final else literal + r'(?!\Z)'
+
+
+def _strings(final: bool) -> str:
+    """Returns the pattern matching a terminated string other than f-strings."""
+    return f'{_PREFIX}?(?:' + '|'.join(
+        _string(quote, final) for quote in _QUOTES) + ')'
+
+
+def _compile(text: bool, final: bool, headers: bool, brackets: bool) -> str:
+    """Returns the pattern of a run of code up to a comment or a stop.
+
+  The run consumes words and terminated string literals other than f-strings.
+  Unless final, neither words, which could be string prefixes, nor comments
+  may end the code. The run stops at the text of a comment, the 'comment'
+  group, at the 'fstring' group with its 'quote', at an 'unterminated' string
+  and at the end of the code, or its 'partial' group unless final. If
+  headers, it also stops at a def or class keyword, the 'header' group. If
+  brackets, it consumes line continuations and also stops at the 'open',
+  'close', 'colon' and 'newline' groups.
+  """
+    word = _WORD[text]
+    special = '#\'"' + word
+    words = f'(?!(?:{_PREFIX}|{_FSTRING_PREFIX})[\'"])'
+    if headers:
+        words += f'(?!(?:def|class)(?![{word}]))'
+    words += f'[{word}]++' + ('' if final else r'(?!\Z)')
+    run = [words, _strings(final)]
+    alternatives = [
+        '#(?P<comment>[^\r\n]*+)' + ('' if final else '(?=[\r\n])'),
+        f'(?P<fstring>{_FSTRING_PREFIX}(?P<quote>{_QUOTE}))'
+    ]
+    if headers:
+        alternatives.append(f'(?P<header>(?:def|class)(?![{word}]))')
+    if brackets:
+        special += '()\\[\\]{}:\r\n\\\\'
+        run.append(rf'\\(?:\r\n|{_CHAR[text]})?')
+        alternatives.extend([
+            '(?P<open>[([{])', '(?P<close>[)\\]}])', '(?P<colon>:)',
+            '(?P<newline>[\r\n])'
+        ])
+    run.insert(0, f'[^{special}]++')
+    alternatives.append(f'(?P<unterminated>{_PREFIX}?{_QUOTE})')
+    alternatives.append(r'\Z' if final else '(?P<partial>)')
+    return '(?>' + '|'.join(run) + ')*+(?:' + '|'.join(alternatives) + ')'
+
+
+def _compile_literal(quote: str, raw: bool) -> str:
+    """Returns the pattern of the literal text of an f-string up to a stop.
+
+  The text stops at the 'end' group, the closing quote, at the 'field' and
+  'brace' groups, braces other than doubled ones, at the 'newline' group if
+  the f-string is single-quoted, or at the end of the code. Backslashes never
+  escape braces, and \\N{...} escapes hold no replacement field unless raw.
+  """
+    char = re.escape(quote[0])
+    escape = r'\\(?:\r\n|[^{}]|(?=[{}]))'
+    if not raw:
+        escape = r'\\N\{[^{}\r\n]*\}|' + escape
+    if len(quote) == 3:
+        literal = f'[^{{}}\\\\{char}]++|{escape}|{char}(?!{char}{char})'
+        newline = ''
+    else:
+        literal = f'[^{{}}\\\\{char}\r\n]++|{escape}'
+        newline = '|(?P<newline>[\r\n])'
+    return (f'(?:{literal}|\\{{\\{{|\\}}\\}})*+(?:(?P<end>{quote})'
+            f'|(?P<field>\\{{)|(?P<brace>\\}}){newline}|\\\\?\\Z)')
+
+
+def _compile_docstring() -> str:
+    """Returns the pattern of a statement made of a docstring only.
+
+  The docstring is the 'string' group, starting with its 'prefix'. Unless
+  single-quoted, it is also the 'triple' group.
+  """
+    triple = '|'.join(_string(quote, True) for quote in _QUOTES[:2])
+    single = '|'.join(_string(quote, True) for quote in _QUOTES[2:])
+    return (
+        f'(?P<string>(?P<prefix>{_DOCSTRING_PREFIX})(?:(?P<triple>{triple})'
+        f'|{single}))(?:[ \t\f]++|\\\\(?:\r\n|[\r\n]))*+(?:[#;\r\n]|\\Z)')
+
+
+def _regex(pattern: str, text: bool) -> Pattern:
+    """Returns pattern compiled to match str if text, else bytes."""
+    return re.compile(pattern if text else pattern.encode(), re.DOTALL)
+
+
+def _patterns(pattern: str) -> Dict[bool, Pattern]:
+    """Returns pattern compiled for str and for bytes, keyed by the former."""
+    return {text: _regex(pattern, text) for text in (True, False)}
+
+
+# Patterns of code, keyed by whether they match str, whether the code runs to
+# EOF and whether they stop at headers.
+_CODE = {
+    (text, final, headers): _regex(_compile(text, final, headers, False), text)
+    for text in (True, False)
+    for final in (True, False)
+    for headers in (True, False)
+}
+
+# Patterns of code within brackets, such as replacement fields, keyed by
+# whether they match str.
+_BRACKETS = {
+    text: _regex(_compile(text, True, False, True), text)
+    for text in (True, False)
+}
+
+# Patterns of the literal text of f-strings, keyed by their quote and whether
+# they are raw.
+_LITERALS = {
+    (quote, raw): _patterns(_compile_literal(quote, raw))
+    for quote in _QUOTES
+    for raw in (True, False)
+}
+
+_DOCSTRING = _patterns(_compile_docstring())
+
+# A string literal, which may not be a docstring, and the start of one.
+_STRING = _patterns(_strings(True))
+_OPENING = _patterns(f'(?:{_PREFIX}|{_FSTRING_PREFIX})?{_QUOTE}')
+
+# Blank space before a docstring, and a comment there.
+_BLANK = _patterns(r'(?:[ \t\f\r\n]++|\\(?:\r\n|[\r\n]))*+')
+_COMMENT = _patterns('#([^\r\n]*+)')
+
+# A line of a script, of which the first two may declare its encoding.
+_LINE = re.compile(rb'[^\n]*+\n?')
+
+# The rest of the line of an unterminated single-quoted string.
+_REST_OF_LINE = _patterns(r'[^\\\r\n]*+(?:\\(?:\r\n|.)[^\\\r\n]*+)*+')
+
+
+def _match(pattern: Pattern, code: Union[str, common.Buffer],
+           position: int) -> re.Match:
+    """Returns the match of pattern at position, which cannot fail."""
+    match = pattern.match(code, position)
+    assert match is not None
+    return match
+
+
+def _scan(code: str, position: int, final: bool,
+          docstrings: bool) -> Generator[common.Token, None, int]:
+    """Scans code for comments and, if docstrings, the docstrings of classes
+  and functions, see common.Scanner."""
+    pattern = _CODE[isinstance(code, str), final, docstrings]
+    while True:
+        match = _match(pattern, code, position)
+        kind = match.lastgroup
+        if kind == 'comment':
+            position = match.end()
+            yield (match.start(kind) - 1, position, match.start(kind),
+                   position, False)
+            continue
+        if kind is None or kind == 'partial':
+            return match.end()
+        start = match.start(kind)
+        tokens: List[common.Token] = []
+        if kind == 'fstring':
+            end = _fstring(code, match, final, tokens)
+        elif kind == 'header':
+            end = _header(code, match.end(), final, tokens)
+        else:
+            end = _recover(code, match, final)
+        if end is None:
+            return start
+        yield from tokens
+        position = end
+
+
+def scan(code: str, position: int,
+         final: bool) -> Generator[common.Token, None, int]:
+    """Scans a script for comments only, see common.Scanner."""
+    return (yield from _scan(code, position, final, False))
+
+
+def _docstring_scanner() -> common.Scanner:
+    """Returns a scanner of a script for comments and docstrings.
+
+  Docstrings are those of the module, classes and functions: string literals,
+  neither bytes nor f-strings, making up the first statement of their body.
+  As the module's is looked for once, at the start of the script, the scanner
+  scans a single script.
+  """
+    started = False
+
+    def scan_docstrings(code: str, position: int,
+                        final: bool) -> Generator[common.Token, None, int]:
+        nonlocal started
+        if not started:
+            tokens: List[common.Token] = []
+            end = _docstring(code, position, final, tokens)
+            if end is None:
+                return position
+            started = True
+            yield from tokens
+            position = end
+        return (yield from _scan(code, position, final, True))
+
+    return scan_docstrings
+
+
+def _complete(code: str, position: int, final: bool) -> Optional[int]:
+    """Returns position, or None if it is too close to the code's end."""
+    if final or position <= len(code) - _LOOKAHEAD:
+        return position
+    return None
+
+
+def _recover(code: str, match: re.Match, final: bool) -> Optional[int]:
+    """Returns where an unterminated string matched by match ends.
+
+  A triple-quoted string runs to the end of the script, a single-quoted one
+  to the end of its line.
+  """
+    opening = match.group('unterminated')
+    if opening[-1:] * 3 == opening[-3:]:
+        return len(code) if final else None
+    end = _match(_REST_OF_LINE[isinstance(code, str)], code, match.end()).end()
+    return _complete(code, end, final)
 
 
-def extract_comments(code: str) -> List[common.Comment]:
+def _fstring(code: str, match: re.Match, final: bool,
+             tokens: List[common.Token]) -> Optional[int]:
+    """Skips the f-string starting at match, gathering tokens in it.
+
+  Returns:
+    Offset (int) past the f-string, or None if it is not known yet.
+  """
+    quote = match.group('quote')
+    raw = match.start('quote') - match.start('fstring') == 2
+    if not isinstance(quote, str):
+        quote = quote.decode()
+    literal = _LITERALS[quote, raw][isinstance(code, str)]
+    end = _literal(code, match.end(), literal, tokens, False)
+    return _complete(code, end, final)
+
+
+def _literal(code: str, position: int, literal: Pattern,
+             tokens: List[common.Token], spec: bool) -> int:
+    """Skips the literal text of an f-string, gathering tokens in it.
+
+  literal is the pattern of the f-string's text, see _compile_literal. If
+  spec, the text is a format specifier, which ends at a closing brace.
+
+  Returns:
+    Offset (int) past the f-string or format specifier.
+  """
+    while True:
+        match = _match(literal, code, position)
+        kind = match.lastgroup
+        position = match.end()
+        if kind == 'field':
+            position = _field(code, position, literal, tokens)
+        elif kind == 'brace':
+            if spec:
+                return position
+        elif spec and kind is not None:
+            # Leaves the end of the f-string to be found again.
+            return match.start(kind)
+        elif kind == 'newline':
+            # An unterminated f-string ends with its line.
+            return match.start(kind)
+        else:
+            return position
+
+
+def _field(code: str, position: int, literal: Pattern,
+           tokens: List[common.Token]) -> int:
+    """Skips a replacement field of an f-string, gathering tokens in it.
+
+  literal is the pattern of the f-string's text, see _compile_literal.
+
+  Returns:
+    Offset (int) past the field.
+  """
+    pattern = _BRACKETS[isinstance(code, str)]
+    depth = 0
+    while True:
+        match = _match(pattern, code, position)
+        kind = match.lastgroup
+        position = match.end()
+        if kind == 'comment':
+            tokens.append((match.start(kind) - 1, position, match.start(kind),
+                           position, False))
+        elif kind == 'fstring':
+            position = _fstring(code, match, True, tokens)
+        elif kind == 'open':
+            depth += 1
+        elif kind == 'close':
+            if not depth:
+                return position
+            depth -= 1
+        elif kind == 'colon':
+            if not depth:
+                return _literal(code, position, literal, tokens, True)
+        elif kind == 'unterminated':
+            position = _recover(code, match, True)
+        elif kind is None:
+            return position
+
+
+def _header(code: str, position: int, final: bool,
+            tokens: List[common.Token]) -> Optional[int]:
+    """Skips the header of a class or function, and its docstring.
+
+  position is past the def or class keyword. Tokens found are gathered.
+
+  Returns:
+    Offset (int) to scan on from, or None if it is not known yet.
+  """
+    pattern = _BRACKETS[isinstance(code, str)]
+    depth = 0
+    while True:
+        match = _match(pattern, code, position)
+        kind = match.lastgroup
+        position = match.end()
+        if kind == 'comment':
+            tokens.append((match.start(kind) - 1, position, match.start(kind),
+                           position, False))
+        elif kind == 'fstring':
+            position = _fstring(code, match, True, tokens)
+        elif kind == 'open':
+            depth += 1
+        elif kind == 'close':
+            depth = max(depth - 1, 0)
+        elif kind == 'colon':
+            if not depth:
+                return _docstring(code, position, final, tokens)
+        elif kind == 'newline':
+            if not depth:
+                return _complete(code, match.start(kind), final)
+        elif kind == 'unterminated':
+            position = _recover(code, match, True)
+        else:
+            return _complete(code, position, final)
+
+
+def _docstring(code: str, position: int, final: bool,
+               tokens: List[common.Token]) -> Optional[int]:
+    """Skips the docstring of a body starting at position, if any.
+
+  The docstring and comments before it are gathered in tokens.
+
+  Returns:
+    Offset (int) to scan on from, or None if it is not known yet.
+  """
+    text = isinstance(code, str)
+    while True:
+        position = _match(_BLANK[text], code, position).end()
+        match = _COMMENT[text].match(code, position)
+        if match is None:
+            break
+        if not final and match.end() == len(code):
+            return None
+        tokens.append(
+            (position, match.end(), match.start(1), match.end(), False))
+        position = match.end()
+    match = _DOCSTRING[text].match(code, position)
+    if match is not None:
+        if _complete(code, match.end(), final) is None:
+            return None
+        quote = 3 if match.start('triple') >= 0 else 1
+        start, end = match.span('string')
+        tokens.append(
+            (start, end, match.end('prefix') + quote, end - quote, True))
+        return end
+    if final or not _may_start_docstring(code, position):
+        return position
+    return None
+
+
+def _may_start_docstring(code: str, position: int) -> bool:
+    """Returns whether more code could make a docstring start at position."""
+    text = isinstance(code, str)
+    match = _STRING[text].match(code, position)
+    if match is not None:
+        return _complete(code, match.end(), False) is None
+    if _OPENING[text].match(code, position):
+        return True
+    return _complete(code, position, False) is None
+
+
+def _scanner(comment_filter: Optional[common.Filter]) -> common.Scanner:
+    """Returns the scanner of a script for comment_filter."""
+    if comment_filter is not None and comment_filter.docstrings:
+        return _docstring_scanner()
+    return scan
+
+
+def iter_comments(
+    chunks: Iterable[str],
+    comment_filter: Optional[common.Filter] = None
+) -> Iterator[common.Comment]:
+    """Yields comments from a Python script arriving in chunks.
+
+  See extract_comments for how comments are found.
+
+  Args:
+    chunks: Iterable of strings which concatenated form the script.
+    comment_filter: Optional common.Filter selecting the comments to yield.
+  Yields:
+    common.Comment in the order that they appear in the script.
+  """
+    return common.iter_comments(chunks, _scanner(comment_filter),
+                                comment_filter)
+
+
+def extract_comments(
+        code: str,
+        comment_filter: Optional[common.Filter] = None
+) -> List[common.Comment]:
     """Extracts a list of comments from the given Python script.
 
-  Comments are identified using the tokenize module. Does not include function,
-  class, or module docstrings. All comments are single line comments.
+  Comments are single line comments. Function, class and module docstrings
+  are only included, as multi-line comments, if comment_filter selects
+  docstrings. Malformed scripts do not raise.
 
   Args:
     code: String containing code to extract comments from.
+    comment_filter: Optional common.Filter selecting the comments to extract.
   Returns:
     Python list of common.Comment in the order that they appear in the code.
+  """
+    return list(
+        iter_comments(common.split(code, comment_filter), comment_filter))
+
+
+def extract_comments_from_bytes(
+        code: common.Buffer,
+        comment_filter: Optional[common.Filter] = None
+) -> List[common.Comment]:
+    """Extracts a list of comments from an encoded Python script.
+
+  See extract_comments for how comments are found. The script is scanned
+  straight from its bytes, comments being decoded as declared by the script's
+  encoding declaration, UTF-8 by default. Offsets and columns count bytes.
+
+  Args:
+    code: Bytes-like object, such as an mmap.mmap, holding the script.
+    comment_filter: Optional common.Filter selecting the comments to extract.
+  Returns:
+    Python list of common.Comment in the order that they appear in the script.
+  Raises:
+    SyntaxError: The script's encoding is invalid.
+  """
+    return table.extract_comments_from_bytes(code, _scanner(comment_filter),
+                                             comment_filter, _encoding(code))
+
+
+def extract_comment_table(
+        code: Union[str, common.Buffer],
+        comment_filter: Optional[common.Filter] = None) -> table.CommentTable:
+    """Extracts a table.CommentTable of the comments in a Python script.
+
+  See extract_comments for how comments are found, extract_comments_from_bytes
+  for how bytes are decoded and table.extract_comment_table for how comments
+  are held.
+
+  Args:
+    code: String, or bytes-like object holding the encoded script.
+    comment_filter: Optional common.Filter selecting the comments to extract.
+  Returns:
+    table.CommentTable of the comments in the order that they appear in the
+      script.
   Raises:
-    tokenize.TokenError
-  """
-    comments = []
-    tokens = tokenize.tokenize(io.BytesIO(code.encode()).readline)
-    for toknum, tokstring, tokloc, _, _ in tokens:
-        if toknum is tokenize.COMMENT:
-            # Removes leading '#' character.
-            tokstring = tokstring[1:]
-            comments.append(common.Comment(tokstring, tokloc[0], False))
-    return comments
+    SyntaxError: The script's encoding is invalid.
+  """
+    encoding = 'utf-8' if isinstance(code, str) else _encoding(code)
+    return table.extract_comment_table(code, _scanner(comment_filter),
+                                       comment_filter, encoding)
+
+
+def _encoding(code: common.Buffer) -> str:
+    """Returns the encoding an encoded script declares, UTF-8 by default."""
+    with memoryview(code) as view:
+        lines = []
+        # The byte order mark is left out, as when reading in text mode.
+        start = len(codecs.BOM_UTF8) if view[:3] == codecs.BOM_UTF8 else 0
+        for _ in range(2):
+            line = _match(_LINE, view, start).group()
+            lines.append(line)
+            start += len(line)
+    return tokenize.detect_encoding(iter(lines).__next__)[0]
@@ -1,13 +1,40 @@
 #!/usr/bin/python
 """This module provides methods for parsing comments from Ruby code."""
 
-import re
-from bisect import bisect_left
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Union
 from comment_parser.parsers import common
+from comment_parser.parsers import table
 
+LANGUAGE = common.Language(line_comments=('#', ),
+                           quotes='"\'',
+                           multiline_strings=False)
 
-def extract_comments(code: str) -> List[common.Comment]:
+# Scans Ruby code for comments, see common.Scanner.
+scan = common.Lexer(LANGUAGE).scan
+
+
+def iter_comments(
+    chunks: Iterable[str],
+    comment_filter: Optional[common.Filter] = None
+) -> Iterator[common.Comment]:
+    """Yields comments from Ruby source code arriving in chunks.
+
+  See extract_comments for how comments are found. Chunks are scanned as they
+  arrive, buffering only the last line.
+
+  Args:
+    chunks: Iterable of strings which concatenated form the code.
+    comment_filter: Optional common.Filter selecting the comments to yield.
+  Yields:
+    common.Comment in the order that they appear in the code.
+  """
+    return common.iter_comments(chunks, scan, comment_filter)
+
+
+def extract_comments(
+        code: str,
+        comment_filter: Optional[common.Filter] = None
+) -> List[common.Comment]:
     """Extracts a list of comments from the given Ruby source code.
 
   Comments are represented with the Comment class found in the common module.
@@ -17,29 +44,50 @@ def extract_comments(code: str) -> List[common.Comment]:
 
   Args:
     code: String containing code to extract comments from.
+    comment_filter: Optional common.Filter selecting the comments to extract.
   Returns:
     Python list of common.Comment in the order that they appear in the code..
   """
-    pattern = r"""
-    (?P<literal> ([\"'])((?:\\\2|(?:(?!\2)).)*)(\2)) |
-    (?P<single> \#(?P<single_content>.*?)$)
-  """
-    compiled = re.compile(pattern, re.VERBOSE | re.MULTILINE)
+    return list(
+        iter_comments(common.split(code, comment_filter), comment_filter))
 
-    lines_indexes = []
-    for match in re.finditer(r"$", code, re.M):
-        lines_indexes.append(match.start())
 
-    comments = []
-    for match in compiled.finditer(code):
-        kind = match.lastgroup
+def extract_comments_from_bytes(
+        code: common.Buffer,
+        comment_filter: Optional[common.Filter] = None
+) -> List[common.Comment]:
+    """Extracts a list of comments from UTF-8 encoded Ruby source code.
 
-        start_character = match.start()
-        line_no = bisect_left(lines_indexes, start_character)
+  See extract_comments for how comments are found, and
+  table.extract_comments_from_bytes for how bytes are handled.
 
-        if kind == "single":
-            comment_content = match.group("single_content")
-            comment = common.Comment(comment_content, line_no + 1)
-            comments.append(comment)
+  Args:
+    code: Bytes-like object, such as an mmap.mmap, holding the code.
+    comment_filter: Optional common.Filter selecting the comments to extract.
+  Returns:
+    Python list of common.Comment in the order that they appear in the code.
+  Raises:
+    UnicodeDecodeError: The text of a comment is not valid UTF-8.
+  """
+    return table.extract_comments_from_bytes(code, scan, comment_filter)
+
+
+def extract_comment_table(
+        code: Union[str, common.Buffer],
+        comment_filter: Optional[common.Filter] = None) -> table.CommentTable:
+    """Extracts a table.CommentTable of the comments in Ruby source code.
 
-    return comments
+  See extract_comments for how comments are found, and
+  table.extract_comment_table for how they are held.
+
+  Args:
+    code: String, or bytes-like object holding UTF-8 encoded code.
+    comment_filter: Optional common.Filter selecting the comments to extract.
+  Returns:
+    table.CommentTable of the comments in the order that they appear in the
+      code.
+  Raises:
+    UnicodeDecodeError: The text of a comment selected by a pattern is not
+      valid UTF-8.
+  """
+    return table.extract_comment_table(code, scan, comment_filter)
@@ -1,11 +1,40 @@
 #!/usr/bin/python
 """This module provides methods for parsing comments from shell scripts."""
 
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Union
 from comment_parser.parsers import common
+from comment_parser.parsers import table
 
+LANGUAGE = common.Language(line_comments=('#', ),
+                           quotes='"\'',
+                           code_escapes=True)
 
-def extract_comments(code: str) -> List[common.Comment]:
+# Scans shell scripts for comments, see common.Scanner.
+scan = common.Lexer(LANGUAGE).scan
+
+
+def iter_comments(
+    chunks: Iterable[str],
+    comment_filter: Optional[common.Filter] = None
+) -> Iterator[common.Comment]:
+    """Yields comments from a shell script arriving in chunks.
+
+  See extract_comments for how comments are found. Chunks are scanned as they
+  arrive, buffering only what may belong to an unfinished comment or string.
+
+  Args:
+    chunks: Iterable of strings which concatenated form the script.
+    comment_filter: Optional common.Filter selecting the comments to yield.
+  Yields:
+    common.Comment in the order that they appear in the script.
+  """
+    return common.iter_comments(chunks, scan, comment_filter)
+
+
+def extract_comments(
+        code: str,
+        comment_filter: Optional[common.Filter] = None
+) -> List[common.Comment]:
     """Extracts a list of comments from the given shell script.
 
   Comments are represented with the Comment class found in the common module.
@@ -17,52 +46,50 @@ def extract_comments(code: str) -> List[common.Comment]:
 
   Args:
     code: String containing code to extract comments from.
+    comment_filter: Optional common.Filter selecting the comments to extract.
   Returns:
     Python list of common.Comment in the order that they appear in the code.
   """
-    state = 0
-    string_char = ''
-    current_comment = ''
-    comments = []
-    line_counter = 1
-    for char in code:
-        if state == 0:
-            # Waiting for comment start character, beginning of string,
-            # or escape character.
-            if char == '#':
-                state = 1
-            elif char in ('"', "'"):
-                string_char = char
-                state = 2
-            elif char == '\\':
-                state = 4
-        elif state == 1:
-            # Found comment start character. Read comment until EOL.
-            if char == '\n':
-                comment = common.Comment(current_comment, line_counter)
-                comments.append(comment)
-                current_comment = ''
-                state = 0
-            else:
-                current_comment += char
-        elif state == 2:
-            # In string literal, wait for string end or escape char.
-            if char == string_char:
-                state = 0
-            elif char == '\\':
-                state = 3
-        elif state == 3:
-            # Escaping current char, inside of string.
-            state = 2
-        elif state == 4:
-            # Escaping current char, outside of string.
-            state = 0
-        if char == '\n':
-            line_counter += 1
-
-    # EOF.
-    if state == 1:
-        # Was in single line comment. Create comment.
-        comment = common.Comment(current_comment, line_counter)
-        comments.append(comment)
-    return comments
+    return list(
+        iter_comments(common.split(code, comment_filter), comment_filter))
+
+
+def extract_comments_from_bytes(
+        code: common.Buffer,
+        comment_filter: Optional[common.Filter] = None
+) -> List[common.Comment]:
+    """Extracts a list of comments from UTF-8 encoded shell script.
+
+  See extract_comments for how comments are found, and
+  table.extract_comments_from_bytes for how bytes are handled.
+
+  Args:
+    code: Bytes-like object, such as an mmap.mmap, holding the code.
+    comment_filter: Optional common.Filter selecting the comments to extract.
+  Returns:
+    Python list of common.Comment in the order that they appear in the code.
+  Raises:
+    UnicodeDecodeError: The text of a comment is not valid UTF-8.
+  """
+    return table.extract_comments_from_bytes(code, scan, comment_filter)
+
+
+def extract_comment_table(
+        code: Union[str, common.Buffer],
+        comment_filter: Optional[common.Filter] = None) -> table.CommentTable:
+    """Extracts a table.CommentTable of the comments in shell script.
+
+  See extract_comments for how comments are found, and
+  table.extract_comment_table for how they are held.
+
+  Args:
+    code: String, or bytes-like object holding UTF-8 encoded code.
+    comment_filter: Optional common.Filter selecting the comments to extract.
+  Returns:
+    table.CommentTable of the comments in the order that they appear in the
+      code.
+  Raises:
+    UnicodeDecodeError: The text of a comment selected by a pattern is not
+      valid UTF-8.
+  """
+    return table.extract_comment_table(code, scan, comment_filter)
@@ -0,0 +1,234 @@
+#!/usr/bin/python
+"""This module holds comments as tables of offsets into their source."""
+
+import array
+import collections.abc
+from typing import Iterator, List, Optional, Union, overload
+
+from comment_parser.parsers import common
+
+
+def extract_comments_from_bytes(
+        code: common.Buffer,
+        scan: common.Scanner,
+        comment_filter: Optional[common.Filter] = None,
+        encoding: str = 'utf-8') -> List[common.Comment]:
+    """Extracts comments from encoded code without decoding all of it.
+
+  Comments are located in the raw bytes, as delimiters are all ASCII, and
+  only their text is decoded. Offsets and columns count bytes. Carriage
+  returns are dropped from line ends, as when reading the code in text mode.
+
+  Args:
+    code: common.Buffer holding the code.
+    scan: common.Scanner for the code's language.
+    comment_filter: Optional common.Filter selecting the comments to extract.
+    encoding: Name of the code's encoding, which must be ASCII compatible.
+  Returns:
+    Python list of common.Comment in the order that they appear in the code.
+  Raises:
+    common.UnterminatedCommentError: Encountered an unterminated multi-line
+      comment.
+    UnicodeDecodeError: The text of a comment is not valid in encoding.
+  """
+    with memoryview(code) as view:
+        table = CommentTable(view, encoding)
+        _fill_table(table, scan, comment_filter)
+        # Texts are decoded before the view is released.
+        return list(table)
+
+
+class CommentTable(collections.abc.Sequence):  # pylint: disable=too-many-instance-attributes
+    """Comments held as columns of offsets into their source.
+
+  Rather than a Comment per comment, each owning a copy of its text, a table
+  keeps arrays of the comments' offsets, line numbers and columns along with
+  the source they index. Texts are sliced from the source, and Comments
+  built, only as they are accessed, so that tables of many comments take a
+  fraction of the memory. Slicing a table returns a table sharing its source.
+
+  The texts of comments in a bytes-like source, such as an mmap.mmap, are
+  decoded as they are accessed, so the source must not be closed while the
+  table is used. Their offsets and columns count bytes.
+
+  Attributes:
+    code: String or bytes-like source of the comments.
+    encoding: Name of the encoding of a bytes-like source.
+    starts: array of the offsets (int) of the comments' first characters.
+    ends: array of the offsets (int) just past the comments' last characters.
+    text_starts: array of the offsets (int) of the comments' texts.
+    text_ends: array of the offsets (int) just past the comments' texts.
+    line_numbers: array of the line numbers (int) of the comments.
+    columns: array of the zero-based columns (int) the comments start at.
+    multiline: bytearray of whether each comment is a multi-line comment.
+  """
+
+    def __init__(self,
+                 code: Union[str, common.Buffer],
+                 encoding: str = 'utf-8'):
+        """Initializes an empty CommentTable.
+
+    Args:
+      code: String or bytes-like source of the comments.
+      encoding: Name of the encoding of a bytes-like source.
+    """
+        self.code = code
+        self.encoding = encoding
+        # Offsets, and so line numbers and columns, fit in 32 bits unless the
+        # source is 4 GiB or larger.
+        typecode = 'I' if len(code) < 1 << 32 else 'Q'
+        self.starts = array.array(typecode)
+        self.ends = array.array(typecode)
+        self.text_starts = array.array(typecode)
+        self.text_ends = array.array(typecode)
+        self.line_numbers = array.array(typecode)
+        self.columns = array.array(typecode)
+        self.multiline = bytearray()
+
+    def append(self, token: common.Token, line_number: int,
+               column: int) -> None:
+        """Appends a comment located by a scanner.
+
+    Args:
+      token: common.Token of the comment.
+      line_number: Line number (int) of the comment.
+      column: Zero-based column (int) the comment starts at.
+    """
+        start, end, text_start, text_end, multiline = token
+        self.starts.append(start)
+        self.ends.append(end)
+        self.text_starts.append(text_start)
+        self.text_ends.append(text_end)
+        self.line_numbers.append(line_number)
+        self.columns.append(column)
+        self.multiline.append(multiline)
+
+    def text(self, index: int) -> str:
+        """Returns the text of the comment at index.
+
+    Args:
+      index: Index (int) of the comment.
+    Returns:
+      String
+    """
+        return _text(self.code, self.text_starts[index], self.text_ends[index],
+                     self.encoding)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @overload
+    def __getitem__(self, index: int) -> common.Comment:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> 'CommentTable':
+        ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            table = CommentTable.__new__(CommentTable)
+            table.code = self.code
+            table.encoding = self.encoding
+            for column in ('starts', 'ends', 'text_starts', 'text_ends',
+                           'line_numbers', 'columns', 'multiline'):
+                setattr(table, column, getattr(self, column)[index])
+            return table
+        return common.Comment(self.text(index), self.line_numbers[index],
+                              bool(self.multiline[index]), self.starts[index],
+                              self.ends[index], self.columns[index])
+
+    def __iter__(self) -> Iterator[common.Comment]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self) -> str:
+        return f'CommentTable({len(self)} comments)'
+
+
+def _text(code: Union[str, common.Buffer], start: int, end: int,
+          encoding: str) -> str:
+    """Returns the text of a comment from start to end in code."""
+    text = code[start:end]
+    if isinstance(text, str):
+        return text
+    text = str(text, encoding)
+    if '\r' in text:
+        text = text.replace('\r\n', '\n')
+    return text
+
+
+def _fill_table(table: CommentTable, scan: common.Scanner,
+                comment_filter: Optional[common.Filter]) -> None:
+    """Appends the comments in table's source to it, see extract_comment_table.
+
+  A bytes-like source must be a memoryview.
+  """
+    if comment_filter is not None and comment_filter.max_count == 0:
+        return
+    code = table.code
+    line_counter = common.LineCounter(code)
+    tokens = scan(code, 0, True)
+    code_start = common.code_start(code)
+    for token in tokens:
+        start, end, text_start, text_end, multiline = token
+        line_number, column = line_counter.locate(start)
+        if (not isinstance(code, str) and not multiline
+                and text_end > text_start and code[text_end - 1] == ord('\r')):
+            # Carriage returns are dropped from line ends, as when reading the
+            # code in text mode.
+            token = (start, end - 1, text_start, text_end - 1, multiline)
+        if comment_filter is not None:
+            if (comment_filter.passed(line_number)
+                    or comment_filter.exceeds(start)
+                    or (comment_filter.leading
+                        and common.has_code(code, code_start, start))):
+                break
+            code_start = end
+            if not comment_filter.selects(line_number, multiline) or (
+                    comment_filter.pattern is not None
+                    and not comment_filter.matches(
+                        _text(code, token[2], token[3], table.encoding))):
+                continue
+        table.append(token, line_number, column)
+        if comment_filter is not None and len(
+                table) == comment_filter.max_count:
+            break
+    # Releases the scan's hold on the code.
+    tokens.close()
+
+
+def extract_comment_table(code: Union[str, common.Buffer],
+                          scan: common.Scanner,
+                          comment_filter: Optional[common.Filter] = None,
+                          encoding: str = 'utf-8') -> CommentTable:
+    """Extracts the comments in code into a CommentTable.
+
+  The code is scanned as a whole. Bytes-like code is scanned in bytes, as by
+  extract_comments_from_bytes, without being decoded.
+
+  Args:
+    code: String or common.Buffer holding the code.
+    scan: common.Scanner for the code's language.
+    comment_filter: Optional common.Filter selecting the comments to extract.
+    encoding: Name of the encoding of bytes-like code, which must be ASCII
+      compatible.
+  Returns:
+    CommentTable of the comments in the order that they appear in the code.
+  Raises:
+    common.UnterminatedCommentError: Encountered an unterminated multi-line
+      comment.
+    UnicodeDecodeError: The text of a comment selected by a pattern is not
+      valid in encoding.
+  """
+    table = CommentTable(code, encoding)
+    if isinstance(code, str):
+        _fill_table(table, scan, comment_filter)
+        return table
+    with memoryview(code) as view:
+        # Scans the view, while the table keeps the code itself, which may
+        # then be closed or resized once the table is no longer used.
+        table.code = view
+        _fill_table(table, scan, comment_filter)
+        table.code = code
+    return table
@@ -103,3 +103,9 @@ class CParserTest(unittest.TestCase):
             common.Comment(' and ended it here */', 3, False)
         ]
         self.assertEqual(comments, expected)
+
+    def testCommentPositions(self):
+        code = 'int a; // one\n  /* two */'
+        comments = c_parser.extract_comments(code)
+        self.assertEqual([(c.start(), c.end(), c.column()) for c in comments],
+                         [(7, 13, 7), (16, 25, 2)])
@@ -0,0 +1,328 @@
+#!/usr/bin/python
+"""Tests for comment_parser.parsers.common.py"""
+
+import itertools
+import re
+import time
+import unittest
+from comment_parser.parsers import c_parser
+from comment_parser.parsers import common
+from comment_parser.parsers import go_parser
+from comment_parser.parsers import html_parser
+from comment_parser.parsers import js_parser
+from comment_parser.parsers import python_parser
+from comment_parser.parsers import ruby_parser
+from comment_parser.parsers import shell_parser
+
+# Code for each parser with a comment delimiter inside a literal, and comments
+# across lines, one of them holding a non-ASCII character.
+SAMPLES = {
+    c_parser: '"a // b" /* one\ntwö */ x; // three\nint y; // four',
+    go_parser: 's := `a /* b`\n/* one\ntwö */ x // three\ny // four',
+    html_parser: '<p a="<!-- b">\n<!-- one\ntwö --> <!-- three -->\n<!--4-->',
+    js_parser: 's = "a /* b";\n/* one\ntwö */ x; // three\ny; // four',
+    python_parser: 's = "a # b"\n# one\nx = 1  # twö\n# three',
+    ruby_parser: 's = "a # b"\n# one\nx = 1 # twö\n# three',
+    shell_parser: 's="a # b"\n# one\nx=1 # twö\necho \\# # three',
+}
+
+
+class LineCounterTest(unittest.TestCase):
+
+    def testIncreasingOffsets(self):
+        line_counter = common.LineCounter('a\nb\n\nc')
+        self.assertEqual(line_counter.line_number(0), 1)
+        self.assertEqual(line_counter.line_number(1), 1)
+        self.assertEqual(line_counter.line_number(2), 2)
+        self.assertEqual(line_counter.line_number(5), 4)
+
+    def testDecreasingOffsets(self):
+        line_counter = common.LineCounter('a\nb\nc')
+        self.assertEqual(line_counter.line_number(4), 3)
+        self.assertEqual(line_counter.line_number(2), 2)
+        self.assertEqual(line_counter.line_number(0), 1)
+
+    def testLocate(self):
+        line_counter = common.LineCounter('ab\ncd\n\nef')
+        self.assertEqual(line_counter.locate(1), (1, 1))
+        self.assertEqual(line_counter.locate(4), (2, 1))
+        self.assertEqual(line_counter.locate(7), (4, 0))
+        self.assertEqual(line_counter.locate(3), (2, 0))
+
+    def testLocateBytes(self):
+        line_counter = common.LineCounter(memoryview('ä\nbö\nc'.encode()))
+        self.assertEqual(line_counter.locate(1), (1, 1))
+        self.assertEqual(line_counter.locate(6), (2, 3))
+        self.assertEqual(line_counter.locate(7), (3, 0))
+
+
+class LexerTest(unittest.TestCase):
+
+    def scan(self, language, code):
+        return list(common.iter_comments((code, ),
+                                         common.Lexer(language).scan))
+
+    def testLongestDelimiterWins(self):
+        language = common.Language(line_comments=('--', ),
+                                   block_comments=(common.BlockComment(
+                                       '--[[', ']]'), ))
+        self.assertEqual(self.scan(language, 'a --[[ b\n]] c -- d\n'), [
+            common.Comment(' b\n', 1, True),
+            common.Comment(' d', 2),
+        ])
+
+    def testNestedBlockComments(self):
+        language = common.Language(
+            block_comments=(common.BlockComment('/*', '*/', nested=True), ))
+        comments = self.scan(language, 'a /* b /* c */ d */ e /* f */')
+        self.assertEqual(comments, [
+            common.Comment(' b /* c */ d ', 1, True),
+            common.Comment(' f ', 1, True),
+        ])
+        self.assertEqual((comments[0].start(), comments[0].end()), (2, 19))
+        with self.assertRaises(common.UnterminatedCommentError):
+            self.scan(language, '/* a /* b */')
+
+    def testStrings(self):
+        language = common.Language(line_comments=('#', ), quotes='"')
+        self.assertEqual(self.scan(language, 'a "# \\" #" # b\n"#'),
+                         [common.Comment(' b', 1)])
+        language = language._replace(multiline_strings=False)
+        self.assertEqual(self.scan(language, '"\n# a\n'),
+                         [common.Comment(' a', 2)])
+
+    def testStreaming(self):
+        language = common.Language(line_comments=('//', ),
+                                   block_comments=(common.BlockComment(
+                                       '<!--', '-->'), ),
+                                   quotes='"\'')
+        code = 'a <!- "//" <!-- b --> c // d\n\'e\' // f'
+        expected = [
+            common.Comment(' b ', 1, True),
+            common.Comment(' d', 1),
+            common.Comment(' f', 2),
+        ]
+        scan = common.Lexer(language).scan
+        for size in range(1, len(code) + 1):
+            chunks = [code[i:i + size] for i in range(0, len(code), size)]
+            self.assertEqual(list(common.iter_comments(chunks, scan)),
+                             expected)
+
+    def testLookahead(self):
+        self.assertEqual(common.Language(line_comments=('#', )).lookahead, 0)
+        language = common.Language(line_comments=('//', ),
+                                   block_comments=(common.BlockComment(
+                                       '<!--', '-->'), ))
+        self.assertEqual(language.lookahead, 3)
+
+    def testLinearTime(self):
+
+        def seconds(scan, code):
+            best = float('inf')
+            for _ in range(3):
+                start = time.perf_counter()
+                try:
+                    list(common.iter_comments((code, ), scan))
+                except common.UnterminatedCommentError:
+                    pass
+                best = min(best, time.perf_counter() - start)
+            return best
+
+        inputs = [
+            (c_parser.LANGUAGE, lambda n: 'x /* ' * (n // 5)),
+            (c_parser.LANGUAGE, lambda n: '/*' + '* /\n' * (n // 4) + '*/'),
+            (html_parser.LANGUAGE, lambda n: '<!-- a\n' * (n // 7)),
+            (html_parser.LANGUAGE, lambda n: '<!--' + '-- >\n' * (n // 5)),
+        ]
+        for language, generate in inputs:
+            for compiled in (False, True):
+                scan = common.Lexer(language, compiled).scan
+                small = seconds(scan, generate(1 << 16))
+                large = seconds(scan, generate(1 << 19))
+                # Eight times the code, a quadratic scan would take 64 times
+                # as long.
+                self.assertLess(large, 32 * small + 0.01)
+
+
+class LimitsTest(unittest.TestCase):
+
+    code = '// a\n' * 10 + '/* ' + 'b' * 100 + ' */\n'
+
+    def assertExceeds(self, limits, limit, count):
+        with self.assertRaises(common.LimitExceededError) as e:
+            limits.extract(c_parser.iter_comments, (self.code, ))
+        self.assertEqual(e.exception.limit, limit)
+        self.assertEqual(e.exception.comments,
+                         c_parser.extract_comments(self.code)[:count])
+
+    def testWithinLimits(self):
+        limits = common.Limits(max_size=len(self.code),
+                               max_comments=11,
+                               max_comment_length=102,
+                               timeout=60)
+        self.assertEqual(limits.extract(c_parser.iter_comments, (self.code, )),
+                         c_parser.extract_comments(self.code))
+
+    def testMaxSize(self):
+        self.assertExceeds(common.Limits(max_size=26), 'max_size', 5)
+
+    def testMaxComments(self):
+        self.assertExceeds(common.Limits(max_comments=3), 'max_comments', 3)
+
+    def testMaxCommentLength(self):
+        self.assertExceeds(common.Limits(max_comment_length=101),
+                           'max_comment_length', 10)
+
+    def testTimeout(self):
+        self.assertExceeds(common.Limits(timeout=0), 'timeout', 0)
+
+    def testOpenCommentLength(self):
+        limits = common.Limits(max_comment_length=100)
+        for opening in ('/* ', '// '):
+            with self.subTest(opening=opening):
+                rest = itertools.repeat('b' * 64, 1 << 16)
+                with self.assertRaises(common.LimitExceededError) as e:
+                    limits.extract(c_parser.iter_comments,
+                                   itertools.chain(['// a\n', opening], rest))
+                self.assertEqual(e.exception.limit, 'max_comment_length')
+                self.assertEqual(e.exception.comments,
+                                 [common.Comment(' a', 1)])
+                # The comment is not read to its end.
+                self.assertIsNotNone(next(rest, None))
+
+    def testCheck(self):
+        comments = c_parser.extract_comments(self.code)
+        common.Limits(max_comments=11).check(comments, len(self.code))
+        with self.assertRaises(common.LimitExceededError) as e:
+            common.Limits(max_size=10).check(comments, len(self.code))
+        self.assertEqual(e.exception.limit, 'max_size')
+
+
+class FilterTest(unittest.TestCase):
+
+    code = '// TODO one\n/* two\n */ // three\n/* TODO four */\n// five\n'
+
+    def assertSelects(self, comment_filter, texts):
+        for comments in (c_parser.extract_comments(self.code, comment_filter),
+                         list(
+                             c_parser.iter_comments(list(self.code),
+                                                    comment_filter)),
+                         c_parser.extract_comments_from_bytes(
+                             self.code.encode(), comment_filter),
+                         c_parser.extract_comment_table(
+                             self.code, comment_filter),
+                         c_parser.extract_comment_table(
+                             self.code.encode(), comment_filter)):
+            self.assertEqual([comment.text() for comment in comments], texts)
+
+    def testKinds(self):
+        self.assertSelects(common.Filter(kinds=frozenset([common.MULTILINE])),
+                           [' two\n ', ' TODO four '])
+
+    def testPattern(self):
+        self.assertSelects(common.Filter(pattern=re.compile('^ TODO')),
+                           [' TODO one', ' TODO four '])
+
+    def testLines(self):
+        self.assertSelects(common.Filter(first_line=3, last_line=4),
+                           [' three', ' TODO four '])
+
+    def testMaxCount(self):
+        self.assertSelects(common.Filter(max_count=2),
+                           [' TODO one', ' two\n '])
+        self.assertSelects(common.Filter(max_count=0), [])
+
+    def testMaxOffset(self):
+        self.assertSelects(common.Filter(max_offset=13),
+                           [' TODO one', ' two\n '])
+
+    def testLeading(self):
+        self.assertSelects(
+            common.Filter(leading=True),
+            [' TODO one', ' two\n ', ' three', ' TODO four ', ' five'])
+        code = '\ufeff // a\n\n/* b */ c; // d\n'
+        self.assertEqual(
+            c_parser.extract_comments(code, common.Filter(leading=True)),
+            c_parser.extract_comments(code)[:2])
+
+    def testStopsScanning(self):
+        code = '// a\n' + 'b;\n' * (common._PIECE_SIZE // 2) + '/* c'
+        for comment_filter in (common.Filter(max_count=1),
+                               common.Filter(last_line=1),
+                               common.Filter(max_offset=5),
+                               common.Filter(leading=True)):
+            self.assertEqual(c_parser.extract_comments(code, comment_filter),
+                             [common.Comment(' a', 1)])
+        self.assertEqual(
+            c_parser.extract_comments_from_bytes(code.encode(),
+                                                 common.Filter(max_count=1)),
+            [common.Comment(' a', 1)])
+        self.assertRaises(common.UnterminatedCommentError,
+                          c_parser.extract_comments, code,
+                          common.Filter(pattern=re.compile('a')))
+
+    def testApply(self):
+        comment_filter = common.Filter(kinds=frozenset([common.LINE]),
+                                       last_line=3,
+                                       max_count=2)
+        self.assertEqual(
+            comment_filter.apply(c_parser.extract_comments(self.code),
+                                 self.code),
+            c_parser.extract_comments(self.code, comment_filter))
+
+
+class CommentTest(unittest.TestCase):
+
+    def testPositions(self):
+        comment = common.Comment('text', 2, False, start=10, end=16, column=3)
+        self.assertEqual(comment.start(), 10)
+        self.assertEqual(comment.end(), 16)
+        self.assertEqual(comment.column(), 3)
+
+    def testPositionsUnknown(self):
+        comment = common.Comment('text', 2)
+        self.assertIsNone(comment.start())
+        self.assertIsNone(comment.end())
+        self.assertIsNone(comment.column())
+
+    def testPartialAndLargePositions(self):
+        comment = common.Comment('text', 2, True, 5, None, 3)
+        self.assertEqual((comment.start(), comment.end(), comment.column()),
+                         (5, None, 3))
+        self.assertTrue(comment.is_multiline())
+        comment = common.Comment('text', 2, False, 1 << 50, (1 << 50) + 9)
+        self.assertEqual((comment.start(), comment.end(), comment.column()),
+                         (1 << 50, (1 << 50) + 9, None))
+        self.assertFalse(comment.is_multiline())
+
+    def testEqualityIgnoresPositions(self):
+        self.assertEqual(common.Comment('text', 2, True, 10, 18, 3),
+                         common.Comment('text', 2, True))
+        self.assertNotEqual(common.Comment('text', 2, True),
+                            common.Comment('text', 2, False))
+
+    def testNoInstanceDict(self):
+        self.assertFalse(hasattr(common.Comment('text', 1), '__dict__'))
+
+
+class ParsersTest(unittest.TestCase):
+
+    def testIterCommentsInChunks(self):
+        for parser, code in SAMPLES.items():
+            expected = parser.extract_comments(code)
+            for size in (1, 2, 5):
+                with self.subTest(parser=parser.__name__, size=size):
+                    chunks = [
+                        code[i:i + size] for i in range(0, len(code), size)
+                    ]
+                    self.assertEqual(list(parser.iter_comments(chunks)),
+                                     expected)
+
+    def testExtractCommentsFromBytes(self):
+        for parser, code in SAMPLES.items():
+            expected = parser.extract_comments(code)
+            encoded = code.replace('\n', '\r\n').encode()
+            for buffer in (encoded, memoryview(encoded)):
+                with self.subTest(parser=parser.__name__, buffer=type(buffer)):
+                    self.assertEqual(
+                        parser.extract_comments_from_bytes(buffer), expected)
@@ -60,3 +60,17 @@ class GoParserTest(unittest.TestCase):
         code = 'a := 1 /* Unterminated\\n comment'
         self.assertRaises(common.UnterminatedCommentError,
                           go_parser.extract_comments, code)
+
+    def testEscapedQuoteInRuneLiteral(self):
+        code = "r := '\\'' // comment"
+        comments = go_parser.extract_comments(code)
+        self.assertEqual(comments, [common.Comment(' comment', 1)])
+
+    def testCommentsOnSeveralLines(self):
+        code = 's := `raw\n// not a comment`\n/* one\ntwo */ // three'
+        comments = go_parser.extract_comments(code)
+        expected = [
+            common.Comment(' one\ntwo ', 3, multiline=True),
+            common.Comment(' three', 4),
+        ]
+        self.assertEqual(comments, expected)
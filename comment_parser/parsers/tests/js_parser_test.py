@@ -50,3 +50,22 @@ class JsParserTest(unittest.TestCase):
         code = 'a = 1 /* Unterminated\\n comment'
         self.assertRaises(common.UnterminatedCommentError,
                           js_parser.extract_comments, code)
+
+    def testEscapedQuoteInStringLiteral(self):
+        code = 'msg = "\\" // not a comment"; // comment'
+        comments = js_parser.extract_comments(code)
+        self.assertEqual(comments, [common.Comment(' comment', 1)])
+
+    def testUnterminatedStringLiteral(self):
+        code = 'msg = "unterminated\n// not a comment'
+        comments = js_parser.extract_comments(code)
+        self.assertEqual(comments, [])
+
+    def testCommentsOnSeveralLines(self):
+        code = 'a = b / c;\n/* one\ntwo */\nd = 1; // three'
+        comments = js_parser.extract_comments(code)
+        expected = [
+            common.Comment(' one\ntwo ', 2, multiline=True),
+            common.Comment(' three', 4),
+        ]
+        self.assertEqual(comments, expected)
@@ -0,0 +1,104 @@
+#!/usr/bin/python
+"""Tests that the compiled _lexer scans as common.Lexer's pattern does."""
+
+import random
+import unittest
+from comment_parser import comment_parser
+from comment_parser.parsers import common
+from comment_parser.parsers import table
+
+LANGUAGES = [
+    language for language in (getattr(parser, 'LANGUAGE', None)
+                              for parser in comment_parser.MIME_MAP.values())
+    if language is not None
+] + [
+    common.Language(line_comments=('--', ),
+                    block_comments=(common.BlockComment('{-', '-}', True), ),
+                    quotes='"'),
+    common.Language(line_comments=('%', '--'),
+                    block_comments=(common.BlockComment('--[[', ']]'), ),
+                    quotes='\'"',
+                    code_escapes=True,
+                    single_line_blocks=True,
+                    swallow_quotes=True),
+]
+
+
+def _comments(comments):
+    return [(c.text(), c.line_number(), c.is_multiline(), c.start(), c.end(),
+             c.column()) for c in comments]
+
+
+def _extract(lexer, chunks):
+    try:
+        return _comments(common.iter_comments(chunks, lexer.scan))
+    except common.UnterminatedCommentError:
+        return 'unterminated'
+
+
+def _scan(lexer, code, position, final):
+    tokens = []
+    scanner = lexer.scan(code, position, final)
+    while True:
+        try:
+            tokens.append(next(scanner))
+        except StopIteration as stop:
+            return tokens, stop.value
+
+
+def _extract_from_bytes(lexer, code):
+    try:
+        return _comments(table.extract_comments_from_bytes(code, lexer.scan))
+    except common.UnterminatedCommentError:
+        return 'unterminated'
+
+
+@unittest.skipIf(common._lexer is None, 'the _lexer module is not built')
+class LexerParityTest(unittest.TestCase):
+
+    def assertParity(self, language, code, chunks):
+        compiled = common.Lexer(language)
+        pattern = common.Lexer(language, compiled=False)
+        self.assertTrue(compiled.compiled)
+        self.assertFalse(pattern.compiled)
+        self.assertEqual(_extract(compiled, [code]), _extract(pattern, [code]),
+                         code)
+        self.assertEqual(_extract(compiled, chunks), _extract(pattern, chunks),
+                         chunks)
+        self.assertEqual(_extract_from_bytes(compiled, code.encode()),
+                         _extract_from_bytes(pattern, code.encode()), code)
+
+    def testRandomCode(self):
+        rnd = random.Random(0)
+        for language in LANGUAGES:
+            delimiters = list(language.line_comments)
+            for block in language.block_comments:
+                delimiters.extend((block.start, block.end))
+            alphabet = delimiters + list(
+                language.quotes) + ['\\', '\n', 'a', ' ', 'é', '€', '😀']
+            for _ in range(300):
+                code = ''.join(
+                    rnd.choice(alphabet) for _ in range(rnd.randint(0, 30)))
+                cuts = sorted(rnd.randint(0, len(code)) for _ in range(3))
+                chunks = [
+                    code[start:end]
+                    for start, end in zip([0] + cuts, cuts + [len(code)])
+                ]
+                with self.subTest(language=language, code=code):
+                    self.assertParity(language, code, chunks)
+
+    def testScanFromPosition(self):
+        for language in LANGUAGES:
+            compiled = common.Lexer(language)
+            pattern = common.Lexer(language, compiled=False)
+            code = 'a "b" // c\n/* d */ # e\n<!-- f --> -- g\n{- h -}\n'
+            for position in range(len(code) + 1):
+                for final in (False, True):
+                    with self.subTest(language=language, position=position):
+                        self.assertEqual(
+                            _scan(compiled, code, position, final),
+                            _scan(pattern, code, position, final))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 #!/usr/bin/python
 """Tests for comment_parser.parsers.python_parser.py"""
 
+import random
+import re
 import unittest
 from comment_parser.parsers import common
 from comment_parser.parsers import python_parser
@@ -33,3 +35,123 @@ class PythonParserTest(unittest.TestCase):
         code = '"this is \'# not a comment\'"'
         comments = python_parser.extract_comments(code)
         self.assertEqual(comments, [])
+
+    def testFilter(self):
+        code = '# TODO one\nx = 1  # two\n# TODO three\ns = """\n'
+        comment_filter = common.Filter(pattern=re.compile('TODO'), max_count=2)
+        self.assertEqual(
+            python_parser.extract_comments(code, comment_filter),
+            [common.Comment(' TODO one', 1),
+             common.Comment(' TODO three', 3)])
+        comment_filter = common.Filter(first_line=2, last_line=2)
+        self.assertEqual(
+            python_parser.extract_comments_from_bytes(code.encode(),
+                                                      comment_filter),
+            [common.Comment(' two', 2)])
+
+    def testLeading(self):
+        code = '#!/usr/bin/env python\n# License\n\nimport os  # a\n# b\n'
+        comment_filter = common.Filter(leading=True)
+        expected = [
+            common.Comment('!/usr/bin/env python', 1),
+            common.Comment(' License', 2)
+        ]
+        self.assertEqual(python_parser.extract_comments(code, comment_filter),
+                         expected)
+        self.assertEqual(
+            python_parser.extract_comments_from_bytes(code.encode(),
+                                                      comment_filter),
+            expected)
+
+    def testCommentPositions(self):
+        code = 'a = 1  # one\n\n    # two'
+        comments = python_parser.extract_comments(code)
+        self.assertEqual([(c.start(), c.end(), c.column()) for c in comments],
+                         [(7, 12, 7), (18, 23, 4)])
+
+    def testStringPrefixes(self):
+        code = 'a = rb"\\"# no"  # one\nb = u\'\'\'# no\n\'\'\'  # two\nr#three'
+        comments = python_parser.extract_comments(code)
+        self.assertEqual([(c.text(), c.line_number()) for c in comments],
+                         [(' one', 1), (' two', 3), ('three', 4)])
+
+    def testFStrings(self):
+        code = ('a = f"{x!r:>{width}} {{#}} \\N{DASH} # no"  # one\n'
+                'b = f"{", ".join([  # two\n'
+                '    f\'{y}\',  # three\n'
+                '])}"  # four\n'
+                'c = rf"\\N{z}"  # five\n')
+        comments = python_parser.extract_comments(code)
+        self.assertEqual([(c.text(), c.line_number()) for c in comments],
+                         [(' one', 1), (' two', 2), (' three', 3),
+                          (' four', 4), (' five', 5)])
+
+    def testMalformedCode(self):
+        code = ('a = "unterminated # no\n'
+                'b = (  # one\n'
+                'c = """runs to the end # no\n'
+                '# no\n')
+        comments = python_parser.extract_comments(code)
+        self.assertEqual(comments, [common.Comment(' one', 2)])
+
+    def testDocstrings(self):
+        code = ('"""Module."""\n'
+                '@decorator\n'
+                'class A(B, metaclass=C):  # one\n'
+                '    r\'\'\'Class.\n\n    More.\'\'\'\n'
+                '    async def f(self, a=":",  # two\n'
+                '                b=(1, 2)) -> None:\n'
+                '        # three\n'
+                '        "Function."\n'
+                '    def g(self): return "not a docstring"\n'
+                '    def h(self):\n'
+                '        b"not a docstring"\n'
+                'x = 1\n'
+                '"not a docstring"\n')
+        comment_filter = common.Filter(docstrings=True)
+        expected = [
+            common.Comment('Module.', 1, multiline=True),
+            common.Comment(' one', 3),
+            common.Comment('Class.\n\n    More.', 4, multiline=True),
+            common.Comment(' two', 7),
+            common.Comment(' three', 9),
+            common.Comment('Function.', 10, multiline=True),
+        ]
+        self.assertEqual(python_parser.extract_comments(code, comment_filter),
+                         expected)
+        self.assertEqual(
+            python_parser.extract_comments_from_bytes(code.encode(),
+                                                      comment_filter),
+            expected)
+        for size in (1, 3, 7):
+            chunks = [code[i:i + size] for i in range(0, len(code), size)]
+            self.assertEqual(
+                list(python_parser.iter_comments(chunks, comment_filter)),
+                expected)
+        self.assertEqual(len(python_parser.extract_comments(code)), 3)
+
+    def testEncodingDeclaration(self):
+        code = '# -*- coding: latin-1 -*-\nx = 1  # café\n'
+        comments = python_parser.extract_comments_from_bytes(
+            code.encode('latin-1'))
+        self.assertEqual([c.text() for c in comments],
+                         [' -*- coding: latin-1 -*-', ' café'])
+        self.assertEqual(comments[1].column(), 7)
+
+    def testBytesParity(self):
+        rnd = random.Random(0)
+        alphabet = [
+            'f"', "f'", '"', "'", '"""', "'''", 'rb', '{', '}', '(', ')', ':',
+            '#', '\\', '\n', 'N{', 'def ', 'class ', 'a', ' ', 'é', '😀'
+        ]
+        codes = ['f"{""\\éf"{#', '😀f"{#', 'a(\\😀f"{#'] + [
+            ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 15)))
+            for _ in range(1000)
+        ]
+        for code in codes:
+            for comment_filter in (None, common.Filter(docstrings=True)):
+                with self.subTest(code=code, filter=comment_filter):
+                    self.assertEqual(
+                        python_parser.extract_comments_from_bytes(
+                            code.encode(), comment_filter),
+                        python_parser.extract_comments(code, comment_filter))
@@ -0,0 +1,69 @@
+#!/usr/bin/python
+"""Tests for comment_parser.parsers.table.py"""
+
+import unittest
+from comment_parser.parsers import c_parser
+from comment_parser.parsers import common
+from comment_parser.parsers import table
+
+
+class ExtractCommentsFromBytesTest(unittest.TestCase):
+
+    def testBytePositions(self):
+        code = 'é = 1;\r\n/* ü\r\n */ // ö\r\n'.encode()
+        comments = table.extract_comments_from_bytes(code, c_parser.scan)
+        self.assertEqual(comments, [
+            common.Comment(' ü\n ', 2, True),
+            common.Comment(' ö', 3),
+        ])
+        self.assertEqual([(c.start(), c.end(), c.column()) for c in comments],
+                         [(9, 19, 0), (20, 25, 4)])
+
+
+class CommentTableTest(unittest.TestCase):
+
+    code = 'é = 1;\r\n/* ü\r\n */ // ö\r\nf(); // four\n'
+
+    def testMatchesComments(self):
+        for code, comments in (
+            (self.code, c_parser.extract_comments(self.code)),
+            (self.code.encode(),
+             c_parser.extract_comments_from_bytes(self.code.encode())),
+        ):
+            comment_table = table.extract_comment_table(code, c_parser.scan)
+            self.assertEqual(len(comment_table), 3)
+            self.assertEqual(list(comment_table), comments)
+            self.assertEqual([(c.start(), c.end(), c.column())
+                              for c in comment_table],
+                             [(c.start(), c.end(), c.column())
+                              for c in comments])
+            self.assertEqual(comment_table.text(1), comments[1].text())
+
+    def testColumns(self):
+        comment_table = table.extract_comment_table(self.code.encode(),
+                                                    c_parser.scan)
+        self.assertEqual(list(comment_table.starts), [9, 20, 32])
+        self.assertEqual(list(comment_table.line_numbers), [2, 3, 4])
+        self.assertEqual(list(comment_table.multiline), [1, 0, 0])
+        self.assertEqual(comment_table.starts.itemsize, 4)
+
+    def testSlicing(self):
+        comment_table = table.extract_comment_table(self.code, c_parser.scan)
+        self.assertIsInstance(comment_table[1:], table.CommentTable)
+        self.assertIs(comment_table[1:].code, comment_table.code)
+        self.assertEqual(list(comment_table[1:]), list(comment_table)[1:])
+        self.assertEqual(list(comment_table[::-2]), list(comment_table)[::-2])
+        self.assertEqual(comment_table[-1], common.Comment(' four', 4))
+        self.assertRaises(IndexError, comment_table.__getitem__, 3)
+
+    def testKeepsCode(self):
+        code = bytearray(b'// one\n')
+        comment_table = table.extract_comment_table(code, c_parser.scan)
+        self.assertIs(comment_table.code, code)
+        # The scan released its view of the code.
+        code.extend(b'// two\n')
+        self.assertEqual(comment_table[0].text(), ' one')
+
+
+if __name__ == '__main__':
+    unittest.main()
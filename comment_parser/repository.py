@@ -0,0 +1,332 @@
+#!/usr/bin/python
+"""This module incrementally extracts the comments of a git working tree.
+
+A manifest records the comments of every file tracked in the tree along with
+the id of the blob they were extracted from. Blob ids are read from the git
+index, so rescanning a tree only reads the files added or modified since the
+manifest was written, from disk, and drops those deleted:
+
+  python -m comment_parser.repository --manifest comments.json -j 8 tree
+
+Only files whose content may differ from the index, as listed by
+git diff-files, are hashed. Files are parsed as by extract_comments_many, and
+the manifest is written as JSON:
+
+  {"version": 1, "library": ..., "files": {path: {"blob": ..., "comments":
+   [[text, line, multiline, start, end, column], ...]}}}
+
+Files which could not be parsed, such as those of unsupported MIME types,
+hold the name of the error instead of comments, and are not read again until
+they change. Errors which depend on the environment rather than the file,
+such as ImportError when python-magic is not installed, are recorded against
+the blob id suffixed with the environment, so those files are read again once
+it changes. Errors which may not recur, such as OSError, are recorded without
+a blob id, so those files are read again by the next scan.
+Manifests written by another version of this library or of its parsers, see
+cache.results_version, are rescanned in full.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from comment_parser import comment_parser
+from comment_parser import mime
+from comment_parser.cache import ResultCache, results_version
+from comment_parser.parsers import common
+
+_VERSION = 1
+
+# Modes of the index entries of regular files, rather than symbolic links and
+# submodules.
+_FILE_MODES = frozenset(['100644', '100755'])
+
+# Errors which parsing the same content raises again, so that files raising
+# them are not read again until they change.
+_DETERMINISTIC_ERRORS = (comment_parser.UnsupportedError,
+                         comment_parser.ParseError, UnicodeDecodeError)
+
+# Errors which parsing any content raises again in the same environment, see
+# _environment_key.
+_ENVIRONMENT_ERRORS = (ImportError, )
+
+
+class GitError(comment_parser.Error):
+    """Raised when git fails, such as outside of a working tree."""
+
+
+class Entry(NamedTuple):
+    """The comments extracted from a file of the tree.
+
+  Attributes:
+    blob: String id of the git blob the comments were extracted from, see
+      _environment_key for errors depending on the environment, or None if
+      the error parsing the file may not recur, so that it is parsed again.
+    comments: Python list of parsers.common.Comment, or None if the file
+      could not be parsed.
+    error: Optional string name of the exception raised parsing the file.
+  """
+    blob: Optional[str]
+    comments: Optional[List[common.Comment]]
+    error: Optional[str] = None
+
+
+class Changes(NamedTuple):
+    """The files of the tree which changed since the previous manifest.
+
+  Attributes:
+    added: Python list of the string paths of files added.
+    modified: Python list of the string paths of files modified.
+    deleted: Python list of the string paths of files deleted.
+    unchanged: Number (int) of files left as they were.
+  """
+    added: List[str]
+    modified: List[str]
+    deleted: List[str]
+    unchanged: int
+
+
+def _git(tree: str, *args: str, stdin: Optional[bytes] = None) -> bytes:
+    """Runs a git command in tree, returning its output."""
+    try:
+        process = subprocess.run(['git', '-C', tree, *args],
+                                 input=stdin,
+                                 capture_output=True,
+                                 check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        message = getattr(e, 'stderr', None) or b''
+        raise GitError(
+            f'git {args[0]} failed in {tree}: '
+            f'{message.decode(errors="replace").strip() or e}') from e
+    return process.stdout
+
+
+def _split(output: bytes) -> List[str]:
+    """Returns the paths in the NUL separated output of git."""
+    return [os.fsdecode(path) for path in output.split(b'\0') if path]
+
+
+def blobs(tree: str) -> Dict[str, str]:
+    """Returns the ids of the blobs of the files tracked in a working tree.
+
+  Ids are read from the git index, except for the files whose content may
+  differ from it, which are hashed as git add would. Files deleted from the
+  working tree but not from the index are left out, as are symbolic links,
+  submodules and unmerged files.
+
+  Args:
+    tree: String name of the working tree, or of a directory in it, which
+      paths are then relative to.
+  Returns:
+    Python dict of blob id (str) by path (str) relative to tree.
+  Raises:
+    GitError: git failed, such as tree not being in a working tree.
+  """
+    ids = {}
+    for entry in _split(_git(tree, 'ls-files', '--stage', '-z')):
+        info, path = entry.split('\t', 1)
+        mode, blob, stage = info.split(' ')
+        if mode in _FILE_MODES and stage == '0':
+            ids[path] = blob
+    dirty = [
+        path for path in _split(
+            _git(tree, 'diff-files', '--name-only', '--relative', '-z'))
+        if path in ids
+    ]
+    for path in dirty:
+        del ids[path]
+    dirty = [
+        path for path in dirty if os.path.isfile(os.path.join(tree, path))
+    ]
+    if dirty:
+        # hash-object resolves relative paths from the top of the tree.
+        paths = ''.join(
+            os.path.abspath(os.path.join(tree, path)) + '\n' for path in dirty)
+        hashes = _git(tree,
+                      'hash-object',
+                      '--stdin-paths',
+                      stdin=os.fsencode(paths))
+        ids.update(zip(dirty, hashes.decode().split()))
+    return ids
+
+
+def scan(
+        tree: str,
+        previous: Optional[Dict[str, Entry]] = None,
+        workers: Optional[int] = 1,
+        cache: Optional[ResultCache] = None
+) -> Tuple[Dict[str, Entry], Changes]:
+    """Extracts the comments of the files tracked in a working tree.
+
+  Files whose blob id is unchanged since the previous scan keep their entry
+  without being read.
+
+  Args:
+    tree: String name of the working tree, or of a directory in it.
+    previous: Optional Python dict of Entry by path, as returned by an
+      earlier scan or load_manifest.
+    workers: Optional number of processes (int) to parse files in, see
+      extract_comments_many. Defaults to parsing in the calling process.
+    cache: Optional cache.ResultCache to look results up in and store them in.
+  Returns:
+    Tuple of a Python dict of Entry by path (str) relative to tree, in path
+      order, and the Changes since previous.
+  Raises:
+    GitError: git failed, such as tree not being in a working tree.
+  """
+    if previous is None:
+        previous = {}
+    ids = blobs(tree)
+    entries = {}
+    changed = []
+    for path, blob in ids.items():
+        entry = previous.get(path)
+        if entry is not None and entry.blob in (blob, _environment_key(blob)):
+            entries[path] = entry
+        else:
+            changed.append(path)
+    filenames = {os.path.join(tree, path): path for path in changed}
+    for filename, result in comment_parser.extract_comments_many(
+            filenames, workers=workers, cache=cache):
+        path = filenames[filename]
+        if isinstance(result, _ENVIRONMENT_ERRORS):
+            entries[path] = Entry(_environment_key(ids[path]), None,
+                                  type(result).__name__)
+        elif isinstance(result, _DETERMINISTIC_ERRORS):
+            entries[path] = Entry(ids[path], None, type(result).__name__)
+        elif isinstance(result, Exception):
+            entries[path] = Entry(None, None, type(result).__name__)
+        else:
+            entries[path] = Entry(ids[path], result)
+    changes = Changes(added=[path for path in changed if path not in previous],
+                      modified=[path for path in changed if path in previous],
+                      deleted=sorted(path for path in previous
+                                     if path not in ids),
+                      unchanged=len(ids) - len(changed))
+    return dict(sorted(entries.items())), changes
+
+
+def _environment_key(blob: str) -> str:
+    """Returns the key of a blob whose parse failed for lack of python-magic,
+  or would have if python-magic were not installed."""
+    return f'{blob}+{"magic" if mime.HAS_MAGIC else "no-magic"}'
+
+
+def load_manifest(filename: str) -> Dict[str, Entry]:
+    """Loads a manifest written by save_manifest.
+
+  Args:
+    filename: String name of the manifest file.
+  Returns:
+    Python dict of Entry by path, empty if the file does not exist or was
+      written by another version of this library or of its parsers.
+  """
+    try:
+        with open(filename, encoding='utf-8') as source:
+            manifest = json.load(source)
+    except FileNotFoundError:
+        return {}
+    if (manifest.get('version') != _VERSION
+            or manifest.get('library') != results_version()):
+        return {}
+    entries = {}
+    for path, entry in manifest['files'].items():
+        comments = entry.get('comments')
+        if comments is not None:
+            comments = [common.Comment(*fields) for fields in comments]
+        entries[path] = Entry(entry['blob'], comments, entry.get('error'))
+    return entries
+
+
+def save_manifest(filename: str, entries: Dict[str, Entry]) -> None:
+    """Writes a manifest, replacing any previous one atomically.
+
+  Args:
+    filename: String name of the manifest file.
+    entries: Python dict of Entry by path, as returned by scan.
+  """
+    files = {}
+    for path, entry in entries.items():
+        if entry.comments is None:
+            files[path] = {'blob': entry.blob, 'error': entry.error}
+        else:
+            files[path] = {
+                'blob':
+                entry.blob,
+                'comments': [(comment.text(), comment.line_number(),
+                              comment.is_multiline(), comment.start(),
+                              comment.end(), comment.column())
+                             for comment in entry.comments],
+            }
+    temporary = f'{filename}.{os.getpid()}.tmp'
+    try:
+        with open(temporary, 'w', encoding='utf-8') as output:
+            json.dump(
+                {
+                    'version': _VERSION,
+                    'library': results_version(),
+                    'files': files
+                },
+                output,
+                separators=(',', ':'))
+        os.replace(temporary, filename)
+    finally:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+
+
+def update_manifest(tree: str,
+                    filename: str,
+                    workers: Optional[int] = 1,
+                    cache: Optional[ResultCache] = None) -> Changes:
+    """Rescans a working tree, updating the manifest of its comments.
+
+  Args:
+    tree: String name of the working tree, or of a directory in it.
+    filename: String name of the manifest file, created if it does not exist.
+    workers: Optional number of processes (int) to parse files in, see scan.
+    cache: Optional cache.ResultCache to look results up in and store them in.
+  Returns:
+    The Changes since the previous manifest.
+  Raises:
+    GitError: git failed, such as tree not being in a working tree.
+  """
+    entries, changes = scan(tree, load_manifest(filename), workers, cache)
+    save_manifest(filename, entries)
+    return changes
+
+
+def main(argv: List[str]) -> None:
+    """Updates the manifest of a working tree's comments."""
+    parser = argparse.ArgumentParser(
+        description='Incrementally extracts the comments of a git working '
+        'tree into a manifest.')
+    parser.add_argument('tree', help='git working tree, or directory in one')
+    parser.add_argument('--manifest',
+                        required=True,
+                        help='JSON manifest to read and update')
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=1,
+                        help='number of processes to parse files in')
+    parser.add_argument('--cache-dir', help='directory to cache results in')
+    args = parser.parse_args(argv)
+    cache = ResultCache(args.cache_dir) if args.cache_dir else None
+    try:
+        changes = update_manifest(args.tree, args.manifest, args.jobs, cache)
+    except GitError as e:
+        sys.exit(str(e))
+    finally:
+        if cache is not None:
+            cache.close()
+    sys.stderr.write(f'{len(changes.added)} added, {len(changes.modified)} '
+                     f'modified, {len(changes.deleted)} deleted, '
+                     f'{changes.unchanged} unchanged\n')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,252 @@
+#!/usr/bin/python
+"""This module serves comment extraction over a local Unix socket.
+
+Tools parsing a file or two per invocation, such as pre-commit hooks and
+editor integrations, spend most of their time starting the interpreter,
+importing the parsers and loading libmagic's database. A server does that
+once and then answers requests, sent by comment_parser.client in its wire
+format, until shut down:
+
+  python -m comment_parser.server [--socket PATH] [--cache-dir DIR]
+
+Requests, and the responses to them, are:
+  {"op": "extract", "path": ..., "mime": ..., "filter": {...}}
+  {"op": "extract", "code": ..., "mime": ..., "filter": {...}}
+    Extracts the comments from the file at an absolute path, or from code.
+    The MIME type may be null, to be deduced, and the filter holds keyword
+    arguments of comment_parser.extract_comments selecting comments. Answered
+    with {"comments": [[line, multiline, start, end, column, text], ...]}, or
+    {"error": [exception name, message]}.
+  {"op": "main", "argv": [...], "cwd": ...}
+    Runs comment_parser.main in the working directory cwd. Answered with
+    {"stdout": ..., "stderr": ..., "status": exit status}.
+  {"op": "ping"}
+    Answered with {"pid": the server's process ID}.
+  {"op": "shutdown"}
+    Answered with {}, after which the server stops.
+
+Each connection carries a single request, received on a thread of its own so
+that a slow or idle client does not hold up the others, and is disconnected
+if it takes longer than REQUEST_TIMEOUT seconds to send its request. The
+requests received are then handled one at a time.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import socket
+import socketserver
+import stat
+import sys
+import threading
+from typing import Any, Dict, List, Optional
+
+from comment_parser import client
+from comment_parser import comment_parser
+from comment_parser.cache import ResultCache
+from comment_parser.parsers import common
+
+# Keyword arguments of comment_parser.extract_comments requests may filter
+# comments with.
+_FILTERS = frozenset([
+    'kinds', 'pattern', 'lines', 'max_count', 'max_offset', 'leading',
+    'docstrings'
+])
+
+# Seconds a client may take to send its request, or to read the response.
+REQUEST_TIMEOUT = 10.0
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Answers the request sent over a connection."""
+
+    server: 'Server'
+
+    def handle(self) -> None:
+        self.request.settimeout(REQUEST_TIMEOUT)
+        try:
+            message = client.receive(self.request)
+            if message is None:
+                return
+            client.send(self.request, self.server.respond(message))
+        except (OSError, ValueError):
+            # The client went away, stalled or sent a malformed request.
+            return
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Extracts comments for clients connecting to a Unix socket.
+
+  The socket is only accessible to the user running the server.
+  """
+
+    daemon_threads = True
+
+    def __init__(self, path: str, cache: Optional[ResultCache] = None):
+        """Initializes Server, listening on a socket at path.
+
+    Args:
+      path: String path of the socket.
+      cache: Optional cache.ResultCache to look results of extract requests
+        up in and store them in.
+    Raises:
+      OSError: A server is already listening at path, or the socket could
+        not be created.
+    """
+        _remove_stale_socket(path)
+        self.cache = cache
+        # Held while handling a request, as main changes the working
+        # directory and redirects sys.stdout.
+        self._lock = threading.Lock()
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, _Handler)
+        finally:
+            os.umask(umask)
+        _warm_up()
+
+    def server_close(self) -> None:
+        super().server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.server_address)
+
+    def respond(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Returns the response to a request, see the module's docstring."""
+        if not isinstance(message, dict):
+            return {'error': ['ValueError', 'Requests must be JSON objects']}
+        with self._lock:
+            try:
+                return self._respond(message)
+            except KeyError as e:
+                return {'error': ['ValueError', f'Missing request field {e}']}
+
+    def _respond(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        op = message.get('op')
+        if op == 'extract':
+            return self._extract(message)
+        if op == 'main':
+            return _run_main(message['argv'], message['cwd'])
+        if op == 'ping':
+            return {'pid': os.getpid()}
+        if op == 'shutdown':
+            # shutdown waits for the request being handled to finish.
+            threading.Thread(target=self.shutdown).start()
+            return {}
+        return {'error': ['ValueError', f'Unknown op {op!r}']}
+
+    def _extract(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        filters = dict(message.get('filter') or {})
+        unknown = sorted(set(filters) - _FILTERS)
+        if unknown:
+            return {'error': ['ValueError', f'Unknown filters {unknown}']}
+        if filters.get('lines') is not None:
+            filters['lines'] = tuple(filters['lines'])
+        try:
+            if message.get('path') is not None:
+                comments = comment_parser.extract_comments(message['path'],
+                                                           message.get('mime'),
+                                                           cache=self.cache,
+                                                           **filters)
+            else:
+                comments = comment_parser.extract_comments_from_str(
+                    message['code'],
+                    message.get('mime'),
+                    cache=self.cache,
+                    **filters)
+        except (comment_parser.Error, common.Error, OSError, TypeError,
+                ValueError) as e:
+            return {'error': [type(e).__name__, str(e)]}
+        return {
+            'comments': [[
+                comment.line_number(),
+                int(comment.is_multiline()),
+                comment.start(),
+                comment.end(),
+                comment.column(),
+                comment.text(),
+            ] for comment in comments]
+        }
+
+
+def _remove_stale_socket(path: str) -> None:
+    """Removes the socket at path unless a server is listening on it.
+
+  Raises:
+    OSError: A server is listening at path, or path is not a socket.
+  """
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(f'{path} exists and is not a socket')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return
+    raise OSError(f'A server is already listening at {path}')
+
+
+def _warm_up() -> None:
+    """Imports the parsers and loads libmagic's database, if available.
+
+  Both are otherwise loaded by the first request needing them.
+  """
+    list(comment_parser.MIME_MAP.values())
+    if comment_parser.HAS_MAGIC:
+        comment_parser.mime_from_magic('', None)
+
+
+def _run_main(argv: List[str], cwd: str) -> Dict[str, Any]:
+    """Runs comment_parser.main in cwd, capturing its output."""
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    status = 0
+    previous = os.getcwd()
+    try:
+        os.chdir(cwd)
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(
+                stderr):
+            comment_parser.main(argv)
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else 1
+    except (comment_parser.Error, common.Error, OSError, ValueError) as e:
+        stderr.write(f'{type(e).__name__}: {e}\n')
+        status = 1
+    finally:
+        os.chdir(previous)
+    return {
+        'stdout': stdout.getvalue(),
+        'stderr': stderr.getvalue(),
+        'status': status
+    }
+
+
+def main(argv: List[str]) -> None:
+    """Serves comment extraction until shut down or interrupted."""
+    parser = argparse.ArgumentParser(
+        description='Serves comment extraction over a Unix socket.')
+    parser.add_argument('--socket',
+                        help='path of the socket to listen on, '
+                        f'${client.SOCKET_ENV} or a per-user default if not '
+                        'given')
+    parser.add_argument('--cache-dir',
+                        help='directory to cache results of extract requests '
+                        'in')
+    args = parser.parse_args(argv)
+    cache = ResultCache(args.cache_dir) if args.cache_dir else None
+    try:
+        with Server(args.socket or client.socket_path(), cache) as server:
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
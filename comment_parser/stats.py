@@ -0,0 +1,129 @@
+#!/usr/bin/python
+"""This module provides timing instrumentation for comment extraction.
+
+A Stats passed to comment_parser's extraction functions is handed a Call per
+extraction, holding the wall time of each phase (reading the file, deducing
+its MIME type and parsing it), the size of the code, the number of comments
+found and the parser used. Stats keeps the calls and aggregates them into
+per-phase histograms and a printable summary. Subclasses may override record
+to observe calls as they happen.
+
+Without a Stats, extraction functions skip all timing.
+"""
+
+import collections
+import math
+from typing import Dict, List, NamedTuple, Optional
+
+# Phases of an extraction, as named in Call.
+PHASES = ('read', 'detect', 'parse')
+
+
+class Call(NamedTuple):
+    """Measurements of one extraction.
+
+  Attributes:
+    filename: Optional string name of the file the code came from.
+    parser: Optional name of the parser module used, such as 'c_parser', or
+      None if the code's MIME type is unsupported.
+    detection: Optional name of the strategy which deduced the MIME type, see
+      comment_parser.detect_mime, or None if the MIME type was given.
+    size: Length of the code (int), in characters.
+    comments: Number of comments found (int).
+    read: Seconds (float) spent reading and decoding the file.
+    detect: Seconds (float) spent deducing the MIME type.
+    parse: Seconds (float) spent looking up the cache and parsing.
+    cached: Boolean whether the comments came from the cache.
+    error: Optional name of the exception raised, if the extraction failed.
+  """
+    filename: Optional[str]
+    parser: Optional[str]
+    detection: Optional[str]
+    size: int
+    comments: int
+    read: float
+    detect: float
+    parse: float
+    cached: bool = False
+    error: Optional[str] = None
+
+
+def _bucket(seconds: float) -> int:
+    """Returns the power of two of microseconds bounding seconds."""
+    microseconds = seconds * 1e6
+    if microseconds <= 1:
+        return 1
+    return 1 << math.ceil(math.log2(microseconds))
+
+
+class Stats():
+    """Collects the Calls of extractions."""
+
+    def __init__(self):
+        self.calls: List[Call] = []
+
+    def record(self, call: Call) -> None:
+        """Records the measurements of an extraction.
+
+    Args:
+      call: Call to record.
+    """
+        self.calls.append(call)
+
+    def merge(self, other: 'Stats') -> None:
+        """Records the calls of other, such as a worker process' Stats.
+
+    Args:
+      other: Stats whose calls to record.
+    """
+        for call in other.calls:
+            self.record(call)
+
+    def histogram(self, phase: str) -> Dict[int, int]:
+        """Returns how many calls took how long in phase.
+
+    Args:
+      phase: String name of the phase, one of PHASES.
+    Returns:
+      Python dict mapping powers of two of microseconds (int), in increasing
+        order, to the number of calls (int) whose phase took longer than half
+        that and at most that.
+    """
+        counts = collections.Counter(
+            _bucket(getattr(call, phase)) for call in self.calls)
+        return dict(sorted(counts.items()))
+
+    def summary(self) -> str:
+        """Returns a human readable summary of the calls.
+
+    Returns:
+      String of lines: totals, time per phase with its histogram, and size,
+        comments and parse throughput per parser.
+    """
+        calls = self.calls
+        failed = sum(call.error is not None for call in calls)
+        cached = sum(call.cached for call in calls)
+        lines = [
+            f'calls: {len(calls)}, failed: {failed}, cached: {cached}, '
+            f'size: {sum(call.size for call in calls)}, '
+            f'comments: {sum(call.comments for call in calls)}'
+        ]
+        for phase in PHASES:
+            total = sum(getattr(call, phase) for call in calls)
+            histogram = ' '.join(
+                f'<={bound}us:{count}'
+                for bound, count in self.histogram(phase).items())
+            lines.append(f'{phase:<8}{total:10.3f}s  {histogram}')
+        parsers = collections.defaultdict(list)
+        for call in calls:
+            if call.parser is not None:
+                parsers[call.parser].append(call)
+        for parser, parser_calls in sorted(parsers.items()):
+            size = sum(call.size for call in parser_calls)
+            parse = sum(call.parse for call in parser_calls)
+            speed = f'{size / parse / 1e6:.2f}' if parse else '-'
+            lines.append(
+                f'{parser:<16}calls: {len(parser_calls)}, size: {size}, '
+                f'comments: {sum(call.comments for call in parser_calls)}, '
+                f'parse: {parse:.3f}s, {speed} M/s')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,81 @@
+#!/usr/bin/python
+"""Tests for comment_parser.cache.py"""
+
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+from comment_parser import cache
+from comment_parser import comment_parser
+from comment_parser.parsers import common
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.cache = cache.ResultCache(self.directory.name)
+        self.addCleanup(self.cache.close)
+
+    def testMissThenHit(self):
+        key = self.cache.key('// a', 'parser')
+        self.assertIsNone(self.cache.get(key))
+        comments = [common.Comment(' a', 1, False, 0, 4, 0)]
+        self.cache.put(key, comments)
+        cached = self.cache.get(key)
+        self.assertEqual(cached, comments)
+        self.assertEqual((cached[0].start(), cached[0].end()), (0, 4))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def testKeyDependsOnCodeAndParser(self):
+        key = self.cache.key('// a', 'parser')
+        self.assertNotEqual(key, self.cache.key('// b', 'parser'))
+        self.assertNotEqual(key, self.cache.key('// a', 'other_parser'))
+
+    def testLeastRecentlyUsedEviction(self):
+        small = cache.ResultCache(self.directory.name, max_size=150)
+        self.addCleanup(small.close)
+        comments = [common.Comment('x' * 30, 1)]
+        with mock.patch('time.time', side_effect=range(100)):
+            small.put('a', comments)
+            small.put('b', comments)
+            small.get('a')
+            small.put('c', comments)
+        self.assertIsNotNone(small.get('a'))
+        self.assertIsNone(small.get('b'))
+        self.assertIsNotNone(small.get('c'))
+
+    def testReplaceCountsSizeOnce(self):
+        small = cache.ResultCache(self.directory.name, max_size=150)
+        self.addCleanup(small.close)
+        comments = [common.Comment('x' * 30, 1)]
+        with mock.patch.object(cache.ResultCache, '_evict') as evict:
+            for _ in range(3):
+                small.put('a', comments)
+        evict.assert_not_called()
+
+    def testKeyDependsOnResultsVersion(self):
+        key = self.cache.key('// a', 'parser')
+        with mock.patch.object(cache, 'results_version', return_value='other'):
+            other = cache.ResultCache(self.directory.name)
+        self.assertNotEqual(other.key('// a', 'parser'), key)
+
+    def testPersistsAcrossInstances(self):
+        self.cache.put('a', [common.Comment(' a', 1)])
+        self.cache.close()
+        reopened = pickle.loads(pickle.dumps(self.cache))
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.get('a'), [common.Comment(' a', 1)])
+
+    def testExtractComments(self):
+        filename = os.path.join(self.directory.name, 'a.c')
+        with open(filename, 'w', encoding='utf-8') as source:
+            source.write('// a')
+        expected = [common.Comment(' a', 1)]
+        for _ in range(2):
+            self.assertEqual(
+                comment_parser.extract_comments(filename, cache=self.cache),
+                expected)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
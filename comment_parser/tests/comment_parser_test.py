@@ -0,0 +1,560 @@
+#!/usr/bin/python
+"""Tests for comment_parser.comment_parser.py"""
+
+import asyncio
+import contextlib
+import io
+import json
+import mmap
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from comment_parser import comment_parser
+from comment_parser import mime
+from comment_parser.cache import ResultCache
+from comment_parser.parsers import c_parser
+from comment_parser.parsers import common
+
+
+class ExtractCommentsManyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, code):
+        filename = os.path.join(self.directory.name, name)
+        with open(filename, 'w', encoding='utf-8') as source:
+            source.write(code)
+        return filename
+
+    def testSingleWorkerKeepsOrder(self):
+        filenames = [self.write(f'{i}.c', f'// {i}\n') for i in range(5)]
+        results = list(
+            comment_parser.extract_comments_many(filenames,
+                                                 workers=1,
+                                                 mime='text/x-c'))
+        expected = [(f, [common.Comment(f' {i}', 1)])
+                    for i, f in enumerate(filenames)]
+        self.assertEqual(results, expected)
+
+    def testProcessPool(self):
+        filenames = [self.write(f'{i}.c', f'// {i}\n') for i in range(10)]
+        results = dict(
+            comment_parser.extract_comments_many(iter(filenames),
+                                                 workers=2,
+                                                 mime='text/x-c',
+                                                 chunksize=3))
+        expected = {
+            f: [common.Comment(f' {i}', 1)]
+            for i, f in enumerate(filenames)
+        }
+        self.assertEqual(results, expected)
+
+    def testErrorsAreReturnedPerFile(self):
+        good = self.write('good.c', '/* good */')
+        bad = self.write('bad.c', '/* unterminated')
+        missing = os.path.join(self.directory.name, 'missing.c')
+        results = dict(
+            comment_parser.extract_comments_many([bad, missing, good],
+                                                 workers=2,
+                                                 mime='text/x-c'))
+        self.assertIsInstance(results[bad], comment_parser.ParseError)
+        self.assertIsInstance(results[missing], OSError)
+        self.assertEqual(results[good],
+                         [common.Comment(' good ', 1, multiline=True)])
+
+    def testUnsupportedMime(self):
+        filename = self.write('a.txt', 'text')
+        results = list(
+            comment_parser.extract_comments_many([filename],
+                                                 workers=1,
+                                                 mime='text/plain'))
+        self.assertIsInstance(results[0][1], comment_parser.UnsupportedError)
+
+
+class StatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def testExtractCommentsFromStr(self):
+        stats = comment_parser.Stats()
+        comment_parser.extract_comments_from_str('a; // b\n',
+                                                 filename='a.c',
+                                                 stats=stats)
+        [call] = stats.calls
+        self.assertEqual((call.parser, call.detection, call.size,
+                          call.comments, call.error),
+                         ('c_parser', 'extension', 8, 1, None))
+
+    def testErrorsAreRecorded(self):
+        stats = comment_parser.Stats()
+        with self.assertRaises(comment_parser.ParseError):
+            comment_parser.extract_comments_from_str('/*',
+                                                     'text/x-c',
+                                                     stats=stats)
+        self.assertEqual(stats.calls[0].error, 'ParseError')
+
+    def testExtractCommentsManyMergesWorkers(self):
+        filenames = []
+        for i in range(4):
+            filenames.append(os.path.join(self.directory.name, f'{i}.c'))
+            with open(filenames[-1], 'w', encoding='utf-8') as source:
+                source.write(f'// {i}\n')
+        stats = comment_parser.Stats()
+        list(
+            comment_parser.extract_comments_many(filenames,
+                                                 workers=2,
+                                                 chunksize=1,
+                                                 stats=stats))
+        self.assertCountEqual([call.filename for call in stats.calls],
+                              filenames)
+
+    def testMainPrintsSummary(self):
+        filename = os.path.join(self.directory.name, 'a.go')
+        with open(filename, 'w', encoding='utf-8') as source:
+            source.write('// a\n')
+        stderr = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(stderr):
+            comment_parser.main(['--stats', filename])
+        self.assertTrue(stderr.getvalue().startswith('calls: 1, failed: 0'))
+        self.assertIn('go_parser', stderr.getvalue())
+
+
+class FilterTest(unittest.TestCase):
+
+    code = '// TODO a\n/* b */\n// FIXME c\n// d\n'
+
+    def testFilters(self):
+        comments = comment_parser.extract_comments_from_str(
+            self.code, 'text/x-c', kinds='line', pattern='TODO|FIXME')
+        self.assertEqual([comment.text() for comment in comments],
+                         [' TODO a', ' FIXME c'])
+        comments = comment_parser.extract_comments_from_str(self.code,
+                                                            'text/x-c',
+                                                            lines=(2, None),
+                                                            max_count=2)
+        self.assertEqual([comment.text() for comment in comments],
+                         [' b ', ' FIXME c'])
+
+    def testLeadingReadsOnlyHeader(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'a.go')
+            with open(filename, 'wb') as source:
+                source.write(b'// License\n\npackage a\n' + b'// b\n' *
+                             (comment_parser.CHUNK_SIZE // 2) + b'\xff')
+            self.assertRaises(UnicodeDecodeError,
+                              comment_parser.extract_comments, filename)
+            stats = comment_parser.Stats()
+            self.assertEqual(
+                comment_parser.extract_comments(filename,
+                                                leading=True,
+                                                stats=stats),
+                [common.Comment(' License', 1)])
+            self.assertLess(stats.calls[0].size, comment_parser.CHUNK_SIZE)
+
+    def testLeadingRecordsFailedDetection(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'a.c')
+            with open(filename, 'w', encoding='utf-8') as source:
+                source.write('// a\n')
+            stats = comment_parser.Stats()
+            with self.assertRaises(comment_parser.UnsupportedError):
+                comment_parser.extract_comments(filename,
+                                                'text/x-unknown',
+                                                leading=True,
+                                                stats=stats)
+            [call] = stats.calls
+            self.assertEqual((call.parser, call.error),
+                             (None, 'UnsupportedError'))
+            self.assertLess(call.detect, 60)
+
+    def testUnknownKind(self):
+        self.assertRaises(ValueError,
+                          comment_parser.extract_comments_from_str,
+                          self.code,
+                          'text/x-c',
+                          kinds=['doc'])
+
+    def testCacheHoldsAllComments(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(directory)
+            self.addCleanup(cache.close)
+            comments = comment_parser.extract_comments_from_str(self.code,
+                                                                'text/x-c',
+                                                                cache=cache,
+                                                                max_count=1)
+            self.assertEqual(comments, [common.Comment(' TODO a', 1)])
+            self.assertEqual(
+                comment_parser.extract_comments_from_str(self.code,
+                                                         'text/x-c',
+                                                         cache=cache),
+                c_parser.extract_comments(self.code))
+            self.assertEqual(cache.hits, 1)
+
+    def testDocstrings(self):
+        code = 'def f():\n    """Doc."""  # a\n'
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(directory)
+            self.addCleanup(cache.close)
+            for _ in range(2):
+                self.assertEqual(
+                    comment_parser.extract_comments_from_str(code,
+                                                             'text/x-python',
+                                                             cache=cache,
+                                                             docstrings=True),
+                    [
+                        common.Comment('Doc.', 2, multiline=True),
+                        common.Comment(' a', 2)
+                    ])
+                self.assertEqual(
+                    comment_parser.extract_comments_from_str(code,
+                                                             'text/x-python',
+                                                             cache=cache),
+                    [common.Comment(' a', 2)])
+            self.assertEqual(cache.hits, 2)
+
+
+class LimitsTest(unittest.TestCase):
+
+    code = '// a\n' * 100
+
+    def testExtractCommentsFromStr(self):
+        with self.assertRaises(common.LimitExceededError) as e:
+            comment_parser.extract_comments_from_str(
+                self.code, 'text/x-c', limits=common.Limits(max_comments=5))
+        self.assertEqual(e.exception.comments,
+                         [common.Comment(' a', i) for i in range(1, 6)])
+
+    def testExtractComments(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'a.c')
+            with open(filename, 'w', encoding='utf-8') as f:
+                f.write(self.code)
+            limits = common.Limits(max_size=len(self.code) - 1)
+            with self.assertRaises(common.LimitExceededError) as e:
+                comment_parser.extract_comments(filename, limits=limits)
+            self.assertEqual(len(e.exception.comments), 99)
+            cache = ResultCache(directory)
+            self.addCleanup(cache.close)
+            with self.assertRaises(common.LimitExceededError):
+                comment_parser.extract_comments(filename,
+                                                cache=cache,
+                                                limits=limits)
+            self.assertEqual(
+                len(comment_parser.extract_comments(filename, cache=cache)),
+                100)
+            with self.assertRaises(common.LimitExceededError):
+                comment_parser.extract_comments_from_str(
+                    self.code,
+                    'text/x-c',
+                    cache=cache,
+                    limits=common.Limits(max_comments=99))
+
+    def testExtractCommentsMany(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'a.c')
+            with open(filename, 'w', encoding='utf-8') as f:
+                f.write(self.code)
+            results = dict(
+                comment_parser.extract_comments_many(
+                    [filename],
+                    workers=2,
+                    limits=common.Limits(max_comments=1)))
+        self.assertIsInstance(results[filename], common.LimitExceededError)
+        self.assertEqual(results[filename].limit, 'max_comments')
+        self.assertEqual(results[filename].comments, [common.Comment(' a', 1)])
+
+
+class IterCommentsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.filename = os.path.join(self.directory.name, 'a.js')
+        with open(self.filename, 'w', encoding='utf-8') as source:
+            source.write('s = "// x";\n/* one\ntwo */ f(); // three\n')
+        self.expected = [
+            common.Comment(' one\ntwo ', 2, multiline=True),
+            common.Comment(' three', 3),
+        ]
+
+    def testPath(self):
+        comments = comment_parser.iter_comments(self.filename,
+                                                'application/javascript',
+                                                chunk_size=4)
+        self.assertEqual(list(comments), self.expected)
+
+    def testFileObject(self):
+        with open(self.filename, encoding='utf-8') as source:
+            comments = list(
+                comment_parser.iter_comments(source,
+                                             'application/javascript',
+                                             chunk_size=1))
+        self.assertEqual(comments, self.expected)
+
+    def testParseError(self):
+        with open(self.filename, 'w', encoding='utf-8') as source:
+            source.write('/* unterminated')
+        comments = comment_parser.iter_comments(self.filename,
+                                                'application/javascript',
+                                                chunk_size=4)
+        self.assertRaises(comment_parser.ParseError, list, comments)
+
+    def testUnsupportedMime(self):
+        comments = comment_parser.iter_comments(self.filename, 'text/plain')
+        self.assertRaises(comment_parser.UnsupportedError, list, comments)
+
+
+class _SlowParser():
+    """Parser taking a while per chunk, recording how many run at once."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.chunks = 0
+        self.started = threading.Event()
+        self.finished = threading.Event()
+
+    def iter_comments(self, chunks):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            for _ in chunks:
+                self.started.set()
+                self.chunks += 1
+                time.sleep(0.005)
+            return iter([])
+        finally:
+            with self.lock:
+                self.running -= 1
+            self.finished.set()
+
+
+class _BlockingParser():
+    """Parser which ignores cancellation until released."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def iter_comments(self, chunks):
+        del chunks  # Unused.
+        self.started.set()
+        self.release.wait()
+        return iter([])
+
+
+class AsyncExtractCommentsTest(unittest.IsolatedAsyncioTestCase):
+
+    async def testExtractCommentsFromStr(self):
+        code = '/* a */ b; // c\n'
+        self.assertEqual(
+            await comment_parser.aextract_comments_from_str(code, 'text/x-c'),
+            comment_parser.extract_comments_from_str(code, 'text/x-c'))
+
+    async def testExtractComments(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.js',
+                                         delete=False) as source:
+            source.write('a(); // b\n')
+        self.addCleanup(os.unlink, source.name)
+        self.assertEqual(await comment_parser.aextract_comments(source.name),
+                         [common.Comment(' b', 1)])
+
+    async def testErrors(self):
+        with self.assertRaises(comment_parser.ParseError):
+            await comment_parser.aextract_comments_from_str('/*', 'text/x-c')
+        with self.assertRaises(comment_parser.UnsupportedError):
+            await comment_parser.aextract_comments_from_str('', 'text/plain')
+
+    async def testConcurrencyLimit(self):
+        parser = _SlowParser()
+        semaphore = asyncio.Semaphore(2)
+        with mock.patch.object(comment_parser,
+                               'get_parser',
+                               return_value=parser):
+            await asyncio.gather(*(comment_parser.aextract_comments_from_str(
+                'x' * 3, semaphore=semaphore) for _ in range(6)))
+        self.assertEqual(parser.max_running, 2)
+
+    async def testCancellationStopsParse(self):
+        parser = _SlowParser()
+        with mock.patch.object(comment_parser,
+                               'get_parser',
+                               return_value=parser), mock.patch.object(
+                                   comment_parser, 'CHUNK_SIZE', 1):
+            task = asyncio.create_task(
+                comment_parser.aextract_comments_from_str('x' * 10000))
+            await asyncio.get_running_loop().run_in_executor(
+                None, parser.started.wait)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            await asyncio.get_running_loop().run_in_executor(
+                None, parser.finished.wait)
+        self.assertLess(parser.chunks, 10000)
+
+    async def testCancelledParseKeepsSlot(self):
+        parser = _BlockingParser()
+        self.addCleanup(parser.release.set)
+        semaphore = asyncio.Semaphore(1)
+        with mock.patch.object(comment_parser,
+                               'get_parser',
+                               return_value=parser):
+            task = asyncio.create_task(
+                comment_parser.aextract_comments_from_str('x',
+                                                          semaphore=semaphore))
+            await asyncio.get_running_loop().run_in_executor(
+                None, parser.started.wait)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertTrue(semaphore.locked())
+            parser.release.set()
+            await asyncio.wait_for(semaphore.acquire(), 5)
+        semaphore.release()
+
+
+class ExtractCommentsFromBytesTest(unittest.TestCase):
+
+    def testMmap(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'a.js')
+            with open(filename, 'wb') as source:
+                source.write(
+                    's = "// é";\n/* one\ntwo */ f(); // three\n'.encode())
+            with open(filename, 'rb') as source, mmap.mmap(
+                    source.fileno(), 0, access=mmap.ACCESS_READ) as code:
+                comments = comment_parser.extract_comments_from_bytes(
+                    code, filename=filename)
+        self.assertEqual(comments, [
+            common.Comment(' one\ntwo ', 2, multiline=True),
+            common.Comment(' three', 3),
+        ])
+        self.assertEqual(comments[0].start(), 13)
+
+    def testParseError(self):
+        with self.assertRaises(comment_parser.ParseError):
+            comment_parser.extract_comments_from_bytes(b'/* a', 'text/x-c')
+
+
+class ExtractCommentTableTest(unittest.TestCase):
+
+    def testMmap(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'a.py')
+            with open(filename, 'wb') as source:
+                source.write('"""Doc."""\n# é\nx = 1  # two\n'.encode())
+            with open(filename, 'rb') as source, mmap.mmap(
+                    source.fileno(), 0, access=mmap.ACCESS_READ) as code:
+                table = comment_parser.extract_comment_table(code,
+                                                             filename=filename,
+                                                             docstrings=True)
+                self.assertEqual(list(table), [
+                    common.Comment('Doc.', 1, multiline=True),
+                    common.Comment(' é', 2),
+                    common.Comment(' two', 3),
+                ])
+                self.assertEqual(list(table.starts), [0, 11, 23])
+
+    def testStr(self):
+        code = 's = "// x";\n/* one */ f(); // two\n'
+        table = comment_parser.extract_comment_table(code,
+                                                     'text/x-c',
+                                                     max_count=1)
+        self.assertEqual(list(table), [common.Comment(' one ', 2, True)])
+
+    def testParseError(self):
+        with self.assertRaises(comment_parser.ParseError):
+            comment_parser.extract_comment_table('/* a', 'text/x-c')
+
+
+class LazyImportTest(unittest.TestCase):
+
+    def imported(self, code):
+        """Returns the modules imported by code, run in a fresh interpreter."""
+        process = subprocess.run(
+            [sys.executable, '-c', f'{code}\nimport sys\nprint(*sys.modules)'],
+            cwd=os.path.dirname(os.path.dirname(comment_parser.__file__)),
+            capture_output=True,
+            check=True,
+            text=True)
+        return set(process.stdout.split())
+
+    def testImport(self):
+        modules = self.imported('from comment_parser import comment_parser')
+        self.assertIn('comment_parser.parsers.common', modules)
+        for module in ('asyncio', 'concurrent.futures', 'importlib.metadata',
+                       'magic', 'sqlite3', 'comment_parser.cache',
+                       'comment_parser.parsers.c_parser',
+                       'comment_parser.parsers.python_parser'):
+            self.assertNotIn(module, modules)
+
+    def testImportsOnlyParserUsed(self):
+        modules = self.imported(
+            'from comment_parser import comment_parser\n'
+            'comment_parser.extract_comments_from_str("// a", "text/x-c")')
+        self.assertIn('comment_parser.parsers.c_parser', modules)
+        self.assertNotIn('comment_parser.parsers.python_parser', modules)
+        self.assertNotIn('magic', modules)
+
+    def testMimeMap(self):
+        mime_map = mime._ParserMap(
+            {'text/x-c': 'comment_parser.parsers.c_parser'})
+        mime_map['text/x-d'] = c_parser
+        self.assertIs(mime_map['text/x-c'], c_parser)
+        self.assertEqual(dict(mime_map), {
+            'text/x-c': c_parser,
+            'text/x-d': c_parser
+        })
+        del mime_map['text/x-c']
+        self.assertEqual(list(mime_map), ['text/x-d'])
+        self.assertRaises(KeyError, mime_map.__getitem__, 'text/x-c')
+
+
+class DetectMimeTest(unittest.TestCase):
+
+    def testExtension(self):
+        detection = comment_parser.detect_mime('', 'src/Main.JAVA')
+        self.assertEqual(
+            detection,
+            comment_parser.Detection('text/x-java-source', 'extension'))
+
+    def testShebang(self):
+        self.assertEqual(
+            comment_parser.detect_mime('#!/bin/bash\necho', 'script'),
+            comment_parser.Detection('text/x-shellscript', 'shebang'))
+        self.assertEqual(
+            comment_parser.detect_mime('#!/usr/bin/env -S python3.11 -u'),
+            comment_parser.Detection('text/x-python', 'shebang'))
+
+    def testExtensionBeforeShebang(self):
+        detection = comment_parser.detect_mime('#!/usr/bin/env node', 'a.rb')
+        self.assertEqual(detection.strategy, 'extension')
+
+    def testPluggableResolvers(self):
+        resolvers = [('constant', lambda code, filename: 'text/x-go')]
+        with mock.patch.object(comment_parser, 'MIME_RESOLVERS', resolvers):
+            detection = comment_parser.detect_mime('package main')
+        self.assertEqual(detection,
+                         comment_parser.Detection('text/x-go', 'constant'))
+
+    def testUndecided(self):
+        with mock.patch.object(comment_parser, 'MIME_RESOLVERS', []):
+            self.assertRaises(comment_parser.UnsupportedError,
+                              comment_parser.detect_mime, 'code')
+
+    def testExtractCommentsFromStrUsesFilename(self):
+        comments = comment_parser.extract_comments_from_str('x = 1  # a',
+                                                            filename='a.py')
+        self.assertEqual(comments, [common.Comment(' a', 1)])
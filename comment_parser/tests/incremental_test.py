@@ -0,0 +1,129 @@
+#!/usr/bin/python
+"""Tests for comment_parser.incremental.py"""
+
+import random
+import unittest
+from unittest import mock
+from comment_parser import comment_parser
+from comment_parser import incremental
+from comment_parser.parsers import common
+
+
+def positions(comments):
+    return [(comment.text(), comment.line_number(), comment.is_multiline(),
+             comment.start(), comment.end(), comment.column())
+            for comment in comments]
+
+
+class DocumentTest(unittest.TestCase):
+
+    def setUp(self):
+        # Small windows, so that edits restart from and resync at checkpoints.
+        patcher = mock.patch.object(incremental, 'CHECKPOINT_INTERVAL', 8)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assertMatchesFullParse(self, document, mime):
+        expected = comment_parser.extract_comments_from_str(
+            document.code, mime)
+        self.assertEqual(positions(document.comments), positions(expected))
+
+    def testEditInsideComment(self):
+        code = 'a = 1; // one\nb = 2; /* two */\nc = 3; // three\n'
+        document = incremental.Document(code, 'application/javascript')
+        start = code.index('two')
+        change = document.edit(start, start + 3, '2\n2')
+        self.assertEqual(change.index, 1)
+        self.assertEqual(change.removed, [common.Comment(' two ', 2, True)])
+        self.assertEqual(change.added, [common.Comment(' 2\n2 ', 2, True)])
+        self.assertEqual(change.comments[2], common.Comment(' three', 4))
+        self.assertMatchesFullParse(document, 'application/javascript')
+
+    def testEditOpensComment(self):
+        code = 'a = 1; // one\nb = 2;\nc = 3; // three */\nd = 4; // four\n'
+        document = incremental.Document(code, 'text/x-c')
+        start = code.index('b')
+        change = document.edit(start, start, '/*')
+        self.assertEqual(change.removed, [common.Comment(' three */', 3)])
+        self.assertEqual(change.added,
+                         [common.Comment('b = 2;\nc = 3; // three ', 2, True)])
+        self.assertMatchesFullParse(document, 'text/x-c')
+
+    def testEditMovesLaterComments(self):
+        code = 'x = 1 # one\ny = 2 # two\nz = 3 # three\n'
+        document = incremental.Document(code, 'text/x-shellscript')
+        change = document.edit(0, 0, 'w = 0\n  ')
+        self.assertEqual(change.removed, [])
+        self.assertEqual(change.added, [])
+        self.assertMatchesFullParse(document, 'text/x-shellscript')
+
+    def testUnterminatedCommentRecovers(self):
+        document = incremental.Document('a /* b */ c', 'text/x-c')
+        with self.assertRaises(comment_parser.ParseError):
+            document.edit(8, 9, '')
+        self.assertEqual(document.comments, [])
+        document.edit(8, 8, '/')
+        self.assertEqual(document.comments, [common.Comment(' b ', 1, True)])
+
+    def testParsersWithoutScanner(self):
+        code = 'a = 1  # one\nb = 2  # two\n'
+        document = incremental.Document(code, 'text/x-python')
+        change = document.edit(0, 0, '# zero\n')
+        self.assertEqual(change.index, 0)
+        self.assertEqual(change.removed, [])
+        self.assertEqual(change.added, [common.Comment(' zero', 1)])
+        self.assertMatchesFullParse(document, 'text/x-python')
+
+    def testCommentAt(self):
+        document = incremental.Document('a; /* b */ c; // d\n', 'text/x-c')
+        self.assertIsNone(document.comment_at(2))
+        self.assertEqual(document.comment_at(3),
+                         common.Comment(' b ', 1, True))
+        self.assertEqual(document.comment_at(9),
+                         common.Comment(' b ', 1, True))
+        self.assertIsNone(document.comment_at(10))
+        self.assertEqual(document.comment_at(17), common.Comment(' d', 1))
+        self.assertIsNone(document.comment_at(18))
+
+    def testInvalidRange(self):
+        document = incremental.Document('// a', 'text/x-c')
+        with self.assertRaises(ValueError):
+            document.edit(2, 1, '')
+        with self.assertRaises(ValueError):
+            document.edit(0, 5, '')
+
+    def testRandomEditsMatchFullParse(self):
+        alphabets = {
+            'application/javascript': '/*\n"\'`\\ ab',
+            'text/html': '<!-- ->\n"ab',
+            'text/x-c': '/*\n"\'\\ ab',
+            'text/x-go': '/*\n"\'`\\ ab',
+            'text/x-ruby': '#\n"\'\\ ab',
+            'text/x-shellscript': '#\n"\'\\ ab',
+        }
+        rand = random.Random(0)
+        for mime, alphabet in alphabets.items():
+            document = incremental.Document('', mime)
+            for _ in range(300):
+                start = rand.randint(0, len(document.code))
+                end = min(len(document.code), start + rand.randint(0, 3))
+                text = ''.join(
+                    rand.choice(alphabet) for _ in range(rand.randint(0, 4)))
+                previous = document.comments
+                try:
+                    change = document.edit(start, end, text)
+                except comment_parser.ParseError:
+                    continue
+                self.assertMatchesFullParse(document, mime)
+                self.assertEqual(
+                    positions(previous[change.index:change.index +
+                                       len(change.removed)]),
+                    positions(change.removed))
+                self.assertEqual(
+                    positions(change.comments[change.index:change.index +
+                                              len(change.added)]),
+                    positions(change.added))
+
+
+if __name__ == '__main__':
+    unittest.main()
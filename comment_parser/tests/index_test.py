@@ -0,0 +1,153 @@
+#!/usr/bin/python
+"""Tests for comment_parser.index.py"""
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from comment_parser import comment_parser
+from comment_parser import index
+from comment_parser import repository
+from comment_parser.parsers import common
+
+
+class CommentIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = os.path.join(directory.name, 'src')
+        self.database = os.path.join(directory.name, 'index.db')
+        self.index = index.CommentIndex(self.database)
+        self.addCleanup(self.index.close)
+        self.write('a.c', '// TODO fix the leak\nx;\n/* memory\n leak */\n')
+        self.write('b/c.py', '# TODO later\n# unrelated\n')
+
+    def write(self, path, code, mtime=None):
+        filename = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(code)
+        if mtime is not None:
+            os.utime(filename, ns=(mtime, mtime))
+        return filename
+
+    def path(self, path):
+        return os.path.join(self.root, path)
+
+    def testSearch(self):
+        self.index.update([self.root])
+        hits = self.index.search('leak')
+        self.assertEqual(hits, [
+            index.Hit(self.path('a.c'), common.Comment(' TODO fix the leak',
+                                                       1)),
+            index.Hit(self.path('a.c'),
+                      common.Comment(' memory\n leak ', 3, True)),
+        ])
+        self.assertEqual((hits[1].comment.start(), hits[1].comment.end(),
+                          hits[1].comment.column()), (24, 42, 0))
+        self.assertEqual(
+            [hit.path for hit in self.index.search('TODO')],
+            [self.path('a.c'), self.path('b/c.py')])
+        self.assertEqual(len(self.index.search('TODO AND leak')), 1)
+        self.assertEqual(len(self.index.search('unrel*')), 1)
+        self.assertEqual(
+            [hit.comment.text() for hit in self.index.search(path='*.py')],
+            [' TODO later', ' unrelated'])
+        hits = self.index.search(path=self.path('a.c'), lines=(2, None))
+        self.assertEqual([hit.comment.text() for hit in hits],
+                         [' memory\n leak '])
+        self.assertEqual(len(self.index.search(limit=2)), 2)
+        with self.assertRaises(ValueError):
+            self.index.search('AND AND')
+
+    def testUpdate(self):
+        self.assertEqual(
+            self.index.update([self.root]),
+            repository.Changes(
+                [self.path('a.c'), self.path('b/c.py')], [], [], 0))
+        self.write('a.c', '// replaced\n', mtime=1)
+        self.write('d.txt', 'text')
+        os.remove(self.path('b/c.py'))
+        with mock.patch.object(comment_parser,
+                               'extract_comments_many',
+                               wraps=comment_parser.extract_comments_many
+                               ) as extract_comments_many:
+            changes = self.index.update([self.root])
+        self.assertEqual(
+            changes,
+            repository.Changes([self.path('d.txt')], [self.path('a.c')],
+                               [self.path('b/c.py')], 0))
+        self.assertEqual(
+            sorted(extract_comments_many.call_args[0][0]),
+            [self.path('a.c'), self.path('d.txt')])
+        self.assertEqual(self.index.search('TODO'), [])
+        self.assertEqual(len(self.index.search('replaced')), 1)
+        self.assertEqual(self.index.update([self.root]),
+                         repository.Changes([], [], [], 2))
+
+    def testSync(self):
+        entries = {
+            'a.c': repository.Entry('1', [common.Comment(' TODO a', 1)]),
+            'b.txt': repository.Entry('2', None, 'UnsupportedError'),
+        }
+        self.assertEqual(
+            self.index.sync(self.root, entries),
+            repository.Changes(
+                [self.path('a.c'), self.path('b.txt')], [], [], 0))
+        del entries['b.txt']
+        entries['a.c'] = repository.Entry('3', [common.Comment(' TODO b', 1)])
+        self.assertEqual(
+            self.index.sync(self.root, entries),
+            repository.Changes([], [self.path('a.c')], [self.path('b.txt')],
+                               0))
+        self.assertEqual(
+            self.index.search('TODO'),
+            [index.Hit(self.path('a.c'), common.Comment(' TODO b', 1))])
+
+    def testSyncErrorWithoutBlob(self):
+        entries = {
+            'a.c': repository.Entry('1', [common.Comment(' a', 1)]),
+            'b.c': repository.Entry(None, None, 'OSError'),
+        }
+        self.assertEqual(
+            self.index.sync(self.root, entries),
+            repository.Changes(
+                [self.path('a.c'), self.path('b.c')], [], [], 0))
+        self.assertEqual(self.index.keys()[self.path('b.c')], 'error:OSError')
+        self.assertEqual(self.index.sync(self.root, entries),
+                         repository.Changes([], [], [], 2))
+        del entries['b.c']
+        self.assertEqual(self.index.sync(self.root, entries),
+                         repository.Changes([], [], [self.path('b.c')], 1))
+
+    def testMain(self):
+        index.main(['--index', self.database, 'update', self.root])
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            index.main([
+                '--index', self.database, 'search', 'TODO', '--path', '*.c',
+                '--format', 'jsonl'
+            ])
+        self.assertEqual(
+            json.loads(stdout.getvalue()), {
+                'path': self.path('a.c'),
+                'line': 1,
+                'multiline': False,
+                'text': ' TODO fix the leak'
+            })
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            index.main([
+                '--index', self.database, 'search', '--path', '*.py',
+                '--lines', '2:'
+            ])
+        self.assertEqual(stdout.getvalue(),
+                         f'{self.path("b/c.py")}:2: unrelated\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
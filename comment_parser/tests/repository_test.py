@@ -0,0 +1,166 @@
+#!/usr/bin/python
+"""Tests for comment_parser.repository.py"""
+
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+from comment_parser import comment_parser
+from comment_parser import mime
+from comment_parser import repository
+from comment_parser.parsers import common
+
+
+@unittest.skipIf(shutil.which('git') is None, 'git is not installed')
+class RepositoryTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.tree = os.path.join(directory.name, 'tree')
+        self.manifest = os.path.join(directory.name, 'manifest.json')
+        os.mkdir(self.tree)
+        self.git('init', '-q')
+        self.write('a.c', '// a\n')
+        self.write('b.c', '/* b */\n')
+        self.write('d/e.py', '# e\n')
+        self.write('f.txt', 'f\n')
+        self.git('add', '.')
+        # So that f.txt is unsupported whether python-magic is installed or not.
+        patcher = mock.patch.object(comment_parser, 'MIME_RESOLVERS', [
+            resolver for resolver in comment_parser.MIME_RESOLVERS
+            if resolver[0] != 'magic'
+        ])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def git(self, *args):
+        subprocess.run(['git', '-C', self.tree, *args],
+                       check=True,
+                       capture_output=True)
+
+    def write(self, path, code):
+        filename = os.path.join(self.tree, path)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(code)
+
+    def update(self):
+        parsed = []
+        extract_comments_many = comment_parser.extract_comments_many
+
+        def extract(filenames, **kwargs):
+            filenames = list(filenames)
+            parsed.extend(
+                os.path.relpath(filename, self.tree) for filename in filenames)
+            return extract_comments_many(filenames, **kwargs)
+
+        with mock.patch.object(comment_parser, 'extract_comments_many',
+                               extract):
+            changes = repository.update_manifest(self.tree, self.manifest)
+        return changes, sorted(parsed)
+
+    def testUpdate(self):
+        changes, parsed = self.update()
+        self.assertEqual(
+            changes,
+            repository.Changes(['a.c', 'b.c', 'd/e.py', 'f.txt'], [], [], 0))
+        self.assertEqual(parsed, ['a.c', 'b.c', 'd/e.py', 'f.txt'])
+        entries = repository.load_manifest(self.manifest)
+        self.assertEqual(entries['d/e.py'].comments, [common.Comment(' e', 1)])
+        self.assertIsNone(entries['f.txt'].comments)
+
+        self.write('a.c', '// changed\n')
+        self.git('rm', '-qf', 'b.c')
+        self.write('g.c', '// g\n')
+        self.git('add', 'g.c')
+        changes, parsed = self.update()
+        self.assertEqual(changes,
+                         repository.Changes(['g.c'], ['a.c'], ['b.c'], 2))
+        self.assertEqual(parsed, ['a.c', 'g.c'])
+        entries = repository.load_manifest(self.manifest)
+        self.assertEqual(list(entries), ['a.c', 'd/e.py', 'f.txt', 'g.c'])
+        self.assertEqual(entries['a.c'].comments,
+                         [common.Comment(' changed', 1)])
+
+        self.assertEqual(self.update(),
+                         (repository.Changes([], [], [], 4), []))
+
+    def testTransientErrorsRetried(self):
+        extract_comments_many = comment_parser.extract_comments_many
+
+        def extract(filenames, **kwargs):
+            for filename, result in extract_comments_many(filenames, **kwargs):
+                if filename.endswith('a.c'):
+                    result = OSError('busy')
+                yield filename, result
+
+        with mock.patch.object(comment_parser, 'extract_comments_many',
+                               extract):
+            repository.update_manifest(self.tree, self.manifest)
+        entries = repository.load_manifest(self.manifest)
+        self.assertEqual(entries['a.c'],
+                         repository.Entry(None, None, 'OSError'))
+        self.assertEqual(entries['f.txt'].error, 'UnsupportedError')
+
+        changes, parsed = self.update()
+        self.assertEqual(changes, repository.Changes([], ['a.c'], [], 3))
+        self.assertEqual(parsed, ['a.c'])
+        entries = repository.load_manifest(self.manifest)
+        self.assertEqual(entries['a.c'].comments, [common.Comment(' a', 1)])
+
+    def testUndetectableFile(self):
+        self.write('README', 'r\n')
+        self.git('add', 'README')
+
+        def magic(code, filename):
+            del code, filename  # Unused.
+            raise ImportError('python-magic is not installed')
+
+        with mock.patch.object(
+                comment_parser, 'MIME_RESOLVERS',
+                comment_parser.MIME_RESOLVERS + [('magic', magic)]):
+            with mock.patch.object(mime, 'HAS_MAGIC', False):
+                self.update()
+                self.assertEqual(self.update(),
+                                 (repository.Changes([], [], [], 5), []))
+                entries = repository.load_manifest(self.manifest)
+                self.assertEqual(entries['README'].error, 'ImportError')
+            with mock.patch.object(mime, 'HAS_MAGIC', True):
+                changes, parsed = self.update()
+        # f.txt also needed python-magic.
+        self.assertEqual(changes,
+                         repository.Changes([], ['README', 'f.txt'], [], 3))
+        self.assertEqual(parsed, ['README', 'f.txt'])
+
+    def testBlobs(self):
+        self.write('a.c', '// modified\n')
+        os.remove(os.path.join(self.tree, 'b.c'))
+        ids = repository.blobs(self.tree)
+        self.assertEqual(sorted(ids), ['a.c', 'd/e.py', 'f.txt'])
+        # Dirty files are hashed as git add stores them.
+        self.git('add', '-A')
+        self.assertEqual(repository.blobs(self.tree), ids)
+        self.assertEqual(repository.blobs(os.path.join(self.tree, 'd')),
+                         {'e.py': ids['d/e.py']})
+
+    def testOtherVersion(self):
+        self.update()
+        with open(self.manifest, encoding='utf-8') as f:
+            manifest = json.load(f)
+        manifest['library'] = 'other'
+        with open(self.manifest, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        self.assertEqual(repository.load_manifest(self.manifest), {})
+
+    def testNotATree(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(repository.GitError):
+                repository.blobs(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
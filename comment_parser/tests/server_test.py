@@ -0,0 +1,170 @@
+#!/usr/bin/python
+"""Tests for comment_parser.server.py and comment_parser.client.py"""
+
+import contextlib
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from comment_parser import client
+from comment_parser import server
+
+
+class ServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'server.sock')
+        self.server = server.Server(self.path)
+        self.addCleanup(self.server.server_close)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.shutdown)
+
+    def testExtractCode(self):
+        comments = client.extract_comments(code='/* a */\nx; // b\n',
+                                           mime='text/x-c',
+                                           path=self.path)
+        self.assertEqual(comments, [(1, True, 0, 7, 0, ' a '),
+                                    (2, False, 11, 15, 3, ' b')])
+
+    def testExtractFile(self):
+        filename = os.path.join(self.directory.name, 'a.py')
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write('"""Doc."""\n# TODO one\n# two\n')
+        comments = client.extract_comments(filename,
+                                           path=self.path,
+                                           pattern='TODO|Doc',
+                                           docstrings=True)
+        self.assertEqual([(c[0], c[5]) for c in comments], [(1, 'Doc.'),
+                                                            (2, ' TODO one')])
+
+    def testErrors(self):
+        with self.assertRaises(client.ServerError) as e:
+            client.extract_comments(code='x',
+                                    mime='text/x-unknown',
+                                    path=self.path)
+        self.assertEqual(e.exception.kind, 'UnsupportedError')
+        with self.assertRaises(client.ServerError) as e:
+            client.extract_comments(code='x', path=self.path, bogus=1)
+        self.assertEqual(e.exception.kind, 'ValueError')
+
+    def testMain(self):
+        with open(os.path.join(self.directory.name, 'a.c'),
+                  'w',
+                  encoding='utf-8') as f:
+            f.write('// a\n')
+        response = client.request(
+            {
+                'op': 'main',
+                'argv': ['--format', 'jsonl', 'a.c'],
+                'cwd': self.directory.name
+            }, self.path)
+        self.assertEqual(response['status'], 0)
+        self.assertEqual(json.loads(response['stdout']), {
+            'path': 'a.c',
+            'line': 1,
+            'multiline': False,
+            'text': ' a'
+        })
+
+    def testPing(self):
+        self.assertEqual(client.request({'op': 'ping'}, self.path),
+                         {'pid': os.getpid()})
+
+    def testMissingField(self):
+        response = client.request({'op': 'main'}, self.path)
+        self.assertEqual(response['error'][0], 'ValueError')
+        # Not a dict, as a client other than client.request may send.
+        response = client.request(  # pytype: disable=wrong-arg-types
+            ['ping'], self.path)
+        self.assertEqual(response['error'][0], 'ValueError')
+        self.assertEqual(client.request({'op': 'ping'}, self.path),
+                         {'pid': os.getpid()})
+
+    def testSecondServer(self):
+        with self.assertRaises(OSError):
+            server.Server(self.path)
+
+    def testIdleClient(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as idle:
+            idle.connect(self.path)
+            self.assertEqual(client.request({'op': 'ping'}, self.path),
+                             {'pid': os.getpid()})
+
+    def testNotASocket(self):
+        filename = os.path.join(self.directory.name, 'file')
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write('data')
+        with self.assertRaises(OSError):
+            server.Server(filename)
+        self.assertTrue(os.path.exists(filename))
+
+
+class ClientTest(unittest.TestCase):
+
+    def testFallsBackWithoutServer(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'a.c')
+            with open(filename, 'w', encoding='utf-8') as f:
+                f.write('/* a */\n')
+            os.environ[client.SOCKET_ENV] = os.path.join(directory, 'none')
+            self.addCleanup(os.environ.pop, client.SOCKET_ENV)
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout):
+                status = client.main([filename])
+        self.assertEqual(status, 0)
+        self.assertEqual(stdout.getvalue(), ' a \n')
+
+    def testTimeout(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'stalled.sock')
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stalled:
+                stalled.bind(path)
+                stalled.listen()
+                with self.assertRaises(TimeoutError):
+                    client.request({'op': 'ping'}, path, timeout=0.1)
+
+    def testWaitOutlivesTimeout(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'slow.sock')
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as slow:
+                slow.bind(path)
+                slow.listen()
+
+                def respond():
+                    connection, _ = slow.accept()
+                    with connection:
+                        client.receive(connection)
+                        time.sleep(0.3)
+                        client.send(connection, {'status': 0})
+
+                thread = threading.Thread(target=respond)
+                thread.start()
+                self.addCleanup(thread.join)
+                self.assertEqual(
+                    client.request({'op': 'main'},
+                                   path,
+                                   timeout=0.1,
+                                   wait=True), {'status': 0})
+
+    def testOtherUsersSocket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'other.sock')
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as other:
+                other.bind(path)
+                other.listen()
+                with mock.patch('os.getuid', return_value=os.getuid() + 1):
+                    with self.assertRaises(PermissionError):
+                        client.request({'op': 'ping'}, path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+#!/usr/bin/python
+"""Tests for comment_parser.stats.py"""
+
+import unittest
+from comment_parser import stats
+
+
+def _call(parser='c_parser',
+          size=10,
+          comments=1,
+          read=0.0,
+          parse=0.0,
+          **kwargs):
+    return stats.Call('a.c', parser, None, size, comments, read, 0.0, parse,
+                      **kwargs)
+
+
+class StatsTest(unittest.TestCase):
+
+    def testHistogram(self):
+        collected = stats.Stats()
+        for seconds in (0.0, 1e-6, 3e-6, 4e-6, 1e-3):
+            collected.record(_call(parse=seconds))
+        self.assertEqual(collected.histogram('parse'), {1: 2, 4: 2, 1024: 1})
+        self.assertEqual(collected.histogram('read'), {1: 5})
+
+    def testMerge(self):
+        collected = stats.Stats()
+        other = stats.Stats()
+        other.record(_call())
+        collected.merge(other)
+        self.assertEqual(collected.calls, other.calls)
+
+    def testSummary(self):
+        collected = stats.Stats()
+        collected.record(_call(size=2000000, comments=3, parse=0.5))
+        collected.record(_call(cached=True))
+        collected.record(_call(parser=None, comments=0, error='ParseError'))
+        summary = collected.summary()
+        self.assertIn(
+            'calls: 3, failed: 1, cached: 1, size: 2000020, '
+            'comments: 4', summary)
+        self.assertIn(
+            'c_parser        calls: 2, size: 2000010, comments: 4, '
+            'parse: 0.500s, 4.00 M/s', summary)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/python
+"""Tests for comment_parser.walker.py"""
+
+import os
+import tempfile
+import unittest
+from comment_parser import walker
+
+
+class CompilePatternTest(unittest.TestCase):
+
+    def assertMatches(self, pattern, path):
+        self.assertTrue(
+            walker.compile_pattern(pattern).regex.fullmatch(path),
+            f'{pattern} does not match {path}')
+
+    def assertNotMatches(self, pattern, path):
+        self.assertFalse(
+            walker.compile_pattern(pattern).regex.fullmatch(path),
+            f'{pattern} matches {path}')
+
+    def testNameMatchesAtAnyDepth(self):
+        self.assertMatches('*.js', 'a.js')
+        self.assertMatches('*.js', 'a/b/c.js')
+        self.assertNotMatches('*.js', 'a.jsx')
+
+    def testSlashAnchors(self):
+        self.assertMatches('/a.js', 'a.js')
+        self.assertNotMatches('/a.js', 'b/a.js')
+        self.assertMatches('b/*.js', 'b/a.js')
+        self.assertNotMatches('b/*.js', 'c/b/a.js')
+        self.assertNotMatches('b/*.js', 'b/c/a.js')
+
+    def testDoubleStar(self):
+        self.assertMatches('**/b/*.js', 'b/a.js')
+        self.assertMatches('**/b/*.js', 'c/d/b/a.js')
+        self.assertMatches('b/**', 'b/c/a.js')
+        self.assertMatches('a/**/z', 'a/z')
+        self.assertMatches('a/**/z', 'a/b/c/z')
+
+    def testCharacterClasses(self):
+        self.assertMatches('[ab].c', 'a.c')
+        self.assertNotMatches('[!ab].c', 'a.c')
+        self.assertMatches('?.c', 'x.c')
+        self.assertNotMatches('?.c', 'xy.c')
+
+    def testFlags(self):
+        pattern = walker.compile_pattern('!build/')
+        self.assertTrue(pattern.negated)
+        self.assertTrue(pattern.directory_only)
+        self.assertTrue(pattern.regex.fullmatch('build'))
+
+
+class WalkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.root = self.directory.name
+
+    def write(self, name, contents=''):
+        filename = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'w', encoding='utf-8') as output:
+            output.write(contents)
+
+    def walk(self, **kwargs):
+        return [
+            os.path.relpath(filename, self.root)
+            for filename in walker.walk([self.root], **kwargs)
+        ]
+
+    def testWalksInNameOrder(self):
+        for name in ('b.c', 'a/z.c', 'a/b/y.c', 'c.c', '.git/x.c'):
+            self.write(name)
+        self.assertEqual(self.walk(), ['b.c', 'c.c', 'a/z.c', 'a/b/y.c'])
+
+    def testGitignore(self):
+        self.write('.gitignore', '# comment\nbuild/\n*.min.js\n!keep.min.js\n')
+        self.write('sub/.gitignore', '/local.js\n')
+        for name in ('a.js', 'a.min.js', 'keep.min.js', 'build/b.js',
+                     'sub/local.js', 'sub/sub/local.js'):
+            self.write(name)
+        self.assertEqual(self.walk(include=['*.js']),
+                         ['a.js', 'keep.min.js', 'sub/sub/local.js'])
+        self.assertEqual(len(self.walk(include=['*.js'], gitignore=False)), 6)
+
+    def testIncludeAndExclude(self):
+        for name in ('a.c', 'a.py', 'vendor/b.c', 'src/vendor/c.c'):
+            self.write(name)
+        self.assertEqual(self.walk(include=['*.c'], exclude=['/vendor']),
+                         ['a.c', 'src/vendor/c.c'])
+        self.assertEqual(self.walk(exclude=['vendor']), ['a.c', 'a.py'])
+
+    def testFilesArePassedThrough(self):
+        self.assertEqual(list(walker.walk(['missing.c'], exclude=['*.c'])),
+                         ['missing.c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
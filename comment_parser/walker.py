@@ -0,0 +1,192 @@
+#!/usr/bin/python
+"""This module finds source files in directory trees.
+
+Directories are walked with os.scandir, one at a time and without sorting
+the whole tree first, so files can be parsed as soon as they are found.
+Files may be filtered by include and exclude globs and by .gitignore files,
+both written in the gitignore pattern format.
+"""
+
+import os
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Sequence, Tuple
+
+_IGNORE_FILE = '.gitignore'
+
+
+class Pattern(NamedTuple):
+    """A compiled gitignore-style pattern, see compile_pattern."""
+    regex: re.Pattern
+    negated: bool
+    directory_only: bool
+
+
+def _translate(glob: str) -> str:
+    """Returns the regular expression matching paths matched by glob."""
+    parts = []
+    i = 0
+    while i < len(glob):
+        if glob.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif glob.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif glob[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif glob[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        elif glob[i] == '[' and glob.find(']', i + 2) != -1:
+            end = glob.find(']', i + 2)
+            members = glob[i + 1:end]
+            if members[0] == '!':
+                members = '^' + members[1:]
+            parts.append('[' + members.replace('\\', '\\\\') + ']')
+            i = end + 1
+        elif glob[i] == '\\' and i + 1 < len(glob):
+            parts.append(re.escape(glob[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(glob[i]))
+            i += 1
+    return ''.join(parts)
+
+
+def compile_pattern(line: str) -> Pattern:
+    """Compiles a gitignore-style pattern.
+
+  Patterns without a slash match names at any depth, the others match paths
+  relative to the directory of the .gitignore file, or to the walked root.
+  '*', '?' and '[...]' do not match '/', '**' does. A leading '!' negates the
+  pattern and a trailing '/' only matches directories.
+
+  Args:
+    line: String pattern, one line of a .gitignore file.
+  Returns:
+    Pattern
+  """
+    negated = line.startswith('!')
+    if negated:
+        line = line[1:]
+    directory_only = line.endswith('/')
+    line = line.rstrip('/')
+    if '/' in line:
+        regex = _translate(line.lstrip('/'))
+    else:
+        regex = '(?:.*/)?' + _translate(line)
+    return Pattern(re.compile(regex, re.DOTALL), negated, directory_only)
+
+
+def read_ignore_file(filename: str) -> List[Pattern]:
+    """Returns the patterns of a .gitignore file.
+
+  Args:
+    filename: String name of the file to read.
+  Returns:
+    Python list of Pattern in the order of the file.
+  """
+    patterns = []
+    with open(filename, encoding='utf-8', errors='replace') as ignore_file:
+        for line in ignore_file:
+            line = line.rstrip('\n')
+            # Trailing spaces are ignored unless escaped.
+            if not line.endswith('\\ '):
+                line = line.rstrip(' ')
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith(('\\#', '\\!')):
+                line = line[1:]
+            patterns.append(compile_pattern(line))
+    return patterns
+
+
+def _ignored(rules: Sequence[Tuple[str, List[Pattern]]], path: str,
+             is_directory: bool) -> bool:
+    """Returns whether the last of rules' patterns matching path ignores it.
+
+  rules holds pairs of the directory patterns are relative to, with a
+  trailing '/' unless the root, and the patterns. path is relative to the
+  root.
+  """
+    ignored = False
+    for base, patterns in rules:
+        if not path.startswith(base):
+            continue
+        relative = path[len(base):]
+        for pattern in patterns:
+            if pattern.directory_only and not is_directory:
+                continue
+            if pattern.regex.fullmatch(relative):
+                ignored = not pattern.negated
+    return ignored
+
+
+def walk(paths: Iterable[str],
+         include: Sequence[str] = (),
+         exclude: Sequence[str] = (),
+         gitignore: bool = True) -> Iterator[str]:
+    """Yields the files named by, or found under, the given paths.
+
+  Directories are walked depth first, in name order, without following
+  symbolic links to directories. .git directories are skipped. Files named
+  explicitly are yielded without filtering.
+
+  Args:
+    paths: Iterable of string names of files and directories.
+    include: Sequence of string glob patterns; if not empty, only the files
+      found which match one of them are yielded.
+    exclude: Sequence of string glob patterns; files and directories that
+      match one of them are skipped.
+    gitignore: Boolean whether to skip files and directories ignored by
+      .gitignore files in the walked directories.
+  Yields:
+    String file names, starting with the path they were found under.
+  """
+    include = [compile_pattern(glob) for glob in include]
+    exclude = [('', [compile_pattern(glob) for glob in exclude])]
+    for root in paths:
+        if os.path.isdir(root):
+            yield from _walk_directory(root, include, exclude, gitignore)
+        else:
+            yield root
+
+
+def _walk_directory(root: str, include: List[Pattern],
+                    exclude: List[Tuple[str, List[Pattern]]],
+                    gitignore: bool) -> Iterator[str]:
+    """Yields the files found under root, see walk."""
+    # Directories left to walk: their path, relative to root, and the
+    # .gitignore rules that apply within them.
+    stack = [('', [])]
+    while stack:
+        relative_directory, rules = stack.pop()
+        directory = os.path.join(root, relative_directory)
+        if gitignore:
+            ignore_file = os.path.join(directory, _IGNORE_FILE)
+            if os.path.isfile(ignore_file):
+                rules = rules + [
+                    (relative_directory, read_ignore_file(ignore_file))
+                ]
+        try:
+            with os.scandir(directory) as scanner:
+                entries = sorted(scanner, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        subdirectories = []
+        for entry in entries:
+            relative = relative_directory + entry.name
+            is_directory = entry.is_dir(follow_symlinks=False)
+            if is_directory and entry.name == '.git':
+                continue
+            if (_ignored(rules, relative, is_directory)
+                    or _ignored(exclude, relative, is_directory)):
+                continue
+            if is_directory:
+                subdirectories.append((relative + '/', rules))
+            elif not include or any(
+                    pattern.regex.fullmatch(relative) for pattern in include):
+                if entry.is_file():
+                    yield os.path.join(root, relative)
+        stack.extend(reversed(subdirectories))
@@ -1,5 +1,5 @@
 from platform import python_version
-from setuptools import setup
+from setuptools import Extension, setup
 
 
 def readme():
@@ -24,6 +24,14 @@ setup(
     long_description=readme(),
     long_description_content_type='text/markdown',
     packages=['comment_parser', 'comment_parser.parsers'],
+    # The compiled scanner is optional: without a C compiler, the pure Python
+    # one is used.
+    ext_modules=[
+        Extension('comment_parser.parsers._lexer',
+                  ['comment_parser/parsers/_lexer.c'],
+                  depends=['comment_parser/parsers/_lexer_scan.h'],
+                  optional=True)
+    ],
     install_requires=['python-magic>=0.4.27'],
     zip_safe=False,
     python_requires='>=3.13',